@@ -0,0 +1,21 @@
+"""
+The WSGI application plus one view that reads the database and then waits on
+a slow outside service through the pooled HTTP client, as a view calling a
+bank or SMS provider would. Served by gunicorn for
+``manage.py benchmark_concurrency``, which sets ``BENCHMARK_UPSTREAM_URL``.
+"""
+import os
+from django.http import JsonResponse
+from django.urls import path
+from flite.wsgi import application  # noqa: F401 (sets up Django)
+from flite import urls
+from flite.core import http
+from flite.users.models import User
+
+
+def outbound(request):
+    User.objects.exists()
+    return JsonResponse(http.request_json('GET', os.environ['BENCHMARK_UPSTREAM_URL']) or {})
+
+
+urls.urlpatterns.append(path('benchmark/outbound/', outbound))
@@ -1,15 +1,27 @@
 import os
+from django.core.exceptions import ImproperlyConfigured
 from .common import Common
 
 
 class Production(Common):
     INSTALLED_APPS = Common.INSTALLED_APPS
     SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
+    CARD_FINGERPRINT_KEY = os.getenv('CARD_FINGERPRINT_KEY')
+    FIELD_ENCRYPTION_KEYS = [key for key in os.getenv('FIELD_ENCRYPTION_KEYS', '').split(',') if key]
     # Site
     # https://docs.djangoproject.com/en/2.0/ref/settings/#allowed-hosts
     ALLOWED_HOSTS = ["*"]
     INSTALLED_APPS += ("gunicorn", )
 
+    @classmethod
+    def setup(cls):
+        super().setup()
+        # There are no safe defaults, and keys set later wouldn't match what was stored without them
+        if not cls.CARD_FINGERPRINT_KEY:
+            raise ImproperlyConfigured("CARD_FINGERPRINT_KEY must be set in production")
+        if not cls.FIELD_ENCRYPTION_KEYS:
+            raise ImproperlyConfigured("FIELD_ENCRYPTION_KEYS must be set in production")
+
     # Static files (CSS, JavaScript, Images)
     # https://docs.djangoproject.com/en/2.0/howto/static-files/
     # http://django-storages.readthedocs.org/en/latest/index.html
@@ -23,6 +35,13 @@ class Production(Common):
     AWS_AUTO_CREATE_BUCKET = True
     AWS_QUERYSTRING_AUTH = False
     MEDIA_URL = f'https://s3.amazonaws.com/{AWS_STORAGE_BUCKET_NAME}/'
+    # Statements are private and downloaded through links that expire after an hour
+    STATEMENT_STORAGE_OPTIONS = {
+        'default_acl': 'private',
+        'querystring_auth': True,
+        'querystring_expire': 60 * 60,
+    }
+    TRANSACTION_ARCHIVE_STORAGE_OPTIONS = {'default_acl': 'private'}
 
     # https://developers.google.com/web/fundamentals/performance/optimizing-content-efficiency/http-caching#cache-control
     # Response can be cached by browser and any intermediary caches (i.e. it is "public") for up to 1 day
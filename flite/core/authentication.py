@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Maps token keys to their users in two tiers: an LRU dict of users in this
+    process and, if ``TOKEN_AUTH_SHARED_CACHE`` names a cache alias, a cache
+    shared by every process. Entries expire after their tier's TTL.
+
+    The shared tier only holds the user's id and ``is_active``, never the user
+    with its password hash. A process that finds a token there loads the user
+    by primary key into its LRU, and refuses it if it has been deactivated.
+
+    ``invalidate`` clears both tiers, but only this process's LRU, so the local
+    TTL bounds how long other processes keep accepting a deleted token.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def _shared():
+        alias = settings.TOKEN_AUTH_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def _shared_key(key):
+        # Keep raw tokens out of the shared cache's keyspace
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, user = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.stats['local_hits'] += 1
+                    return user
+                del self._entries[key]
+
+        shared = self._shared()
+        cached = shared.get(self._shared_key(key)) if shared else None
+        user = None
+        if cached is not None:
+            user_id, is_active = cached
+            if is_active:
+                user = get_user_model()._default_manager.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            self._count('misses')
+            return None
+        self._count('shared_hits')
+        self._store_local(key, user)
+        return user
+
+    def _store_local(self, key, user):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + settings.TOKEN_AUTH_CACHE_TTL, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_AUTH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def set(self, key, user):
+        self._store_local(key, user)
+        shared = self._shared()
+        if shared:
+            shared.set(self._shared_key(key), (user.pk, user.is_active), settings.TOKEN_AUTH_SHARED_CACHE_TTL)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        shared = self._shared()
+        if shared:
+            shared.delete(self._shared_key(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for stat in self.stats:
+                self.stats[stat] = 0
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``TokenAuthentication`` that skips the token and user lookup when the key
+    is in ``token_cache``.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            user, token = super(CachedTokenAuthentication, self).authenticate_credentials(key)
+            token_cache.set(key, user)
+            return user, token
+        return user, Token(key=key, user=user)
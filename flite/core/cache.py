@@ -0,0 +1,25 @@
+"""
+Caches shared by every process.
+
+Rate limits, phone verification codes, invalidated summaries and replica pins
+only work if every web and job worker sees the same cache, so their aliases
+are looked up with ``shared``, which refuses a cache local to each process.
+``CACHES['default']`` comes from ``CACHE_URL`` and is Redis unless that
+points elsewhere.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+def shared(alias):
+    """
+    Returns the cache ``alias``, which must not be local to this process.
+    """
+    cache = caches[alias]
+    if isinstance(cache, LocMemCache):
+        backend = settings.CACHES[alias]['BACKEND']
+        raise ImproperlyConfigured(
+            f"The {alias!r} cache uses {backend}, which isn't shared between processes. Set CACHE_URL.")
+    return cache
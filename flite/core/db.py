@@ -0,0 +1,92 @@
+"""
+Read replica routing.
+
+Reads go to a replica in ``REPLICA_DATABASES`` only while serving a GET, HEAD
+or OPTIONS request, and only outside transactions and for models not listed in
+``PRIMARY_ONLY_MODELS``. Everything else (writes, management commands, job
+workers) uses ``default``.
+
+After a client sends a write, its safe requests are pinned to the primary for
+``REPLICA_PIN_SECONDS`` so it reads its own writes despite replication lag.
+Clients are told apart by their credentials (token or session cookie), so
+pinning needs no user lookup. Pins are kept in ``REPLICA_PIN_CACHE``, which
+must be shared, as the client's next request usually reaches another process.
+"""
+import hashlib
+import random
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from .cache import shared
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+@contextmanager
+def use_primary():
+    """
+    Sends every read in the block to the primary.
+    """
+    previous = getattr(_state, 'use_replica', False)
+    _state.use_replica = False
+    try:
+        yield
+    finally:
+        _state.use_replica = previous
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if not replicas or not getattr(_state, 'use_replica', False):
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction (e.g. a transfer) must see its own writes and locks
+        # Built by hand, as the database cache's CacheEntry has no _meta.label
+        label = f'{model._meta.app_label}.{model._meta.object_name}'
+        if label in settings.PRIMARY_ONLY_MODELS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin_key(request):
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'db-pin:' + hashlib.sha256(credential.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+
+        cache = shared(settings.REPLICA_PIN_CACHE)
+        pin_key = _pin_key(request)
+        safe = request.method in SAFE_METHODS
+        _state.use_replica = safe and not (pin_key and cache.get(pin_key))
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.use_replica = False
+
+        if not safe and pin_key:
+            cache.set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+        return response
@@ -0,0 +1,50 @@
+"""
+Encryption of sensitive columns, such as card authorization codes.
+
+Values are encrypted with Fernet (AES-CBC with an HMAC) under the first key in
+``FIELD_ENCRYPTION_KEYS`` and decrypted with whichever key made them. A key is
+rotated by putting a new one first, re-saving the rows, and then removing the
+old one. Each encryption is randomised, so encrypted columns can't be looked
+up or compared in queries.
+"""
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+
+
+@lru_cache(maxsize=None)
+def _fernet(keys):
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+def fernet():
+    if not settings.FIELD_ENCRYPTION_KEYS:
+        raise ImproperlyConfigured("FIELD_ENCRYPTION_KEYS must be set to encrypt fields")
+    return _fernet(tuple(settings.FIELD_ENCRYPTION_KEYS))
+
+
+def encrypt(value):
+    return fernet().encrypt(value.encode()).decode()
+
+
+def decrypt(token):
+    return fernet().decrypt(token.encode()).decode()
+
+
+class EncryptedTextField(models.TextField):
+    """
+    Stores a string encrypted and loads it back decrypted.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decrypt(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return value
+        return encrypt(value)
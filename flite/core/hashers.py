@@ -0,0 +1,175 @@
+"""
+Password hashers that do their work in a bounded thread pool.
+
+Hashing holds a CPU for tens of milliseconds and releases the GIL while it
+does, so a login storm on a threaded worker would otherwise hash on every
+thread at once and starve the other requests. Here at most
+``PASSWORD_HASHING_THREADS`` hashes run at a time per process, and callers
+that wait longer than ``PASSWORD_HASHING_TIMEOUT`` for a slot get a 503.
+
+``PASSWORD_HASHERS`` lists these with the preferred one first. Django rehashes
+a password with it on the next successful login when the stored hash used
+another hasher or different parameters.
+"""
+import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.crypto import constant_time_compare, get_random_string
+from django.utils.translation import gettext_noop as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+_pools = {}
+_pool_lock = threading.Lock()
+_worker = threading.local()
+
+
+class HashingPoolBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, try again shortly.'
+    default_code = 'hashing_pool_busy'
+
+
+def _in_worker(fn, *args):
+    _worker.active = True
+    return fn(*args)
+
+
+def _get_pool():
+    """
+    Returns this process's pool and its slots. Forked processes get their own,
+    as the parent's threads don't survive the fork.
+    """
+    pid = os.getpid()
+    with _pool_lock:
+        if pid not in _pools:
+            threads = settings.PASSWORD_HASHING_THREADS
+            _pools[pid] = (ThreadPoolExecutor(max_workers=threads, thread_name_prefix='password-hashing'),
+                           threading.BoundedSemaphore(threads))
+        return _pools[pid]
+
+
+def run_in_pool(fn, *args):
+    """
+    Runs ``fn(*args)`` on the hashing pool and waits for the result.
+    """
+    if getattr(_worker, 'active', False):
+        return fn(*args)
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=settings.PASSWORD_HASHING_TIMEOUT):
+        raise HashingPoolBusy()
+    try:
+        return pool.submit(_in_worker, fn, *args).result()
+    finally:
+        slots.release()
+
+
+class PooledHasherMixin:
+
+    def encode(self, password, salt, *args):
+        return run_in_pool(super(PooledHasherMixin, self).encode, password, salt, *args)
+
+    def verify(self, password, encoded):
+        return run_in_pool(super(PooledHasherMixin, self).verify, password, encoded)
+
+
+class BaseScryptPasswordHasher(hashers.BasePasswordHasher):
+    """
+    scrypt from the standard library, stored in the same format as Django 4's
+    ScryptPasswordHasher so hashes survive a framework upgrade.
+    """
+    algorithm = 'scrypt'
+
+    @property
+    def work_factor(self):
+        return settings.SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.SCRYPT_PARALLELISM
+
+    def salt(self):
+        return get_random_string(22)
+
+    def encode(self, password, salt, work_factor=None, block_size=None, parallelism=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        n = work_factor or self.work_factor
+        r = block_size or self.block_size
+        p = parallelism or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=64)
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash_)
+
+    def _decode(self, encoded):
+        algorithm, work_factor, salt, block_size, parallelism, hash_ = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return {
+            'work_factor': int(work_factor),
+            'salt': salt,
+            'block_size': int(block_size),
+            'parallelism': int(parallelism),
+            'hash': hash_,
+        }
+
+    def verify(self, password, encoded):
+        decoded = self._decode(encoded)
+        encoded_2 = self.encode(
+            password, decoded['salt'], decoded['work_factor'], decoded['block_size'], decoded['parallelism'])
+        return constant_time_compare(encoded, encoded_2)
+
+    def safe_summary(self, encoded):
+        decoded = self._decode(encoded)
+        return {
+            _('algorithm'): self.algorithm,
+            _('work factor'): decoded['work_factor'],
+            _('block size'): decoded['block_size'],
+            _('parallelism'): decoded['parallelism'],
+            _('salt'): hashers.mask_hash(decoded['salt']),
+            _('hash'): hashers.mask_hash(decoded['hash']),
+        }
+
+    def must_update(self, encoded):
+        decoded = self._decode(encoded)
+        stored = (decoded['work_factor'], decoded['block_size'], decoded['parallelism'])
+        return stored != (self.work_factor, self.block_size, self.parallelism)
+
+    def harden_runtime(self, password, encoded):
+        # The runtime of each hash depends only on its parameters
+        pass
+
+
+class ScryptPasswordHasher(PooledHasherMixin, BaseScryptPasswordHasher):
+    pass
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    """
+    Needs the ``argon2-cffi`` package.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
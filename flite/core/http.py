@@ -0,0 +1,58 @@
+"""
+A pooled HTTP client for calls to outside services (SMS providers, banks,
+payment gateways).
+
+Every caller in a process shares one ``urllib3.PoolManager``, so threads reuse
+kept-alive connections per host instead of opening one per call, and every
+call is bounded by ``HTTP_CLIENT_CONNECT_TIMEOUT`` and ``HTTP_CLIENT_READ_TIMEOUT``.
+Only failures to connect are retried, as the request never reached the service.
+"""
+import json
+import os
+import threading
+import urllib3
+from django.conf import settings
+
+_lock = threading.Lock()
+_managers = {}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, method, url, status, body):
+        super().__init__(f"{method} {url} returned {status}")
+        self.status = status
+        self.body = body
+
+
+def pool_manager():
+    """
+    Returns this process's pool manager. Forked processes get their own.
+    """
+    pid = os.getpid()
+    with _lock:
+        if pid not in _managers:
+            _managers[pid] = urllib3.PoolManager(
+                maxsize=settings.HTTP_CLIENT_POOL_SIZE,
+                timeout=urllib3.Timeout(connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+                                        read=settings.HTTP_CLIENT_READ_TIMEOUT),
+                retries=urllib3.Retry(connect=settings.HTTP_CLIENT_CONNECT_RETRIES, read=0, redirect=0,
+                                      backoff_factor=0.1),
+            )
+        return _managers[pid]
+
+
+def request_json(method, url, payload=None, headers=None):
+    """
+    Sends ``payload`` as JSON and returns the decoded response, or None if it
+    is empty. Raises ``HTTPError`` for 4xx and 5xx responses.
+    """
+    headers = dict({'Accept': 'application/json'}, **(headers or {}))
+    body = None
+    if payload is not None:
+        body = json.dumps(payload).encode()
+        headers['Content-Type'] = 'application/json'
+    response = pool_manager().request(method, url, body=body, headers=headers)
+    if response.status >= 400:
+        raise HTTPError(method, url, response.status, response.data.decode(errors='replace'))
+    return json.loads(response.data.decode()) if response.data else None
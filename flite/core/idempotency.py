@@ -0,0 +1,93 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def fingerprint(request):
+    """
+    Identifies what a request asks for, so a key reused for a different request is caught.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.get_full_path(), data], sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(owner, key, request_fingerprint):
+    """
+    Inserts the key row, or returns the existing one if the key has been used before.
+
+    On PostgreSQL a concurrent request holding the same key blocks on the unique
+    index here until the first request's transaction ends: it then either sees the
+    stored response or, if the first request failed and rolled back, claims the key.
+    """
+    expires = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                owner=owner, key=key, fingerprint=request_fingerprint, expires=expires), True
+    except IntegrityError:
+        record = IdempotencyKey.objects.select_for_update().get(owner=owner, key=key)
+
+    if record.expires <= timezone.now():
+        record.fingerprint = request_fingerprint
+        record.response_code = None
+        record.response_body = ''
+        record.expires = expires
+        record.save()
+        return record, True
+    return record, False
+
+
+def _replay(record):
+    response = Response(json.loads(record.response_body or 'null'), status=record.response_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def run_once(request, key, handler):
+    """
+    Runs ``handler`` at most once per user and idempotency key.
+
+    The key row and whatever ``handler`` writes commit in the same transaction, so a
+    retry either replays the stored response or, if the first attempt raised, runs again.
+    """
+    request_fingerprint = fingerprint(request)
+    with transaction.atomic():
+        record, claimed = _claim(request.user, key, request_fingerprint)
+        if not claimed:
+            if record.fingerprint != request_fingerprint:
+                return Response(
+                    {"message": "Idempotency-Key has already been used for a different request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            return _replay(record)
+
+        response = handler()
+        record.response_code = response.status_code
+        record.response_body = json.dumps(response.data, cls=JSONEncoder)
+        record.save(update_fields=['response_code', 'response_body', 'modified'])
+    return response
+
+
+class IdempotentCreateMixin:
+    """
+    Makes ``create`` safe to retry: requests carrying an ``Idempotency-Key`` header
+    are executed once and retries get the stored response back.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        parent = super(IdempotentCreateMixin, self).create
+        if not key or not request.user.is_authenticated:
+            return parent(request, *args, **kwargs)
+        return run_once(request, key[:255], lambda: parent(request, *args, **kwargs))
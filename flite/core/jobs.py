@@ -0,0 +1,133 @@
+"""
+A background job queue kept in the database, so it needs no broker.
+
+Decorate a function with ``@job`` and call ``func.delay(...)`` to queue it.
+The job row commits with the caller's transaction, so a rolled back request
+queues nothing. ``manage.py run_jobs`` starts workers that call
+``run_pending``, which claims due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``
+so any number of workers can share a queue.
+
+A job that raises is retried with exponential backoff until it has made
+``max_attempts`` attempts, and is then left with status ``failed``. Jobs that
+succeed are deleted.
+"""
+import json
+import logging
+import random
+from datetime import timedelta
+from itertools import groupby
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobFunction:
+
+    def __init__(self, func, queue, max_attempts, batched):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.batched = batched
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        if self.batched and args:
+            raise TypeError(f"{self.name} is batched and only takes keyword arguments")
+        return Job.objects.create(
+            name=self.name, queue=self.queue,
+            max_attempts=self.max_attempts or settings.JOB_MAX_ATTEMPTS,
+            payload=json.dumps({'args': args, 'kwargs': kwargs}, cls=DjangoJSONEncoder))
+
+
+def job(func=None, queue='default', max_attempts=None, batched=False):
+    """
+    Makes ``func`` queueable with ``func.delay(*args, **kwargs)``.
+
+    A ``batched`` function is called once per claimed batch with a list of the
+    keyword arguments each job was queued with, e.g. to send many messages in
+    one provider request. A failure retries the whole batch.
+    """
+    def decorator(func):
+        return JobFunction(func, queue, max_attempts, batched)
+    return decorator(func) if func else decorator
+
+
+def _claim(queue, limit):
+    now = timezone.now()
+    with transaction.atomic():
+        # Running jobs whose lock has lapsed belonged to a worker that died
+        jobs = list(Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now),
+            queue=queue).order_by('run_at')[:limit])
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=settings.JOB_LOCK_TIMEOUT))
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def backoff(attempts):
+    """
+    Seconds to wait before the retry that follows attempt number ``attempts``.
+    """
+    delay = min(settings.JOB_RETRY_MAX_DELAY, settings.JOB_RETRY_DELAY * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def _failed(jobs, error):
+    now = timezone.now()
+    for job in jobs:
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, last_error=error, locked_until=None)
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, last_error=error, locked_until=None,
+                run_at=now + timedelta(seconds=backoff(job.attempts)))
+
+
+def _run(func, jobs):
+    payloads = [json.loads(job.payload) for job in jobs]
+    try:
+        # The job's own writes commit together with its removal from the queue
+        with transaction.atomic():
+            if func.batched:
+                func([payload['kwargs'] for payload in payloads])
+            else:
+                func(*payloads[0]['args'], **payloads[0]['kwargs'])
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+    except Exception as exc:
+        logger.exception("Job %s failed", func.name)
+        _failed(jobs, repr(exc))
+
+
+def run_pending(queue='default', limit=100):
+    """
+    Claims up to ``limit`` due jobs from ``queue`` and runs them. Returns how
+    many were claimed.
+    """
+    jobs = _claim(queue, limit)
+    for name, group in groupby(sorted(jobs, key=lambda job: job.name), key=lambda job: job.name):
+        group = list(group)
+        try:
+            func = import_string(name)
+        except ImportError as exc:
+            logger.error("Job %s can't be imported", name)
+            _failed(group, repr(exc))
+            continue
+        if func.batched:
+            _run(func, group)
+        else:
+            for job in group:
+                _run(func, [job])
+    return len(jobs)
@@ -0,0 +1,194 @@
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import urllib3
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), *[os.pardir] * 4))
+
+# (label, worker class, DATABASE_POOL) for each gunicorn setup measured
+MODES = [
+    ('sync', 'sync', 'no'),
+    ('gthread', 'gthread', 'no'),
+    ('gthread+pool', 'gthread', 'yes'),
+]
+
+
+class SlowUpstream(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    An outside service that answers every request after ``delay`` seconds and
+    records the most requests it had in flight at once.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = self.peak = 0
+        super().__init__(('127.0.0.1', 0), SlowHandler)
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+        body = json.dumps({}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ("Measures how many requests one gunicorn process keeps in flight while its views "
+            "wait on a slow outside service, with the sync and gthread workers")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--clients', type=int, default=32, help="Concurrent clients")
+        parser.add_argument('--threads', type=int, default=8, help="gthread threads per process")
+        parser.add_argument('--delay', type=float, default=0.2,
+                            help="Seconds the outside service takes to answer")
+
+    def handle(self, *args, **options):
+        upstream = SlowUpstream(options['delay'])
+        threading.Thread(target=upstream.serve_forever, daemon=True).start()
+        try:
+            results = {label: self.run(upstream, worker_class, pool, options)
+                       for label, worker_class, pool in MODES}
+        finally:
+            upstream.shutdown()
+        self.report(results)
+
+    def run(self, upstream, worker_class, pool, options):
+        port = free_port()
+        # gunicorn turns sync workers with more than one thread into gthread ones
+        threads = options['threads'] if worker_class == 'gthread' else 1
+        # libpq tags the server's connections with PGAPPNAME, so they can be counted
+        app_name = f'flite-benchmark-{port}'
+        env = dict(os.environ, DATABASE_POOL=pool, PGAPPNAME=app_name,
+                   BENCHMARK_UPSTREAM_URL=f'http://127.0.0.1:{upstream.server_address[1]}/')
+        server = subprocess.Popen(
+            # gunicorn 19 can't be run with -m
+            [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+             'benchmarks.outbound_wsgi:application',
+             '--chdir', ROOT_DIR, '--bind', f'127.0.0.1:{port}', '--workers', '1',
+             '--worker-class', worker_class, '--threads', str(threads),
+             '--timeout', '120', '--log-level', 'warning'],
+            env=env)
+        try:
+            url = f'http://127.0.0.1:{port}/benchmark/outbound/'
+            http = urllib3.PoolManager(maxsize=options['clients'], retries=False)
+            self.wait_until_up(server, http, url)
+            upstream.peak = 0
+            return self.load(upstream, http, url, app_name, options)
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_until_up(self, server, http, url):
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with status {server.returncode}")
+            try:
+                http.request('GET', url)
+                return
+            except urllib3.exceptions.HTTPError:
+                time.sleep(0.2)
+        raise CommandError("gunicorn didn't start within 60 seconds")
+
+    def load(self, upstream, http, url, app_name, options):
+        def request(_):
+            started = time.perf_counter()
+            try:
+                ok = http.request('GET', url).status < 400
+            except urllib3.exceptions.HTTPError:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        connections = DatabaseConnections(app_name)
+        connections.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as clients:
+            timings = list(clients.map(request, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        connections.stop()
+
+        latencies = sorted(latency for latency, _ in timings)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {
+            'requests': len(timings),
+            'errors': sum(1 for _, ok in timings if not ok),
+            'throughput': round(len(timings) / elapsed, 1),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'in_flight': upstream.peak,
+            'db_connections': connections.peak,
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{'mode':<14}{'reqs':>6}{'errors':>8}{'req/s':>9}{'p50 ms':>9}"
+                          f"{'p95 ms':>9}{'in flight':>11}{'db conns':>10}")
+        for label, result in results.items():
+            self.stdout.write(
+                f"{label:<14}{result['requests']:>6}{result['errors']:>8}{result['throughput']:>9}"
+                f"{result['p50_ms']:>9}{result['p95_ms']:>9}{result['in_flight']:>11}"
+                f"{str(result['db_connections']):>10}")
+
+
+class DatabaseConnections(threading.Thread):
+    """
+    Samples how many connections the database has for ``app_name``, on
+    PostgreSQL. ``peak`` is None elsewhere.
+    """
+
+    def __init__(self, app_name):
+        super().__init__(daemon=True)
+        self.app_name = app_name
+        self.peak = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        if connection.vendor != 'postgresql':
+            return
+        try:
+            with connection.cursor() as cursor:
+                self.peak = 0
+                while not self.stopped.wait(0.05):
+                    cursor.execute('SELECT COUNT(*) FROM pg_stat_activity WHERE application_name = %s',
+                                   [self.app_name])
+                    self.peak = max(self.peak, cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
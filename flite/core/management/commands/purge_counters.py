@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from flite.core.models import Counter
+
+
+class Command(BaseCommand):
+    help = "Deletes expired rate limit and attempt counters in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            batch = list(Counter.objects.filter(expires__lte=now).values_list(
+                'pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += Counter.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f"Deleted {deleted} expired counters")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from flite.core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Deletes expired idempotency keys in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Short batches keep each delete's locks and WAL small on a busy table
+            batch = list(IdempotencyKey.objects.filter(expires__lte=now).values_list(
+                'pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys")
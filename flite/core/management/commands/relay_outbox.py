@@ -0,0 +1,36 @@
+import logging
+import signal
+import time
+from django.core.management.base import BaseCommand
+from flite.core import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Streams outbox events to the configured consumers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait when idle")
+        parser.add_argument('--once', action='store_true', help="Exit once every event is relayed")
+
+    def handle(self, *args, **options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        relayed = 0
+        while not stopping:
+            try:
+                count = outbox.relay(options['batch_size'])
+            except Exception:
+                # The batch stays unpublished and is retried
+                logger.exception("Relaying outbox events failed")
+                count = 0
+                if options['once']:
+                    raise
+            relayed += count
+            if not count:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write(f"Relayed {relayed} events")
@@ -0,0 +1,51 @@
+import multiprocessing
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from flite.core import jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default='default')
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait on an empty queue")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        if options['processes'] == 1:
+            return self.work(options)
+
+        # Children must not share the parent's database connection
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=self.work, args=(options,), daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        def stop(signum, frame):
+            for worker in workers:
+                worker.terminate()
+        signal.signal(signal.SIGTERM, stop)
+
+        for worker in workers:
+            worker.join()
+
+    def work(self, options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        processed = 0
+        while not stopping:
+            claimed = jobs.run_pending(options['queue'], options['batch_size'])
+            processed += claimed
+            if not claimed:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write(f"Processed {processed} jobs")
@@ -0,0 +1,235 @@
+"""
+Per-view request metrics kept in process memory.
+
+``MetricsMiddleware`` records, for each view, the request latency, the number
+and total time of its database queries, and the time spent producing
+serializer data. The histograms are served in the Prometheus text format by
+``MetricsView``. Each worker process keeps its own, so scrape every worker or
+run one per host. The token cache and, with ``DATABASE_POOL``, the connection
+pools report their counters alongside.
+
+A request that runs the same SQL (before parameters are filled in) at least
+``METRICS_N_PLUS_ONE_THRESHOLD`` times is counted and logged as a likely N+1.
+Transaction control statements and the database cache's queries repeat in
+ordinary requests and aren't counted.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+from .authentication import token_cache
+from .postgresql_pool.pool import pools
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# BEGIN, COMMIT, ROLLBACK [TO SAVEPOINT], SAVEPOINT and RELEASE SAVEPOINT from atomic blocks
+TRANSACTION_CONTROL = re.compile(r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE\s+SAVEPOINT)\b', re.IGNORECASE)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+
+    HISTOGRAMS = {
+        'flite_request_duration_seconds': ('Request latency', LATENCY_BUCKETS),
+        'flite_db_queries': ('Database queries per request', QUERY_BUCKETS),
+        'flite_db_duration_seconds': ('Database time per request', LATENCY_BUCKETS),
+        'flite_serializer_duration_seconds': ('Serializer time per request', LATENCY_BUCKETS),
+    }
+    COUNTERS = {
+        'flite_requests_total': 'Requests by response status',
+        'flite_n_plus_one_total': 'Requests that repeated the same SQL',
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = Counter()
+
+    def clear(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = Counter()
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.HISTOGRAMS[name][1])
+            self.histograms[key].observe(value)
+
+    def inc(self, name, labels):
+        with self._lock:
+            self.counters[(name, labels)] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_labels(labels, le=bound)} {count}')
+                    lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {histogram.count}')
+                    lines.append(f'{name}_sum{_labels(labels)} {histogram.sum}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+            for name, help_text in self.COUNTERS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labels)} {value}')
+
+        lines += ['# HELP flite_token_cache_total Token authentication cache lookups',
+                  '# TYPE flite_token_cache_total counter']
+        for result, value in sorted(token_cache.stats.items()):
+            lines.append(f'flite_token_cache_total{_labels((("result", result),))} {value}')
+        return '\n'.join(lines + _pool_lines()) + '\n'
+
+
+def _pool_lines():
+    """
+    Connection pool saturation: connections in use against the pool size, and
+    how often requests waited for one or gave up.
+    """
+    current = [(key, pool) for (pid, key), pool in list(pools.items()) if pid == os.getpid()]
+    lines = []
+    for name, kind, help_text in (
+            ('flite_db_pool_connections', 'gauge', 'Pooled database connections by state'),
+            ('flite_db_pool_size', 'gauge', 'Maximum pooled database connections'),
+            ('flite_db_pool_events_total', 'counter', 'Pool acquisitions, waits, timeouts and reconnects')):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for (alias, database), pool in current:
+            labels = (('alias', alias), ('database', database))
+            if name == 'flite_db_pool_connections':
+                lines.append(f'{name}{_labels(labels, state="in_use")} {pool.in_use}')
+                lines.append(f'{name}{_labels(labels, state="idle")} {pool.idle}')
+            elif name == 'flite_db_pool_size':
+                lines.append(f'{name}{_labels(labels)} {pool.size}')
+            else:
+                for event, value in sorted(pool.stats.items()):
+                    lines.append(f'{name}{_labels(labels, event=event)} {value}')
+    return lines
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+registry = Registry()
+_current = threading.local()
+
+
+class _RequestStats:
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.serializer_time = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+def _instrument_serializers():
+    """
+    Times ``BaseSerializer.data``, which every serializer and list serializer
+    goes through once per response.
+    """
+    data = serializers.BaseSerializer.data
+
+    def timed_data(self):
+        stats = getattr(_current, 'stats', None)
+        if stats is None or getattr(_current, 'serializing', False):
+            return data.fget(self)
+        _current.serializing = True
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            _current.serializing = False
+
+    serializers.BaseSerializer.data = property(timed_data)
+
+
+_instrument_serializers()
+
+
+def _repeated_statements(statements):
+    cache_tables = [config['LOCATION'] for config in settings.CACHES.values()
+                    if config['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache']
+    return Counter({
+        sql: count for sql, count in statements.items()
+        if not TRANSACTION_CONTROL.match(sql) and not any(table in sql for table in cache_tables)})
+
+
+class MetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _RequestStats()
+        _current.stats = stats
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.stats = None
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        labels = (('view', match.view_name if match else 'unmatched'), ('method', request.method))
+        registry.observe('flite_request_duration_seconds', labels, elapsed)
+        registry.observe('flite_db_queries', labels, stats.queries)
+        registry.observe('flite_db_duration_seconds', labels, stats.db_time)
+        registry.observe('flite_serializer_duration_seconds', labels, stats.serializer_time)
+        registry.inc('flite_requests_total', labels + (('status', response.status_code),))
+
+        repeated = _repeated_statements(stats.statements)
+        if repeated:
+            sql, repeats = repeated.most_common(1)[0]
+            if repeats >= settings.METRICS_N_PLUS_ONE_THRESHOLD:
+                registry.inc('flite_n_plus_one_total', labels)
+                logger.warning("Possible N+1 in %s %s: ran %d times: %s",
+                               request.method, labels[0][1], repeats, sql[:500])
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 2.1.9 on 2026-10-18 02:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('topic', models.CharField(max_length=100)),
+                ('aggregate_id', models.CharField(max_length=64)),
+                ('payload', models.TextField()),
+                ('published', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['published', 'id'], name='core_outbox_unpublished'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.1.9 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('count', models.PositiveIntegerField()),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
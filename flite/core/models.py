@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 import uuid
 from django.utils import timezone
@@ -10,3 +11,75 @@ class BaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class IdempotencyKey(BaseModel):
+    """
+    The stored outcome of a request made with an ``Idempotency-Key`` header.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    response_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.TextField(blank=True)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('owner', 'key')
+
+
+class Job(BaseModel):
+    """
+    A queued call to a function decorated with ``flite.core.jobs.job``.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=255)
+    queue = models.CharField(max_length=50, default='default')
+    payload = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at'], name='core_job_ready'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """
+    An event written in the same transaction as the change it describes, for
+    ``manage.py relay_outbox`` to pass on to consumers in ``id`` order.
+    """
+    id = models.BigAutoField(primary_key=True)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    topic = models.CharField(max_length=100)
+    aggregate_id = models.CharField(max_length=64)
+    payload = models.TextField()
+    published = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['published', 'id'], name='core_outbox_unpublished'),
+        ]
+
+
+class Counter(models.Model):
+    """
+    A counter from ``flite.core.ratelimit`` whose cache can't count atomically.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    count = models.PositiveIntegerField()
+    expires = models.DateTimeField(db_index=True)
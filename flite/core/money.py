@@ -0,0 +1,77 @@
+from decimal import Decimal
+from django.db import models
+
+
+class Money(int):
+    """
+    An amount of naira held as a whole number of kobo.
+
+    Being an ``int``, it can be summed, compared and stored without rounding, and
+    database aggregates over a MoneyField come back exact.
+    """
+    SUBUNITS = 100
+
+    def __new__(cls, value=0):
+        if isinstance(value, (float, Decimal)) and value != int(value):
+            raise ValueError(f"{value!r} is not a whole number of kobo, use Money.from_naira")
+        return super().__new__(cls, value)
+
+    @classmethod
+    def from_naira(cls, value):
+        """
+        Converts a naira amount such as ``'1500.25'`` into Money, rejecting
+        anything finer than a kobo.
+        """
+        kobo = Decimal(str(value)) * cls.SUBUNITS
+        if kobo != kobo.to_integral_value():
+            raise ValueError(f"{value!r} has more than two decimal places")
+        return cls(int(kobo))
+
+    @property
+    def naira(self):
+        return Decimal(int(self)) / self.SUBUNITS
+
+    def __repr__(self):
+        return f"Money({int(self)})"
+
+    def __str__(self):
+        # int stopped defining __str__ in Python 3.8, so str() would fall back to __repr__
+        return int.__repr__(self)
+
+    def __add__(self, other):
+        return Money(int(self) + int(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Money(int(self) - int(other))
+
+    def __rsub__(self, other):
+        return Money(int(other) - int(self))
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __abs__(self):
+        return Money(abs(int(self)))
+
+
+class MoneyField(models.BigIntegerField):
+    """
+    Stores Money as a bigint count of kobo and loads it back as Money.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', 0)
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Money(value)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value is None:
+            return value
+        return Money(value)
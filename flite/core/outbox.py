@@ -0,0 +1,74 @@
+"""
+A transactional outbox.
+
+``publish`` writes an event row inside the caller's transaction, so an event
+exists exactly when the change it describes committed. ``relay`` hands
+unpublished events, oldest first, in batches to each callable listed in
+``OUTBOX_CONSUMERS`` and marks them published. A batch a consumer raises on is
+relayed again, so consumers see each event at least once and should
+deduplicate on its ``id``.
+"""
+import json
+import logging
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+USER_CREATED = 'user.created'
+DEPOSIT_POSTED = 'deposit.posted'
+TRANSFER_POSTED = 'transfer.posted'
+CARD_ADDED = 'card.added'
+
+
+def event(topic, aggregate_id, payload):
+    """
+    Returns an unsaved event, for ``bulk_create``.
+    """
+    return OutboxEvent(topic=topic, aggregate_id=str(aggregate_id),
+                       payload=json.dumps(payload, cls=DjangoJSONEncoder))
+
+
+def publish(topic, aggregate_id, payload):
+    return OutboxEvent.objects.create(
+        topic=topic, aggregate_id=str(aggregate_id), payload=json.dumps(payload, cls=DjangoJSONEncoder))
+
+
+def _message(event):
+    return {
+        'id': event.id,
+        'topic': event.topic,
+        'aggregate_id': event.aggregate_id,
+        'created': event.created.isoformat(),
+        'payload': json.loads(event.payload),
+    }
+
+
+def log_events(messages):
+    for message in messages:
+        logger.info("%s %s %s", message['id'], message['topic'], message['aggregate_id'])
+
+
+def relay(batch_size=500):
+    """
+    Passes the oldest ``batch_size`` unpublished events to every consumer and
+    returns how many there were.
+
+    The events stay locked until they are marked published, so a second relay
+    waits rather than delivering them out of order.
+    """
+    consumers = [import_string(path) for path in settings.OUTBOX_CONSUMERS]
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.select_for_update().filter(
+            published__isnull=True).order_by('id')[:batch_size])
+        if not events:
+            return 0
+        messages = [_message(event) for event in events]
+        for consumer in consumers:
+            consumer(messages)
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(published=timezone.now())
+    return len(events)
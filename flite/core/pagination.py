@@ -0,0 +1,71 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pagination on ``(created, id)``.
+
+    The cursor carries the key of the last row on the page, and the next page is
+    fetched with a range condition on that key rather than an OFFSET, so every page
+    is one index range scan no matter how deep it is. No count query is run: the
+    page is fetched with one extra row to tell whether there is a next page.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by('-created', '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created, pk = self.decode_cursor(cursor)
+            try:
+                pk = queryset.model._meta.pk.to_python(pk)
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            # The redundant created__lte gives the database a range bound to start the scan from
+            queryset = queryset.filter(
+                Q(created__lt=created) | Q(created=created, id__lt=pk), created__lte=created)
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(last.created, last.pk))
+
+    def encode_cursor(self, created, pk):
+        return urlsafe_b64encode(f'{created.isoformat()}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            created, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            created = parse_datetime(created)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created, pk
@@ -0,0 +1,11 @@
+"""
+The PostgreSQL database backend, made to see partitioned tables.
+
+Django 2.1 lists only plain tables and views, so ``flush`` (and with it
+``TransactionTestCase``) would leave partitioned tables such as
+``users_transaction`` out of its TRUNCATE and fail on their foreign keys. Servers before
+PostgreSQL 10 have no partitioned tables and are listed as the base backend
+lists them.
+Postgres database URLs use this backend, or ``flite.core.postgresql_pool``
+which builds on it.
+"""
@@ -0,0 +1,8 @@
+"""
+A PostgreSQL database backend that shares a bounded connection pool per process.
+
+Set ``DATABASE_POOL=yes`` to use it. Connections go back to the pool when
+Django closes them, which with ``CONN_MAX_AGE = 0`` is at the end of every
+request, so a process never holds more than ``DATABASE_POOL_SIZE`` connections
+however many threads it runs.
+"""
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db.backends.postgresql import base, creation
+from flite.core.postgresql import base as postgresql
+from .pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # Postgres won't drop or copy a database that pooled connections are still open to
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools()
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(postgresql.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(
+            (self.alias, conn_params.get('database')),
+            lambda: base.Database.connect(**conn_params),
+            size=settings.DATABASE_POOL_SIZE,
+            max_lifetime=settings.DATABASE_POOL_MAX_LIFETIME,
+            timeout=settings.DATABASE_POOL_TIMEOUT,
+            check_interval=settings.DATABASE_POOL_CHECK_INTERVAL,
+        )
+        connection = self.pool.acquire()
+
+        # As the base backend does for new connections, see there
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+import psycopg2
+from psycopg2 import extensions
+
+_lock = threading.Lock()
+pools = {}
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    At most ``size`` connections made with ``connect``, shared by the threads
+    of one process.
+
+    ``acquire`` waits up to ``timeout`` seconds for a connection to be
+    released. Connections older than ``max_lifetime`` are closed instead of
+    reused, and a connection idle for ``check_interval`` seconds or more runs
+    ``SELECT 1`` before it is handed out.
+    """
+
+    def __init__(self, connect, size, max_lifetime, timeout, check_interval):
+        self.connect = connect
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.total = 0
+        self.closed = False
+        self.stats = Counter()
+        # (connection, created, released) of idle connections, most recently released last
+        self._idle = deque()
+        self._created = {}
+        self._available = threading.Condition(threading.Lock())
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @property
+    def in_use(self):
+        return self.total - self.idle
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._available:
+            while True:
+                while self._idle:
+                    connection, created, released = self._idle.pop()
+                    if self._usable(connection, created, released):
+                        self.stats['acquired'] += 1
+                        return connection
+                    self._discard(connection)
+                if self.total < self.size:
+                    self.total += 1
+                    break
+                self.stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._available.wait(remaining):
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection free after {self.timeout}s "
+                                      f"({self.size} in use)")
+
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._available:
+                self.total -= 1
+                self._available.notify()
+            raise
+        with self._available:
+            self._created[id(connection)] = time.monotonic()
+            self.stats['acquired'] += 1
+            self.stats['opened'] += 1
+        return connection
+
+    def release(self, connection):
+        """
+        Returns ``connection`` to the pool, rolling back an unfinished
+        transaction, or closes it if it is broken.
+        """
+        try:
+            status = connection.get_transaction_status() if not connection.closed else None
+            no_transaction = (extensions.TRANSACTION_STATUS_IDLE, extensions.TRANSACTION_STATUS_UNKNOWN, None)
+            if status not in no_transaction:
+                connection.rollback()
+                status = connection.get_transaction_status()
+            healthy = status == extensions.TRANSACTION_STATUS_IDLE
+        except psycopg2.Error:
+            healthy = False
+
+        with self._available:
+            if healthy and not self.closed:
+                self._idle.append((connection, self._created[id(connection)], time.monotonic()))
+            else:
+                self._discard(connection)
+            self._available.notify()
+
+    def close(self):
+        """
+        Closes the idle connections. Connections in use close when released.
+        """
+        with self._available:
+            self.closed = True
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def _usable(self, connection, created, released):
+        now = time.monotonic()
+        if connection.closed or now - created >= self.max_lifetime:
+            return False
+        if now - released < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except psycopg2.Error:
+            self.stats['failed_checks'] += 1
+            return False
+        return True
+
+    def _discard(self, connection):
+        self.total -= 1
+        self._created.pop(id(connection), None)
+        self.stats['closed'] += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+def get_pool(key, connect, **options):
+    """
+    Returns this process's pool for ``key``, creating it with ``connect`` and
+    ``options``. Forked processes (e.g. gunicorn workers) get their own.
+    """
+    key = (os.getpid(), key)
+    with _lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(connect, **options)
+        return pools[key]
+
+
+def close_pools():
+    with _lock:
+        for pool in pools.values():
+            pool.close()
+        pools.clear()
@@ -0,0 +1,98 @@
+"""
+Counters with an expiry, for rate limits and attempt caps.
+
+A counter lives in the cache when its ``incr`` is atomic and keeps the key's
+expiry, as memcached's and django-redis's do. The database and file caches
+read, add and write the whole entry again, so concurrent counts get lost and
+every count pushes the expiry back. Counters for those caches are kept in the
+``Counter`` table instead, where one upsert counts and reads in a single
+statement.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connections, router
+from django.utils import timezone
+from .cache import shared
+from .models import Counter
+
+NON_ATOMIC_BACKENDS = (DatabaseCache, FileBasedCache)
+
+
+def count(cache, key, timeout):
+    """
+    Adds one to the counter ``key`` and returns its new value. The counter
+    starts again from 0 ``timeout`` seconds after its first count, however
+    often it is counted in between.
+
+    Counts kept in the ``Counter`` table are undone if the surrounding
+    transaction rolls back.
+    """
+    if isinstance(cache, NON_ATOMIC_BACKENDS):
+        return _count_in_table(key, timeout)
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Evicted between the add and the incr
+        cache.set(key, 1, timeout)
+        return 1
+
+
+def get(cache, key):
+    """
+    Returns the value of the counter ``key``, or 0 if it has expired.
+    """
+    if isinstance(cache, NON_ATOMIC_BACKENDS):
+        return Counter.objects.filter(name=key, expires__gt=timezone.now()).values_list(
+            'count', flat=True).first() or 0
+    return cache.get(key, 0)
+
+
+def reset(cache, key):
+    if isinstance(cache, NON_ATOMIC_BACKENDS):
+        Counter.objects.filter(name=key).delete()
+    else:
+        cache.delete(key)
+
+
+def _count_in_table(key, timeout):
+    connection = connections[router.db_for_write(Counter)]
+    table = connection.ops.quote_name(Counter._meta.db_table)
+    now = timezone.now()
+    expires = connection.ops.adapt_datetimefield_value(now + timedelta(seconds=timeout))
+    now = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        # An expired row is started again rather than counted on
+        cursor.execute(
+            f"INSERT INTO {table} (name, count, expires) VALUES (%s, 1, %s) "
+            f"ON CONFLICT (name) DO UPDATE SET "
+            f"count = CASE WHEN {table}.expires > %s THEN {table}.count + 1 ELSE 1 END, "
+            f"expires = CASE WHEN {table}.expires > %s THEN {table}.expires ELSE EXCLUDED.expires END "
+            f"RETURNING count",
+            [key, expires, now, now])
+        return cursor.fetchone()[0]
+
+
+def hit(key, limit, window):
+    """
+    Counts a hit against ``key`` and returns how many seconds to wait if that puts
+    it over ``limit`` hits in the sliding ``window`` (in seconds), or 0.
+
+    This is the sliding window counter: the previous fixed window's count,
+    weighted by how much of it the sliding window still covers, plus the current
+    window's count.
+    """
+    cache = shared(settings.RATE_LIMIT_CACHE)
+    now = time.time()
+    current = int(now // window)
+    elapsed = now - current * window
+
+    hits = count(cache, f'ratelimit:{key}:{current}', window * 2)
+    previous = get(cache, f'ratelimit:{key}:{current - 1}')
+
+    if previous * (window - elapsed) / window + hits > limit:
+        return window - elapsed
+    return 0
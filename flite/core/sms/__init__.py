@@ -0,0 +1,29 @@
+"""
+Outgoing SMS.
+
+``send`` queues a message and returns at once. A job worker delivers queued
+messages in batches through the backend named by ``SMS_BACKEND``, in the way
+``EMAIL_BACKEND`` picks the mail backend.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+from flite.core.jobs import job
+
+
+def get_backend():
+    return import_string(settings.SMS_BACKEND)()
+
+
+@job(queue='sms', batched=True)
+def deliver(messages):
+    backend = get_backend()
+    size = backend.max_batch_size
+    for start in range(0, len(messages), size):
+        backend.send_messages(messages[start:start + size])
+
+
+def send(to, body):
+    """
+    Queues ``body`` to be sent by SMS to the phone number ``to``.
+    """
+    return deliver.delay(to=str(to), body=body)
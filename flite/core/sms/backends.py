@@ -0,0 +1,58 @@
+import sys
+import threading
+from django.conf import settings
+from flite.core import http, sms
+
+
+class BaseSMSBackend:
+    """
+    Sends lists of ``{'to': ..., 'body': ...}`` messages through one provider.
+    """
+    # The most messages the provider accepts in one request
+    max_batch_size = 100
+
+    def send_messages(self, messages):
+        raise NotImplementedError
+
+
+class ConsoleBackend(BaseSMSBackend):
+    """
+    Writes messages to stdout, for development.
+    """
+    _lock = threading.Lock()
+
+    def send_messages(self, messages):
+        with self._lock:
+            for message in messages:
+                sys.stdout.write(f"SMS to {message['to']}: {message['body']}\n")
+            sys.stdout.flush()
+        return len(messages)
+
+
+class HTTPBackend(BaseSMSBackend):
+    """
+    Posts each batch as ``{"messages": [...]}`` to ``SMS_API_URL``, with
+    ``SMS_API_KEY`` as a bearer token.
+    """
+
+    def send_messages(self, messages):
+        http.request_json('POST', settings.SMS_API_URL, {'messages': messages},
+                          headers={'Authorization': f'Bearer {settings.SMS_API_KEY}'})
+        return len(messages)
+
+
+class LocmemBackend(BaseSMSBackend):
+    """
+    Keeps messages in ``flite.core.sms.outbox``, and each batch in
+    ``flite.core.sms.batches``, for tests.
+    """
+
+    def __init__(self):
+        if not hasattr(sms, 'outbox'):
+            sms.outbox = []
+            sms.batches = []
+
+    def send_messages(self, messages):
+        sms.outbox.extend(messages)
+        sms.batches.append(list(messages))
+        return len(messages)
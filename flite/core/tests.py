@@ -1,3 +1,548 @@
-from django.test import TestCase
+import hashlib
+import json
+import socketserver
+import threading
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from unittest import skipUnless
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from nose.tools import eq_, ok_, assert_raises
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from .authentication import CachedTokenAuthentication, token_cache
+from . import cache as shared_cache, db, hashers, http, jobs, metrics, outbox, ratelimit, sms
+from .sms.backends import HTTPBackend
+from .models import Counter, IdempotencyKey, Job, OutboxEvent
+from .postgresql_pool.pool import PoolTimeout, close_pools, get_pool
+from .money import Money, MoneyField
 
-# Create your tests here.
+
+class TestMoney(SimpleTestCase):
+
+    def test_from_naira_is_exact(self):
+        eq_(Money.from_naira('1500.25'), 150025)
+        eq_(Money.from_naira(0.1) + Money.from_naira(0.2), Money.from_naira('0.3'))
+
+    def test_sub_kobo_amounts_are_rejected(self):
+        with assert_raises(ValueError):
+            Money.from_naira('1.005')
+        with assert_raises(ValueError):
+            Money(1.5)
+
+    def test_arithmetic_stays_money(self):
+        ok_(isinstance(Money(100) + 50, Money))
+        ok_(isinstance(Money(100) - 50, Money))
+        ok_(isinstance(-Money(100), Money))
+        ok_(isinstance(sum([Money(1), Money(2)]), Money))
+
+    def test_naira(self):
+        eq_(Money(150025).naira, Decimal('1500.25'))
+
+    def test_str_is_the_kobo_count(self):
+        eq_((str(Money(-700)), f'{Money(-700)}', repr(Money(-700))), ('-700', '-700', 'Money(-700)'))
+
+
+class TestMoneyField(SimpleTestCase):
+
+    def test_loads_money(self):
+        field = MoneyField()
+        ok_(isinstance(field.from_db_value(100, None, None), Money))
+        ok_(isinstance(field.to_python('100'), Money))
+        eq_(field.from_db_value(None, None, None), None)
+
+
+class TestCachedTokenAuthentication(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = get_user_model().objects.create_user(username='cached')
+        self.key = Token.objects.get(user=self.user).key
+        self.auth = CachedTokenAuthentication()
+
+    def test_hit_needs_no_queries(self):
+        self.auth.authenticate_credentials(self.key)
+        with CaptureQueriesContext(connection) as queries:
+            user, token = self.auth.authenticate_credentials(self.key)
+        eq_(len(queries), 0)
+        eq_(user.pk, self.user.pk)
+        eq_(token.key, self.key)
+        eq_(token_cache.stats, {'local_hits': 1, 'shared_hits': 0, 'misses': 1})
+
+    def test_deleted_token_is_rejected(self):
+        self.auth.authenticate_credentials(self.key)
+        Token.objects.filter(key=self.key).delete()
+        with assert_raises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_deactivated_user_is_rejected(self):
+        self.auth.authenticate_credentials(self.key)
+        self.user.is_active = False
+        self.user.save()
+        with assert_raises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    @override_settings(TOKEN_AUTH_CACHE_SIZE=1)
+    def test_least_recently_used_is_evicted(self):
+        other = get_user_model().objects.create_user(username='other')
+        self.auth.authenticate_credentials(self.key)
+        self.auth.authenticate_credentials(Token.objects.get(user=other).key)
+        self.auth.authenticate_credentials(self.key)
+        eq_(token_cache.stats['misses'], 3)
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE='default')
+    def test_shared_tier_serves_other_processes(self):
+        self.auth.authenticate_credentials(self.key)
+        # Another process starts with an empty LRU
+        token_cache._entries.clear()
+        with CaptureQueriesContext(connection) as queries:
+            user, _ = self.auth.authenticate_credentials(self.key)
+        # The user is loaded by primary key, without the token lookup
+        eq_(len(queries), 1)
+        ok_('authtoken_token' not in queries[0]['sql'])
+        eq_(user.pk, self.user.pk)
+        eq_(token_cache.stats['shared_hits'], 1)
+        eq_(caches['default'].get(token_cache._shared_key(self.key)), (self.user.pk, True))
+
+        # Deactivated without the signal that would invalidate the token
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        token_cache._entries.clear()
+        with assert_raises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=True)
+
+        Token.objects.filter(key=self.key).delete()
+        token_cache._entries.clear()
+        with assert_raises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+
+class TestSharedCache(SimpleTestCase):
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'flite_cache'},
+        'process': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+    def test_process_local_caches_are_refused(self):
+        with assert_raises(ImproperlyConfigured):
+            shared_cache.shared('process')
+
+
+class TestCounters(TestCase):
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'flite_cache'},
+    })
+    def test_database_cache_counts_in_table(self):
+        db_cache = caches['default']
+        eq_([ratelimit.count(db_cache, 'attempts', 60) for _ in range(3)], [1, 2, 3])
+        eq_(ratelimit.get(db_cache, 'attempts'), 3)
+
+        # Counting doesn't push the expiry back, and an expired counter starts again
+        counter = Counter.objects.get(name='attempts')
+        ratelimit.count(db_cache, 'attempts', 600)
+        eq_(Counter.objects.get(name='attempts').expires, counter.expires)
+        Counter.objects.filter(name='attempts').update(expires=timezone.now())
+        eq_(ratelimit.get(db_cache, 'attempts'), 0)
+        eq_(ratelimit.count(db_cache, 'attempts', 60), 1)
+
+        ratelimit.reset(db_cache, 'attempts')
+        eq_(ratelimit.get(db_cache, 'attempts'), 0)
+
+        ratelimit.count(db_cache, 'expired', 60)
+        Counter.objects.update(expires=timezone.now())
+        call_command('purge_counters', stdout=StringIO())
+        ok_(not Counter.objects.exists())
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+    def test_atomic_caches_count_in_cache(self):
+        atomic_cache = caches['default']
+        eq_([ratelimit.count(atomic_cache, 'attempts', 60) for _ in range(3)], [1, 2, 3])
+        eq_(ratelimit.get(atomic_cache, 'attempts'), 3)
+        ok_(not Counter.objects.exists())
+
+
+SCRYPT_FIRST = [
+    'flite.core.hashers.ScryptPasswordHasher',
+    'flite.core.hashers.PBKDF2PasswordHasher',
+]
+
+
+@skipUnless(hasattr(hashlib, 'scrypt'), "Python was built without OpenSSL 1.1's scrypt")
+@override_settings(PASSWORD_HASHERS=SCRYPT_FIRST, SCRYPT_WORK_FACTOR=2 ** 10)
+class TestPasswordHashers(TestCase):
+
+    def test_scrypt_round_trip(self):
+        encoded = make_password('letmein')
+        ok_(encoded.startswith('scrypt$1024$'))
+        ok_(check_password('letmein', encoded))
+        ok_(not check_password('letmeout', encoded))
+
+    def test_scrypt_parameter_change_needs_update(self):
+        encoded = make_password('letmein')
+        ok_(not get_hasher().must_update(encoded))
+        with override_settings(SCRYPT_WORK_FACTOR=2 ** 11):
+            ok_(get_hasher().must_update(encoded))
+
+    def test_login_rehashes_with_preferred_hasher(self):
+        user = get_user_model().objects.create_user(username='legacy')
+        user.password = make_password('letmein', hasher='pbkdf2_sha256')
+        user.save()
+
+        response = self.client.post('/api-token-auth/', {'username': 'legacy', 'password': 'letmein'})
+        eq_(response.status_code, 200)
+        user.refresh_from_db()
+        ok_(user.password.startswith('scrypt$'))
+        ok_(user.check_password('letmein'))
+
+    def test_busy_pool_fails_fast(self):
+        _, slots = hashers._get_pool()
+        held = 0
+        while slots.acquire(blocking=False):
+            held += 1
+        try:
+            with override_settings(PASSWORD_HASHING_TIMEOUT=0.01):
+                with assert_raises(hashers.HashingPoolBusy):
+                    make_password('letmein')
+        finally:
+            for _ in range(held):
+                slots.release()
+
+
+calls = []
+
+
+@jobs.job
+def record(value):
+    calls.append(value)
+
+
+@jobs.job(max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+@override_settings(SMS_BACKEND='flite.core.sms.backends.LocmemBackend')
+class TestJobs(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        sms.outbox = []
+        sms.batches = []
+
+    def test_delay_queues_and_worker_runs(self):
+        record.delay('a')
+        eq_(calls, [])
+        eq_(jobs.run_pending(), 1)
+        eq_(calls, ['a'])
+        eq_(Job.objects.count(), 0)
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        explode.delay()
+        with self.assertLogs('flite.core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job = Job.objects.get()
+        eq_((job.status, job.attempts), (Job.QUEUED, 1))
+        ok_(job.run_at > timezone.now())
+        ok_('boom' in job.last_error)
+
+        eq_(jobs.run_pending(), 0)
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('flite.core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job = Job.objects.get()
+        eq_((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_abandoned_job_is_reclaimed(self):
+        record.delay('b')
+        Job.objects.update(status=Job.RUNNING, locked_until=timezone.now())
+        eq_(jobs.run_pending(), 1)
+        eq_(calls, ['b'])
+
+    def test_sms_are_sent_in_batches(self):
+        for i in range(5):
+            sms.send(f'+23480000000{i}', 'hello')
+        eq_(sms.outbox, [])
+        jobs.run_pending('sms')
+        eq_(len(sms.outbox), 5)
+        eq_(len(sms.batches), 1)
+
+    def test_run_jobs_command(self):
+        record.delay('c')
+        call_command('run_jobs', once=True, stdout=StringIO())
+        eq_(calls, ['c'])
+
+
+relayed = []
+
+
+def collect(messages):
+    relayed.extend(messages)
+
+
+def reject(messages):
+    raise RuntimeError('consumer down')
+
+
+@override_settings(OUTBOX_CONSUMERS=['flite.core.tests.collect'])
+class TestOutbox(TestCase):
+
+    def setUp(self):
+        relayed.clear()
+
+    def test_event_rolls_back_with_its_transaction(self):
+        try:
+            with transaction.atomic():
+                outbox.publish('thing.happened', 1, {})
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        eq_(OutboxEvent.objects.count(), 0)
+
+    def test_relays_in_order_once(self):
+        for i in range(5):
+            outbox.publish('thing.happened', i, {'n': i})
+        eq_(outbox.relay(batch_size=3), 3)
+        eq_(outbox.relay(batch_size=3), 2)
+        eq_(outbox.relay(batch_size=3), 0)
+        eq_([message['payload']['n'] for message in relayed], [0, 1, 2, 3, 4])
+        eq_(OutboxEvent.objects.filter(published__isnull=True).count(), 0)
+
+    def test_failed_batch_is_relayed_again(self):
+        outbox.publish('thing.happened', 1, {})
+        with override_settings(OUTBOX_CONSUMERS=['flite.core.tests.reject']):
+            with assert_raises(RuntimeError):
+                outbox.relay()
+        eq_(outbox.relay(), 1)
+        eq_(len(relayed), 1)
+
+    def test_relay_outbox_command(self):
+        outbox.publish('thing.happened', 1, {})
+        call_command('relay_outbox', once=True, stdout=StringIO())
+        eq_(len(relayed), 1)
+
+    def test_changes_write_events(self):
+        user = get_user_model().objects.create_user(username='outboxed')
+        event = OutboxEvent.objects.get(topic=outbox.USER_CREATED)
+        eq_(event.aggregate_id, str(user.pk))
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.user = get_user_model().objects.create_user(username='ops', is_staff=True)
+
+    def test_records_per_view_and_serves_prometheus_text(self):
+        self.client.force_login(self.user)
+        self.client.get(f'/api/v1/users/{self.user.pk}/')
+
+        response = self.client.get('/metrics/')
+        eq_(response.status_code, 200)
+        ok_(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        ok_('flite_request_duration_seconds_count{view="user-detail",method="GET"} 1' in body)
+        ok_('flite_db_queries_bucket{view="user-detail",method="GET",le="+Inf"} 1' in body)
+        ok_('flite_serializer_duration_seconds_sum{view="user-detail",method="GET"}' in body)
+        ok_('flite_requests_total{view="user-detail",method="GET",status="200"} 1' in body)
+
+    def test_admin_only(self):
+        self.client.force_login(get_user_model().objects.create_user(username='customer'))
+        eq_(self.client.get('/metrics/').status_code, 403)
+
+    @override_settings(METRICS_N_PLUS_ONE_THRESHOLD=3)
+    def test_flags_repeated_sql(self):
+        def view(request):
+            for _ in range(3):
+                list(Job.objects.filter(pk=uuid.uuid4()))
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        with self.assertLogs('flite.core.metrics', 'WARNING'):
+            metrics.MetricsMiddleware(view)(request)
+        ok_('flite_n_plus_one_total{view="unmatched",method="GET"} 1' in metrics.registry.render())
+
+    @override_settings(METRICS_N_PLUS_ONE_THRESHOLD=3, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'flite_cache'},
+    })
+    def test_transaction_control_and_cache_queries_are_not_repeats(self):
+        stats = {'SAVEPOINT "s1"': 3, 'RELEASE SAVEPOINT "s1"': 3, 'BEGIN': 3,
+                 'SELECT cache_key, value, expires FROM "flite_cache" WHERE cache_key IN (%s)': 3,
+                 'SELECT 1 FROM "core_job" WHERE "id" = %s': 2}
+        eq_(metrics._repeated_statements(stats), {'SELECT 1 FROM "core_job" WHERE "id" = %s': 2})
+
+
+@override_settings(REPLICA_DATABASES=['replica0'])
+class TestReplicaRouting(SimpleTestCase):
+    # Pins are kept in the database cache
+    allow_database_queries = True
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.router = db.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.User = get_user_model()
+
+    def route(self, request, model=None):
+        """
+        Returns the alias reads of ``model`` would use while serving ``request``.
+        """
+        routed = []
+
+        def view(request):
+            routed.append(self.router.db_for_read(model or self.User))
+            return HttpResponse()
+
+        db.ReplicaRoutingMiddleware(view)(request)
+        return routed[0]
+
+    def test_safe_requests_read_from_replica(self):
+        eq_(self.route(self.factory.get('/')), 'replica0')
+        eq_(self.route(self.factory.post('/')), 'default')
+        eq_(self.router.db_for_write(self.User), 'default')
+
+    def test_outside_requests_read_from_primary(self):
+        eq_(self.router.db_for_read(self.User), 'default')
+
+    def test_primary_only_models(self):
+        eq_(self.route(self.factory.get('/'), IdempotencyKey), 'default')
+
+    def test_writer_is_pinned_to_primary(self):
+        token = {'HTTP_AUTHORIZATION': 'Token writer'}
+        self.route(self.factory.post('/', **token))
+        eq_(self.route(self.factory.get('/', **token)), 'default')
+        eq_(self.route(self.factory.get('/', HTTP_AUTHORIZATION='Token other')), 'replica0')
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.route(self.factory.post('/', HTTP_AUTHORIZATION='Token brief'))
+        eq_(self.route(self.factory.get('/', HTTP_AUTHORIZATION='Token brief')), 'replica0')
+
+    def test_use_primary(self):
+        def view(request):
+            with db.use_primary():
+                eq_(self.router.db_for_read(self.User), 'default')
+            eq_(self.router.db_for_read(self.User), 'replica0')
+            return HttpResponse()
+
+        db.ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+
+
+@skipUnless(connection.vendor == 'postgresql', "Pools PostgreSQL connections")
+class TestConnectionPool(SimpleTestCase):
+
+    def setUp(self):
+        params = connection.get_connection_params()
+        self.connect = lambda: psycopg2.connect(**params)
+        self.database = uuid.uuid4().hex
+        self.addCleanup(close_pools)
+
+    def pool(self, **options):
+        options = dict({'size': 1, 'max_lifetime': 60, 'timeout': 0.05, 'check_interval': 60}, **options)
+        return get_pool(('test', self.database), self.connect, **options)
+
+    def test_bounded_and_reused(self):
+        pool = self.pool()
+        first = pool.acquire()
+        with assert_raises(PoolTimeout):
+            pool.acquire()
+        pool.release(first)
+        ok_(pool.acquire() is first)
+        eq_((pool.stats['opened'], pool.stats['waits'], pool.stats['timeouts']), (1, 1, 1))
+
+    def test_open_transaction_is_rolled_back(self):
+        pool = self.pool()
+        conn = pool.acquire()
+        conn.cursor().execute('SELECT 1')
+        pool.release(conn)
+        ok_(pool.acquire() is conn)
+        eq_(conn.get_transaction_status(), psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_old_connections_are_replaced(self):
+        pool = self.pool(max_lifetime=0)
+        first = pool.acquire()
+        pool.release(first)
+        ok_(pool.acquire() is not first)
+        ok_(first.closed)
+
+    def test_dead_idle_connection_fails_health_check(self):
+        pool = self.pool(check_interval=0)
+        first = pool.acquire()
+        pid = first.get_backend_pid()
+        pool.release(first)
+        admin = self.connect()
+        admin.cursor().execute('SELECT pg_terminate_backend(%s)', [pid])
+        admin.close()
+
+        ok_(pool.acquire().get_backend_pid() != pid)
+        eq_(pool.stats['failed_checks'], 1)
+
+    def test_saturation_metrics(self):
+        self.pool(size=2).acquire()
+        body = metrics.registry.render()
+        labels = f'alias="test",database="{self.database}"'
+        ok_(f'flite_db_pool_connections{{{labels},state="in_use"}} 1' in body)
+        ok_(f'flite_db_pool_connections{{{labels},state="idle"}} 0' in body)
+        ok_(f'flite_db_pool_size{{{labels}}} 2' in body)
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.client_address, self.headers['Authorization'], json.loads(body)))
+        status = 500 if self.path == '/fail' else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestHTTPClient(SimpleTestCase):
+
+    def setUp(self):
+        server = RecordingServer(('127.0.0.1', 0), RecordingHandler)
+        server.received = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.url = f'http://127.0.0.1:{server.server_port}'
+
+    def test_sms_batches_share_a_connection(self):
+        with override_settings(SMS_API_URL=f'{self.url}/messages', SMS_API_KEY='secret'):
+            for i in range(3):
+                HTTPBackend().send_messages([{'to': f'+23480000000{i}', 'body': 'hello'}])
+
+        eq_(len(self.server.received), 3)
+        eq_(len({address for address, _, _ in self.server.received}), 1)
+        address, authorization, payload = self.server.received[0]
+        eq_(authorization, 'Bearer secret')
+        eq_(payload, {'messages': [{'to': '+234800000000', 'body': 'hello'}]})
+
+    def test_error_status_raises(self):
+        with assert_raises(http.HTTPError) as raised:
+            http.request_json('POST', f'{self.url}/fail', {})
+        eq_(raised.exception.status, 500)
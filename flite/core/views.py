@@ -1,3 +1,27 @@
-from django.shortcuts import render
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .metrics import registry
 
-# Create your views here.
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class MetricsView(APIView):
+    """
+    Request metrics in the Prometheus text format
+    """
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PrometheusRenderer,)
+
+    def get(self, request):
+        response = Response(registry.render())
+        response['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return response
@@ -5,11 +5,17 @@ from django.contrib import admin
 from django.views.generic.base import RedirectView
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken import views
-from .users.views import UserViewSet, UserCreateViewSet, SendNewPhonenumberVerifyViewSet
+from .core.views import MetricsView
+from .users.views import (UserViewSet, UserCreateViewSet, SendNewPhonenumberVerifyViewSet, TransactionViewSet,
+                          P2PTransferViewSet, BankViewSet, StatementViewSet)
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'users', UserCreateViewSet)
 router.register(r'phone', SendNewPhonenumberVerifyViewSet)
+router.register(r'transactions', TransactionViewSet)
+router.register(r'statements', StatementViewSet)
+router.register(r'transfers', P2PTransferViewSet, 'transfer')
+router.register(r'banks', BankViewSet, 'bank')
 
 
 urlpatterns = [
@@ -17,6 +23,7 @@ urlpatterns = [
     #   path('jet_api/', include('jet_django.urls')),
     path('api/v1/', include(router.urls)),
     path('api-token-auth/', views.obtain_auth_token),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
 
     # the 'api-root' from django rest-frameworks default router
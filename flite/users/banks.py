@@ -0,0 +1,150 @@
+"""
+The bank directory, held in memory by every process.
+
+``directory()`` returns an immutable index of ``AllBanks`` by bank code and
+acronym, with prefix search on names. Editing a bank stamps a new version in
+``BANK_DIRECTORY_CACHE``, which must be shared by every process (see
+``invalidate_bank_directory``). Processes compare their copy's version with
+the stamp at most every ``BANK_DIRECTORY_CHECK_INTERVAL`` seconds and reload
+when it has changed, so lookups don't query the database.
+"""
+import bisect
+import csv
+import json
+import threading
+import time
+import uuid
+from collections import namedtuple
+from types import MappingProxyType
+from django.conf import settings
+from django.db import transaction
+from flite.core import cache
+from flite.core.db import use_primary
+from .models import AllBanks
+
+VERSION_KEY = 'bank-directory:version'
+
+BankEntry = namedtuple('BankEntry', ('id', 'name', 'acronym', 'bank_code'))
+
+
+class BankDirectory:
+
+    def __init__(self, banks, version=None):
+        self.version = version
+        banks = sorted(banks, key=lambda bank: bank.name.lower())
+        self.by_code = MappingProxyType({bank.bank_code: bank for bank in banks})
+        self.by_acronym = MappingProxyType({bank.acronym.upper(): bank for bank in banks if bank.acronym})
+        self._names = tuple(bank.name.lower() for bank in banks)
+        self._banks = tuple(banks)
+
+    def __len__(self):
+        return len(self._banks)
+
+    def __iter__(self):
+        return iter(self._banks)
+
+    def get(self, code):
+        return self.by_code.get(code)
+
+    def get_by_acronym(self, acronym):
+        return self.by_acronym.get(acronym.upper())
+
+    def search(self, prefix, limit=20):
+        """
+        Banks whose name starts with ``prefix``, ignoring case, by name.
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._names, prefix)
+        found = []
+        for name, bank in zip(self._names[start:], self._banks[start:]):
+            if not name.startswith(prefix) or len(found) == limit:
+                break
+            found.append(bank)
+        return found
+
+
+def _cache():
+    return cache.shared(settings.BANK_DIRECTORY_CACHE)
+
+
+def load(version=None):
+    # A lagging replica would be cached under the new version
+    with use_primary():
+        rows = AllBanks.objects.values_list('id', 'name', 'acronym', 'bank_code')
+        banks = [BankEntry(*row) for row in rows]
+    return BankDirectory(banks, version)
+
+
+_lock = threading.Lock()
+_directory = None
+_checked = 0
+
+
+def directory():
+    global _directory, _checked
+    current = _directory
+    if current is not None and time.monotonic() - _checked < settings.BANK_DIRECTORY_CHECK_INTERVAL:
+        return current
+
+    with _lock:
+        if _directory is not None and time.monotonic() - _checked < settings.BANK_DIRECTORY_CHECK_INTERVAL:
+            return _directory
+        version = _cache().get(VERSION_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not _cache().add(VERSION_KEY, version, None):
+                version = _cache().get(VERSION_KEY)
+        if _directory is None or _directory.version != version:
+            _directory = load(version)
+        _checked = time.monotonic()
+        return _directory
+
+
+def invalidate():
+    """
+    Makes every process reload the directory, this one on its next lookup.
+    The version is stamped again on commit, so a process that reloads before
+    then doesn't keep what the change replaced.
+    """
+    global _directory
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+    with _lock:
+        _directory = None
+    transaction.on_commit(lambda: _cache().set(VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def read_banks(path):
+    """
+    Yields ``(bank_code, name, acronym)`` from a ``.csv`` file with a header
+    row or a JSON list, with the code under ``bank_code`` or ``code``.
+    """
+    with open(path, newline='') as source:
+        rows = csv.DictReader(source) if path.endswith('.csv') else json.load(source)
+        for row in rows:
+            code = str(row.get('bank_code') or row.get('code') or '').strip()
+            if code:
+                yield code, row['name'].strip(), (row.get('acronym') or '').strip()
+
+
+def import_banks(banks):
+    """
+    Adds the ``(bank_code, name, acronym)`` banks missing from the directory
+    and updates those whose name or acronym changed, in one transaction.
+    Returns the numbers of banks created and updated.
+    """
+    with transaction.atomic():
+        existing = {bank.bank_code: bank for bank in AllBanks.objects.select_for_update()}
+        new = {}
+        updated = 0
+        for code, name, acronym in banks:
+            bank = existing.get(code)
+            if bank is None:
+                new[code] = AllBanks(bank_code=code, name=name, acronym=acronym)
+            elif (bank.name, bank.acronym) != (name, acronym):
+                AllBanks.objects.filter(pk=bank.pk).update(name=name, acronym=acronym)
+                updated += 1
+        AllBanks.objects.bulk_create(new.values())
+        # Neither bulk_create nor update sends the signals that would
+        if new or updated:
+            invalidate()
+    return len(new), updated
@@ -0,0 +1,13 @@
+from django_filters import rest_framework as filters
+from .models import Transaction
+
+
+class TransactionFilter(filters.FilterSet):
+    type = filters.ChoiceFilter(field_name='kind', choices=Transaction.KIND_CHOICES)
+    status = filters.CharFilter(field_name='status')
+    created_after = filters.IsoDateTimeFilter(field_name='created', lookup_expr='gte')
+    created_before = filters.IsoDateTimeFilter(field_name='created', lookup_expr='lt')
+
+    class Meta:
+        model = Transaction
+        fields = ('type', 'status', 'created_after', 'created_before')
@@ -0,0 +1,119 @@
+import uuid
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from flite.core import outbox
+from flite.core.money import Money
+from flite.users import models
+
+
+class LedgerError(Exception):
+    """
+    Raised when a journal cannot be posted
+    """
+
+
+def lock_balances(*owner_ids):
+    """
+    Locks the active balances of the given owners and returns them keyed by owner id.
+
+    Rows are always locked in primary key order, so two postings touching the
+    same accounts (in any order) queue up instead of deadlocking.
+    """
+    balances = models.Balance.objects.select_for_update().filter(
+        owner_id__in=owner_ids, active=True).order_by('pk')
+    return {str(balance.owner_id): balance for balance in balances}
+
+
+def post(reference, legs):
+    """
+    Writes one balanced journal to the ledger and applies its wallet legs to the
+    materialized balances.
+
+    ``legs`` is a list of ``(account, balance, amount)`` tuples with signed kobo
+    amounts (credits positive) that must sum to zero. ``balance`` is the Balance
+    for wallet legs and ``None`` for system accounts. Must be called inside
+    ``transaction.atomic()`` with every wallet balance locked by ``lock_balances``.
+
+    Returns the created LedgerEntry rows in leg order.
+    """
+    if not legs or sum(amount for _, _, amount in legs) != 0:
+        raise LedgerError("Journal legs must sum to zero")
+
+    journal = uuid.uuid4()
+    entries = []
+    for account, balance, amount in legs:
+        amount = Money(amount)
+        if balance is None:
+            entries.append(models.LedgerEntry(
+                journal=journal, reference=reference, account=account, amount=amount))
+            continue
+
+        models.Balance.objects.filter(pk=balance.pk).update(
+            book_balance=F('book_balance') + int(amount),
+            available_balance=F('available_balance') + int(amount),
+            ledger_sequence=F('ledger_sequence') + 1,
+        )
+        balance.book_balance += amount
+        balance.available_balance += amount
+        balance.ledger_sequence += 1
+        entries.append(models.LedgerEntry(
+            journal=journal, reference=reference, account=models.LedgerEntry.WALLET,
+            balance=balance, amount=amount, sequence=balance.ledger_sequence,
+            balance_after=balance.available_balance))
+
+    models.LedgerEntry.objects.bulk_create(entries)
+    return entries
+
+
+def deposit(owner, amount, source=models.LedgerEntry.CARD_FUNDING, reference=None):
+    """
+    Credits ``amount`` kobo to ``owner``'s balance from the ``source`` system account
+    and returns the deposit Transaction.
+    """
+    amount = Money(amount)
+    if amount <= 0:
+        raise LedgerError("Deposit amount must be greater than zero")
+
+    reference = reference or uuid.uuid4().hex
+    with transaction.atomic():
+        balance = lock_balances(owner.pk).get(str(owner.pk))
+        if balance is None:
+            raise LedgerError("User has no active balance")
+        post(reference, [
+            (source, None, -amount),
+            (models.LedgerEntry.WALLET, balance, amount),
+        ])
+        outbox.publish(outbox.DEPOSIT_POSTED, reference, {
+            'owner': owner.pk, 'amount': amount, 'new_balance': balance.available_balance})
+        return models.Transaction.objects.create(
+            owner=owner, kind=models.Transaction.DEPOSIT, reference=reference,
+            status=models.Transaction.SUCCESS, amount=amount, new_balance=balance.available_balance)
+
+
+def rebuild_balance(balance):
+    """
+    Recomputes a balance from its latest checkpoint plus the entries posted after it.
+
+    Returns an ``(available_balance, sequence)`` tuple.
+    """
+    checkpoint = balance.checkpoints.order_by('-sequence').first()
+    if checkpoint:
+        amount, sequence = checkpoint.available_balance, checkpoint.sequence
+    else:
+        amount, sequence = Money(0), 0
+
+    since = models.LedgerEntry.objects.filter(balance=balance, sequence__gt=sequence).aggregate(
+        total=Sum('amount'), last=Max('sequence'))
+    return amount + (since['total'] or 0), since['last'] or sequence
+
+
+def checkpoint(balance):
+    """
+    Records the balance's current materialized amount as a checkpoint.
+    """
+    with transaction.atomic():
+        balance = models.Balance.objects.select_for_update().get(pk=balance.pk)
+        checkpoint, _ = models.BalanceCheckpoint.objects.get_or_create(
+            balance=balance, sequence=balance.ledger_sequence,
+            defaults={'available_balance': balance.available_balance})
+    return checkpoint
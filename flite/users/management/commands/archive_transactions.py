@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from flite.users import partitions
+
+
+class Command(BaseCommand):
+    help = ("Moves monthly transaction partitions older than --months to gzipped CSV files in storage, "
+            "keeping each owner's archived sum")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help="Months of transactions to keep before this one, "
+                                 "defaults to TRANSACTION_HOT_MONTHS")
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            self.stdout.write("The transaction table isn't partitioned on this database")
+            return
+        archived = partitions.archive(options['months'])
+        for archive in archived:
+            self.stdout.write(
+                f"Archived {archive.rows} transactions from {archive.partition} to {archive.file}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(archived)} partitions"))
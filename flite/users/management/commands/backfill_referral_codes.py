@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from flite.users.models import User, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Creates the missing profiles, with referral codes, for existing users in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(userprofile__isnull=True).order_by('pk').values_list('pk', flat=True)
+        created = 0
+        while True:
+            batch = list(missing[:options['batch_size']])
+            if not batch:
+                break
+            created += self.create_profiles(batch)
+            self.stdout.write(f"{created} profiles created")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {created} profiles"))
+
+    def create_profiles(self, user_ids):
+        # A referral code collision fails the whole batch, so retry it with fresh codes
+        for _ in range(UserProfile.REFERRAL_CODE_ATTEMPTS):
+            profiles = [
+                UserProfile(user_id=pk, referral_code=UserProfile.generate_new_referal_code())
+                for pk in user_ids
+            ]
+            try:
+                with transaction.atomic():
+                    UserProfile.objects.bulk_create(profiles)
+                return len(profiles)
+            except IntegrityError:
+                continue
+        raise CommandError(f"Could not create profiles for users {user_ids[0]}..{user_ids[-1]}")
@@ -0,0 +1,231 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from flite.users import ledger, otp
+from flite.users.models import User, NewUserPhoneVerification
+from flite.users.transfers import p2p_transfer
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), *[os.pardir] * 4))
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, 'benchmarks', 'baseline.json')
+PASSWORD = 'bench-Pa55word!'
+
+
+class Scenario:
+    """
+    A set of requests to time. ``prepare`` runs untimed and returns one
+    ``(method, path, data, token)`` tuple per request.
+    """
+
+    def __init__(self, name, prepare):
+        self.name = name
+        self.prepare = prepare
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the main API endpoints in-process against the configured database, "
+            "and compares the results with a stored baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help="Requests per scenario")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Use 1 on SQLite, which allows a single writer")
+        parser.add_argument('--scenario', action='append', help="Only run these scenarios")
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed fractional slowdown in p95 and throughput")
+
+    def handle(self, *args, **options):
+        self.run_id = uuid.uuid4().hex[:8]
+        scenarios = [
+            Scenario('signup', self.prepare_signup),
+            Scenario('token_auth', self.prepare_token_auth),
+            Scenario('user_retrieve', self.prepare_user_retrieve),
+            Scenario('phone_send', self.prepare_phone_send),
+            Scenario('phone_verify', self.prepare_phone_verify),
+            Scenario('transfer', self.prepare_transfer),
+            Scenario('history', self.prepare_history),
+            Scenario('summary', self.prepare_summary),
+        ]
+        if options['scenario']:
+            unknown = set(options['scenario']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenario']]
+
+        results = {}
+        # Rate limits would turn the phone scenarios into a benchmark of 429s
+        with override_settings(OTP_PHONE_LIMIT=10 ** 9, OTP_IP_LIMIT=10 ** 9, PASSWORD_HASHING_TIMEOUT=60):
+            try:
+                for scenario in scenarios:
+                    requests = scenario.prepare(options['requests'])
+                    results[scenario.name] = self.run(requests, options['concurrency'])
+            finally:
+                self.cleanup()
+
+        self.report(results)
+        self.compare(results, options)
+
+    def user(self, funded=0):
+        user = User.objects.create_user(username=f'api-bench-{self.run_id}-{uuid.uuid4().hex[:8]}',
+                                        password=PASSWORD)
+        if funded:
+            ledger.deposit(user, funded)
+        return user
+
+    def prepare_signup(self, count):
+        return [('post', '/api/v1/users/', {
+            'username': f'api-bench-{self.run_id}-signup-{i}', 'password': PASSWORD}, None)
+            for i in range(count)]
+
+    def prepare_token_auth(self, count):
+        user = self.user()
+        return [('post', '/api-token-auth/', {'username': user.username, 'password': PASSWORD}, None)] * count
+
+    def prepare_user_retrieve(self, count):
+        user = self.user()
+        return [('get', f'/api/v1/users/{user.pk}/', None, user.auth_token.key)] * count
+
+    def _phone(self, i):
+        return f'+23470{int(self.run_id, 16) % 10 ** 4:04d}{i:04d}'
+
+    def prepare_phone_send(self, count):
+        return [('post', '/api/v1/phone/', {'phone_number': self._phone(i), 'email': 'bench@example.com'},
+                 None) for i in range(count)]
+
+    def prepare_phone_verify(self, count):
+        requests = []
+        for i in range(count):
+            verification, code = otp.issue(self._phone(5000 + i), 'bench@example.com')
+            requests.append(('put', f'/api/v1/phone/{verification.pk}/', {'code': code}, None))
+        return requests
+
+    def prepare_transfer(self, count):
+        senders = [self.user(funded=10 ** 9) for _ in range(4)]
+        recipient = self.user()
+        return [('post', '/api/v1/transfers/', {'recipient': str(recipient.pk), 'amount': 100},
+                 senders[i % len(senders)].auth_token.key) for i in range(count)]
+
+    def prepare_history(self, count):
+        user = self.user(funded=10 ** 6)
+        other = self.user()
+        for _ in range(50):
+            p2p_transfer(user, other, 1)
+        return [('get', '/api/v1/transactions/', None, user.auth_token.key)] * count
+
+    def prepare_summary(self, count):
+        user = self.user(funded=10 ** 6)
+        return [('get', f'/api/v1/users/{user.pk}/summary/', None, user.auth_token.key)] * count
+
+    def run(self, requests, concurrency):
+        def worker(batch):
+            client = Client()
+            timings = []
+            queries = [0]
+
+            def count(execute, sql, params, many, context):
+                queries[0] += 1
+                return execute(sql, params, many, context)
+
+            try:
+                with ExitStack() as stack:
+                    for alias_connection in connections.all():
+                        stack.enter_context(alias_connection.execute_wrapper(count))
+                    for method, path, data, token in batch:
+                        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+                        started = time.perf_counter()
+                        if method == 'get':
+                            response = client.get(path, **headers)
+                        else:
+                            response = getattr(client, method)(
+                                path, json.dumps(data), content_type='application/json', **headers)
+                        timings.append((time.perf_counter() - started, response.status_code < 400))
+            finally:
+                connections.close_all()
+            return timings, queries[0]
+
+        batches = [requests[i::concurrency] for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(worker, batches))
+        elapsed = time.perf_counter() - started
+
+        timings = [timing for batch, _ in outcomes for timing in batch]
+        latencies = sorted(latency for latency, _ in timings)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+        return {
+            'requests': len(timings),
+            'errors': sum(1 for _, ok in timings if not ok),
+            'throughput': round(len(timings) / elapsed, 1),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'queries_per_request': round(sum(queries for _, queries in outcomes) / len(timings), 2),
+        }
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=f'api-bench-{self.run_id}').delete()
+        NewUserPhoneVerification.objects.filter(email='bench@example.com').delete()
+
+    def report(self, results):
+        self.stdout.write(f"{'scenario':<16}{'reqs':>6}{'errors':>8}{'req/s':>9}{'p50 ms':>9}"
+                          f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<16}{result['requests']:>6}{result['errors']:>8}{result['throughput']:>9}"
+                f"{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+                f"{result['queries_per_request']:>9}")
+
+    def compare(self, results, options):
+        path = options['baseline']
+        baselines = {}
+        if os.path.exists(path):
+            with open(path) as source:
+                baselines = json.load(source)
+
+        if options['save_baseline']:
+            baselines.setdefault(connection.vendor, {}).update(results)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as target:
+                json.dump(baselines, target, indent=2, sort_keys=True)
+                target.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Saved {connection.vendor} baseline to {path}"))
+            return
+
+        baseline = baselines.get(connection.vendor)
+        if not baseline:
+            self.stdout.write(f"No {connection.vendor} baseline in {path}, nothing to compare")
+            return
+
+        threshold = options['threshold']
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if not expected:
+                continue
+            if result['errors']:
+                regressions.append(f"{name}: {result['errors']} requests failed")
+            # Per-thread token cache misses make this fractional, an extra query per request is not
+            if result['queries_per_request'] >= expected['queries_per_request'] + 0.5:
+                regressions.append(f"{name}: {result['queries_per_request']} queries per request, "
+                                   f"baseline {expected['queries_per_request']}")
+            if result['p95_ms'] > expected['p95_ms'] * (1 + threshold):
+                regressions.append(f"{name}: p95 {result['p95_ms']} ms, baseline {expected['p95_ms']} ms")
+            if result['throughput'] < expected['throughput'] * (1 - threshold):
+                regressions.append(f"{name}: {result['throughput']} req/s, baseline {expected['throughput']}")
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(regression))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
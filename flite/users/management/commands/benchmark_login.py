@@ -0,0 +1,69 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from flite.users.models import User
+
+
+class Command(BaseCommand):
+    help = "Measures api-token-auth latency at a fixed concurrency with the configured password hasher"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--users', type=int, default=8)
+        parser.add_argument('--legacy', action='store_true',
+                            help="Store PBKDF2 hashes first, so the first logins also rehash")
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        password = uuid.uuid4().hex
+        users = []
+        for i in range(options['users']):
+            user = User.objects.create_user(username=f'login-bench-{run_id}-{i}', password=password)
+            if options['legacy']:
+                user.password = make_password(password, hasher='pbkdf2_sha256')
+                user.save(update_fields=['password'])
+            users.append(user)
+
+        def login(i):
+            client = Client()
+            started = time.perf_counter()
+            response = client.post('/api-token-auth/', {
+                'username': users[i % len(users)].username, 'password': password})
+            return time.perf_counter() - started, response.status_code
+
+        def worker(indexes):
+            try:
+                return [login(i) for i in indexes]
+            finally:
+                connections.close_all()
+
+        concurrency = options['concurrency']
+        batches = [range(i, options['logins'], concurrency) for i in range(concurrency)]
+        started = time.perf_counter()
+        # The test client is only a transport here, keep the real hosts check out of the way
+        with override_settings(ALLOWED_HOSTS=['*']), ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = [result for batch in pool.map(worker, batches) for result in batch]
+        elapsed = time.perf_counter() - started
+
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        latencies = sorted(latency for latency, code in results if code == 200)
+        failed = len(results) - len(latencies)
+        if not latencies:
+            self.stderr.write(self.style.ERROR(f"All {failed} logins failed"))
+            raise SystemExit(1)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(f"hasher:      {get_hasher().algorithm}")
+        self.stdout.write(f"logins:      {len(latencies)} ok, {failed} failed at concurrency {concurrency}")
+        self.stdout.write(f"throughput:  {len(results) / elapsed:.1f} logins/s")
+        self.stdout.write(f"p50:         {percentile(0.50):.1f} ms")
+        self.stdout.write(f"p99:         {percentile(0.99):.1f} ms")
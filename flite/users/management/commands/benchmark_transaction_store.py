@@ -0,0 +1,129 @@
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from flite.users.models import User, Transaction
+
+# The multi-table layout Transaction had before 0006: a parent row plus one
+# child row per transfer type, joined back together on every read.
+LEGACY_TABLES = (
+    """CREATE TABLE bench_legacy_transaction (
+        id {uuid} PRIMARY KEY, created {timestamp} NOT NULL, modified {timestamp} NULL,
+        reference varchar(200) NOT NULL, status varchar(200) NOT NULL,
+        amount bigint NOT NULL, new_balance bigint NOT NULL,
+        owner_id {uuid} NOT NULL REFERENCES {users} (id))""",
+    "CREATE INDEX bench_legacy_transaction_owner ON bench_legacy_transaction (owner_id)",
+    """CREATE TABLE bench_legacy_p2ptransfer (
+        transaction_ptr_id {uuid} PRIMARY KEY REFERENCES bench_legacy_transaction (id),
+        sender_id {uuid} NOT NULL REFERENCES {users} (id),
+        receipient_id {uuid} NOT NULL REFERENCES {users} (id))""",
+    "CREATE INDEX bench_legacy_p2ptransfer_sender ON bench_legacy_p2ptransfer (sender_id)",
+    "CREATE INDEX bench_legacy_p2ptransfer_receipient ON bench_legacy_p2ptransfer (receipient_id)",
+    """CREATE TABLE bench_legacy_banktransfer (
+        transaction_ptr_id {uuid} PRIMARY KEY REFERENCES bench_legacy_transaction (id),
+        bank_id integer NOT NULL)""",
+)
+
+LEGACY_INSERTS = (
+    """INSERT INTO bench_legacy_transaction
+       (id, created, modified, reference, status, amount, new_balance, owner_id)
+       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+    """INSERT INTO bench_legacy_p2ptransfer (transaction_ptr_id, sender_id, receipient_id)
+       VALUES (%s, %s, %s)""",
+)
+
+LEGACY_PAGE = """
+    SELECT t.*, p.sender_id, p.receipient_id, b.bank_id
+    FROM bench_legacy_transaction t
+    LEFT OUTER JOIN bench_legacy_p2ptransfer p ON p.transaction_ptr_id = t.id
+    LEFT OUTER JOIN bench_legacy_banktransfer b ON b.transaction_ptr_id = t.id
+    WHERE t.owner_id = %s ORDER BY t.created DESC LIMIT %s"""
+
+SINGLE_TABLE_INSERT = """
+    INSERT INTO {table} (id, created, modified, reference, status, amount, new_balance,
+                         owner_id, kind, sender_id, receipient_id)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+SINGLE_TABLE_PAGE = """
+    SELECT * FROM {table} WHERE owner_id = %s ORDER BY created DESC, id DESC LIMIT %s"""
+
+
+class Command(BaseCommand):
+    help = "Compares insert and history-list throughput of the multi-table and single-table stores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--owners', type=int, default=20)
+        parser.add_argument('--lists', type=int, default=500)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        owners = [User.objects.create_user(username=f'bench-{run_id}-{i}') for i in range(options['owners'])]
+        owner_ids = [self._id(owner.pk) for owner in owners]
+        table = Transaction._meta.db_table
+
+        with connection.cursor() as cursor:
+            for statement in LEGACY_TABLES:
+                cursor.execute(statement.format(**self._types()))
+        try:
+            rows = [self._row(owner_ids) for _ in range(options['rows'])]
+            legacy_insert = self._time(rows, self._insert_legacy)
+            single_insert = self._time(rows, lambda row: self._insert_single(table, row))
+
+            pages = [random.choice(owner_ids) for _ in range(options['lists'])]
+            page_size = options['page_size']
+            single_page = SINGLE_TABLE_PAGE.format(table=table)
+            legacy_list = self._time(pages, lambda owner: self._list(LEGACY_PAGE, owner, page_size))
+            single_list = self._time(pages, lambda owner: self._list(single_page, owner, page_size))
+        finally:
+            with connection.cursor() as cursor:
+                for name in ('banktransfer', 'p2ptransfer', 'transaction'):
+                    cursor.execute(f'DROP TABLE bench_legacy_{name}')
+            User.objects.filter(pk__in=[owner.pk for owner in owners]).delete()
+
+        self.stdout.write(f"{'':<16}{'multi-table':>14}{'single-table':>14}{'speedup':>10}")
+        for label, count, legacy, single in (
+                ('inserts/s', len(rows), legacy_insert, single_insert),
+                ('history pages/s', len(pages), legacy_list, single_list)):
+            self.stdout.write(
+                f"{label:<16}{count / legacy:>14.1f}{count / single:>14.1f}{legacy / single:>9.2f}x")
+
+    def _types(self):
+        if connection.vendor == 'postgresql':
+            types = {'uuid': 'uuid', 'timestamp': 'timestamp with time zone'}
+        else:
+            types = {'uuid': 'char(32)', 'timestamp': 'datetime'}
+        return dict(types, users=User._meta.db_table)
+
+    def _id(self, value):
+        return value if connection.vendor == 'postgresql' else value.hex
+
+    def _row(self, owner_ids):
+        owner, counterparty = random.sample(owner_ids, 2)
+        now = timezone.now()
+        return (self._id(uuid.uuid4()), now, now, uuid.uuid4().hex, Transaction.SUCCESS,
+                random.randint(-10000, 10000), random.randint(0, 10000), owner, counterparty)
+
+    def _time(self, items, func):
+        started = time.perf_counter()
+        for item in items:
+            func(item)
+        return time.perf_counter() - started
+
+    def _insert_legacy(self, row):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(LEGACY_INSERTS[0], row[:8])
+            cursor.execute(LEGACY_INSERTS[1], (row[0], row[7], row[8]))
+
+    def _insert_single(self, table, row):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(SINGLE_TABLE_INSERT.format(table=table),
+                           row[:8] + (Transaction.P2P, row[7], row[8]))
+
+    def _list(self, query, owner, page_size):
+        with connection.cursor() as cursor:
+            cursor.execute(query, (owner, page_size))
+            cursor.fetchall()
@@ -0,0 +1,82 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Sum
+from flite.users.models import User, Balance, Transaction
+from flite.users import ledger
+from flite.users.transfers import p2p_transfer, TransferError
+
+
+class Command(BaseCommand):
+    help = "Runs concurrent P2P transfers between a few hot accounts and checks for balance drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=4)
+        parser.add_argument('--transfers', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--opening-balance', type=int, default=1000000, help="In kobo")
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark users afterwards")
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(username=f'bench-{run_id}-{i}')
+            for i in range(options['accounts'])
+        ]
+        owner_ids = [user.pk for user in users]
+        opening = options['opening_balance']
+        for user in users:
+            ledger.deposit(user, opening)
+
+        def worker(count):
+            failures = 0
+            try:
+                for _ in range(count):
+                    sender, recipient = random.sample(users, 2)
+                    try:
+                        p2p_transfer(sender, recipient, random.randint(1, 100))
+                    except TransferError:
+                        failures += 1
+            finally:
+                connections.close_all()
+            return failures
+
+        threads = options['threads']
+        per_thread = [options['transfers'] // threads] * threads
+        per_thread[0] += options['transfers'] % threads
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            failures = sum(pool.map(worker, per_thread))
+        elapsed = time.perf_counter() - started
+
+        completed = options['transfers'] - failures
+        total = Balance.objects.filter(owner_id__in=owner_ids).aggregate(
+            total=Sum('available_balance'))['total']
+        drift = total - opening * len(users)
+
+        mismatched = 0
+        for balance in Balance.objects.filter(owner_id__in=owner_ids):
+            moved = Transaction.objects.filter(owner_id=balance.owner_id).aggregate(
+                total=Sum('amount'))['total'] or 0
+            if moved != balance.available_balance:
+                mismatched += 1
+            elif ledger.rebuild_balance(balance)[0] != balance.available_balance:
+                mismatched += 1
+
+        self.stdout.write(f"transfers:   {completed} ok, {failures} rejected")
+        self.stdout.write(f"elapsed:     {elapsed:.2f}s")
+        self.stdout.write(f"throughput:  {completed / elapsed:.1f} transfers/s")
+        self.stdout.write(f"drift:       {drift}")
+        self.stdout.write(f"mismatched:  {mismatched} of {len(users)} accounts")
+
+        if not options['keep']:
+            User.objects.filter(pk__in=owner_ids).delete()
+
+        if drift or mismatched:
+            self.stderr.write(self.style.ERROR("Balances drifted"))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS("No balance drift"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from flite.users import banks
+
+
+class Command(BaseCommand):
+    help = "Adds and updates the bank directory from the NIBSS bank list"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="A .csv file with a header row, or a JSON list, with name, "
+                                         "bank_code (or code) and acronym for each bank")
+
+    def handle(self, *args, **options):
+        created, updated = banks.import_banks(banks.read_banks(options['path']))
+        self.stdout.write(self.style.SUCCESS(f"{created} banks added, {updated} updated"))
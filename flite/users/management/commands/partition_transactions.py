@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from flite.users import partitions
+
+
+class Command(BaseCommand):
+    help = "Creates the monthly transaction partitions missing from this month on. Run it daily"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=None,
+                            help="Months ahead to create, defaults to TRANSACTION_PARTITIONS_AHEAD")
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            self.stdout.write("The transaction table isn't partitioned on this database")
+            return
+        created = partitions.ensure_partitions(options['ahead'])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partitions"))
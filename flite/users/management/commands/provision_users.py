@@ -0,0 +1,39 @@
+import itertools
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from flite.users import provisioning
+
+
+class Command(BaseCommand):
+    help = "Creates users, with their tokens, profiles and balances, in bulk from a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="A .csv file with a header row, or one JSON object per line")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Password hashing processes, defaults to the CPU count. 0 hashes in-process")
+        parser.add_argument('--skip', type=int, default=0, help="Rows to skip, to resume a failed import")
+
+    def handle(self, *args, **options):
+        rows = itertools.islice(provisioning.read_users(options['path']), options['skip'], None)
+        started = time.perf_counter()
+        created = 0
+
+        def progress(total):
+            nonlocal created
+            created = total
+            rate = created / (time.perf_counter() - started)
+            self.stdout.write(f"{created} users created ({rate:.0f} rows/s)")
+
+        try:
+            provisioning.provision_users(
+                rows, batch_size=options['batch_size'], workers=options['workers'], progress=progress)
+        except IntegrityError as exc:
+            raise CommandError(
+                f"Chunk starting at row {options['skip'] + created} failed and was rolled back: {exc}. "
+                f"Fix it and rerun with --skip {options['skip'] + created}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned {created} users in {elapsed:.1f}s ({created / max(elapsed, 1e-9):.0f} rows/s)"))
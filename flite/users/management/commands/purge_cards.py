@@ -0,0 +1,37 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from flite.users.models import ArchivedCard, Card
+
+ARCHIVED_FIELDS = ('id', 'owner_id', 'fingerprint', 'cbin', 'cbrand', 'number', 'expiry_month', 'expiry_year',
+                   'created_on', 'deleted_on')
+
+
+class Command(BaseCommand):
+    help = "Moves soft-deleted cards, without their authorization codes, to the card archive in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help="Only cards deleted at least this many days ago. Cards deleted before "
+                                 "deletion times were recorded always qualify")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted = Card.all_objects.filter(
+            Q(deleted_on__lt=cutoff) | Q(deleted_on__isnull=True), is_deleted=True)
+        purged = 0
+        while True:
+            # Each batch commits on its own, so an interrupted purge loses nothing
+            with transaction.atomic():
+                cards = list(deleted.select_for_update(skip_locked=True).order_by('pk').values(
+                    *ARCHIVED_FIELDS)[:options['batch_size']])
+                if not cards:
+                    break
+                ArchivedCard.objects.bulk_create([ArchivedCard(**card) for card in cards])
+                Card.all_objects.filter(pk__in=[card['id'] for card in cards]).delete()
+            purged += len(cards)
+            self.stdout.write(f"{purged} cards archived")
+        self.stdout.write(self.style.SUCCESS(f"Archived {purged} deleted cards"))
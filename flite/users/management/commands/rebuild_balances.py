@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from flite.users import ledger, summary
+from flite.users.models import Balance
+
+
+class Command(BaseCommand):
+    help = "Rebuilds balances from their latest checkpoint plus the ledger entries posted after it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('owners', nargs='*', help="User ids whose balances to rebuild")
+        parser.add_argument('--all', action='store_true', help="Rebuild every balance")
+        parser.add_argument('--fix', action='store_true',
+                            help="Overwrite balances that differ from the ledger")
+        parser.add_argument('--checkpoint', action='store_true',
+                            help="Record a checkpoint for every balance that matches the ledger")
+
+    def handle(self, *args, **options):
+        if options['all']:
+            balances = Balance.objects.all()
+        elif options['owners']:
+            balances = Balance.objects.filter(owner_id__in=options['owners'])
+        else:
+            raise CommandError("Pass one or more user ids, or --all")
+
+        checked = drifted = 0
+        for balance in balances.order_by('pk').iterator():
+            checked += 1
+            rebuilt, sequence = ledger.rebuild_balance(balance)
+            if rebuilt != balance.available_balance or sequence != balance.ledger_sequence:
+                drifted += 1
+                self.stdout.write(
+                    f"{balance.owner_id}: stored {balance.available_balance} at #{balance.ledger_sequence}, "
+                    f"ledger {rebuilt} at #{sequence}")
+                if not options['fix']:
+                    continue
+                with transaction.atomic():
+                    # Rebuild again under the row lock so no posting slips in between
+                    locked = Balance.objects.select_for_update().get(pk=balance.pk)
+                    rebuilt, sequence = ledger.rebuild_balance(locked)
+                    Balance.objects.filter(pk=balance.pk).update(
+                        book_balance=rebuilt, available_balance=rebuilt, ledger_sequence=sequence)
+                    # The update skips the signal that would drop the cached summary
+                    summary.invalidate(balance.owner_id)
+            if options['checkpoint']:
+                ledger.checkpoint(balance)
+
+        self.stdout.write(f"{checked} balances checked, {drifted} differed from the ledger")
@@ -0,0 +1,52 @@
+import csv
+import time
+from django.core.management.base import BaseCommand
+from flite.users import reconciliation
+from flite.users.models import ReconciliationRun
+
+
+class Command(BaseCommand):
+    help = ("Checks every active balance against the sum of its owner's transactions, resuming the last "
+            "run if it was interrupted")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Owners per chunk, defaults to RECONCILIATION_CHUNK_SIZE")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Chunks checked at once, defaults to RECONCILIATION_PROCESSES")
+        parser.add_argument('--restart', action='store_true', help="Start a new run even if the last one "
+                                                                   "is unfinished")
+        parser.add_argument('--report', help="Write the discrepancies to this CSV file")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        run = ReconciliationRun.objects.filter(finished__isnull=True).order_by('-created').first()
+        if run is None or options['restart']:
+            run = reconciliation.start(options['chunk_size'])
+            self.stdout.write(f"Started run {run.pk} with {run.chunks} chunks of {run.chunk_size} owners")
+        else:
+            self.stdout.write(f"Resuming run {run.pk} at {run.chunk_set.filter(done=True).count()} "
+                              f"of {run.chunks} chunks")
+
+        def progress(done):
+            if done % 100 == 0 or done == run.chunks:
+                self.stdout.write(f"{done}/{run.chunks} chunks checked")
+
+        reconciliation.run(run, options['processes'], progress)
+
+        discrepancies = run.discrepancy_set.order_by('owner_id')
+        if options['report']:
+            with open(options['report'], 'w', newline='') as report:
+                writer = csv.writer(report)
+                writer.writerow(('owner_id', 'available_balance', 'transaction_total', 'difference'))
+                for discrepancy in discrepancies.iterator():
+                    writer.writerow((discrepancy.owner_id, discrepancy.available_balance,
+                                     discrepancy.transaction_total, discrepancy.difference))
+        else:
+            for discrepancy in discrepancies.iterator():
+                self.stdout.write(f"{discrepancy.owner_id}: balance {discrepancy.available_balance}, "
+                                  f"transactions {discrepancy.transaction_total}")
+
+        style = self.style.SUCCESS if not run.discrepancies else self.style.ERROR
+        self.stdout.write(style(f"{run.accounts} balances checked in {time.perf_counter() - started:.1f}s, "
+                                f"{run.discrepancies} discrepancies"))
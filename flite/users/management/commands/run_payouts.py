@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from flite.users import payouts
+
+
+class Command(BaseCommand):
+    help = "Submits pending bank transfers to the payout gateway in batches per bank and records the results"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50000, help="Most payouts to process in this run")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Gateway calls at once, defaults to PAYOUT_CONCURRENCY")
+
+    def handle(self, *args, **options):
+        report = payouts.run(limit=options['limit'], concurrency=options['concurrency'])
+        if not report['claimed']:
+            self.stdout.write("No pending payouts")
+            return
+        self.stdout.write(f"claim      {report['claim_seconds']:8.2f}s  {report['claimed']} payouts")
+        self.stdout.write(f"submit     {report['submit_seconds']:8.2f}s  {report['batches']} batches")
+        self.stdout.write(f"reconcile  {report['reconcile_seconds']:8.2f}s  {report['settled']} settled, "
+                          f"{report['failed']} failed and credited back")
+        if report['mismatched']:
+            self.stdout.write(self.style.WARNING(
+                f"{report['mismatched']} failed payouts have no active balance to credit back "
+                f"and were left processing"))
@@ -0,0 +1,56 @@
+from django.db import migrations
+from django.db.models import F, Func
+import flite.core.money
+
+
+MONEY_FIELDS = {
+    'Balance': ('book_balance', 'available_balance'),
+    'Transaction': ('amount', 'new_balance'),
+}
+
+
+def naira_to_kobo(apps, schema_editor):
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('users', model_name)
+        model.objects.update(**{
+            field: Func(F(field) * 100, function='ROUND') for field in fields
+        })
+
+
+def kobo_to_naira(apps, schema_editor):
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('users', model_name)
+        model.objects.update(**{field: F(field) / 100.0 for field in fields})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20210603_1751'),
+    ]
+
+    operations = [
+        # Both directions run while the columns are floats: kobo are scaled up
+        # before the columns become bigint, and back down after they are floats again.
+        migrations.RunPython(naira_to_kobo, kobo_to_naira),
+        migrations.AlterField(
+            model_name='balance',
+            name='available_balance',
+            field=flite.core.money.MoneyField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='balance',
+            name='book_balance',
+            field=flite.core.money.MoneyField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=flite.core.money.MoneyField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='new_balance',
+            field=flite.core.money.MoneyField(default=0),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 2.1.9 on 2026-10-18 01:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import flite.core.money
+import uuid
+
+
+def opening_checkpoints(apps, schema_editor):
+    """
+    Balances that predate the ledger start from a checkpoint at sequence 0
+    holding their current amount.
+    """
+    Balance = apps.get_model('users', 'Balance')
+    BalanceCheckpoint = apps.get_model('users', 'BalanceCheckpoint')
+    checkpoints = [
+        BalanceCheckpoint(balance_id=balance_id, sequence=0, available_balance=amount)
+        for balance_id, amount in Balance.objects.exclude(available_balance=0).values_list(
+            'pk', 'available_balance').iterator()
+    ]
+    BalanceCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_money_in_kobo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified', models.DateTimeField(auto_now=True, null=True)),
+                ('sequence', models.BigIntegerField()),
+                ('available_balance', flite.core.money.MoneyField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('journal', models.UUIDField(db_index=True, editable=False)),
+                ('reference', models.CharField(db_index=True, max_length=200)),
+                ('account', models.CharField(choices=[('wallet', 'Wallet'), ('card_funding', 'Card funding'), ('bank_settlement', 'Bank settlement')], max_length=30)),
+                ('amount', flite.core.money.MoneyField(default=0)),
+                ('sequence', models.BigIntegerField(null=True)),
+                ('balance_after', flite.core.money.MoneyField(default=None, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger Entries',
+            },
+        ),
+        migrations.AddField(
+            model_name='balance',
+            name='ledger_sequence',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='balance',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='users.Balance'),
+        ),
+        migrations.AddField(
+            model_name='balancecheckpoint',
+            name='balance',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='users.Balance'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ledgerentry',
+            unique_together={('balance', 'sequence')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='balancecheckpoint',
+            unique_together={('balance', 'sequence')},
+        ),
+        migrations.RunPython(opening_checkpoints, migrations.RunPython.noop),
+    ]
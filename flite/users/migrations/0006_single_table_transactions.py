@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def _column_from(child, field):
+    return Subquery(child.objects.filter(pk=OuterRef('pk')).values(field)[:1])
+
+
+def copy_children_into_transaction(apps, schema_editor):
+    Transaction = apps.get_model('users', 'Transaction')
+    BankTransfer = apps.get_model('users', 'BankTransfer')
+    P2PTransfer = apps.get_model('users', 'P2PTransfer')
+
+    Transaction.objects.filter(pk__in=P2PTransfer.objects.values('pk')).update(
+        kind='p2p',
+        sender_id=_column_from(P2PTransfer, 'legacy_sender_id'),
+        receipient_id=_column_from(P2PTransfer, 'legacy_receipient_id'),
+    )
+    Transaction.objects.filter(pk__in=BankTransfer.objects.values('pk')).update(
+        kind='bank_transfer',
+        bank_id=_column_from(BankTransfer, 'legacy_bank_id'),
+    )
+
+
+def copy_transaction_into_children(apps, schema_editor):
+    Transaction = apps.get_model('users', 'Transaction')
+    BankTransfer = apps.get_model('users', 'BankTransfer')
+    P2PTransfer = apps.get_model('users', 'P2PTransfer')
+
+    # save_base(raw=True) writes only the child row, the parent already exists
+    for transfer in Transaction.objects.filter(kind='p2p').iterator():
+        P2PTransfer(transaction_ptr_id=transfer.pk, legacy_sender_id=transfer.sender_id,
+                    legacy_receipient_id=transfer.receipient_id).save_base(raw=True)
+    for transfer in Transaction.objects.filter(kind='bank_transfer').iterator():
+        BankTransfer(transaction_ptr_id=transfer.pk, legacy_bank_id=transfer.bank_id).save_base(raw=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_ledger'),
+    ]
+
+    operations = [
+        # Move the child table columns out of the way of the single-table
+        # columns that replace them
+        migrations.AlterField(
+            model_name='p2ptransfer',
+            name='receipient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='p2ptransfer',
+            name='sender',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RenameField('banktransfer', 'bank', 'legacy_bank'),
+        migrations.RenameField('p2ptransfer', 'receipient', 'legacy_receipient'),
+        migrations.RenameField('p2ptransfer', 'sender', 'legacy_sender'),
+        migrations.AddField(
+            model_name='transaction',
+            name='kind',
+            field=models.CharField(choices=[('deposit', 'Deposit'), ('bank_transfer', 'Bank transfer'), ('p2p', 'P2P transfer')], default='deposit', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='bank',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='users.Bank'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='receipient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recipient', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sender', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_children_into_transaction, copy_transaction_into_children),
+        migrations.DeleteModel(
+            name='BankTransfer',
+        ),
+        migrations.DeleteModel(
+            name='P2PTransfer',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['owner', 'created', 'id'], name='users_txn_owner_created'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transaction', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='BankTransfer',
+            fields=[
+            ],
+            options={
+                'verbose_name_plural': 'Bank Transfers',
+                'proxy': True,
+                'indexes': [],
+            },
+            bases=('users.transaction',),
+        ),
+        migrations.CreateModel(
+            name='P2PTransfer',
+            fields=[
+            ],
+            options={
+                'verbose_name_plural': 'P2P Transfers',
+                'proxy': True,
+                'indexes': [],
+            },
+            bases=('users.transaction',),
+        ),
+    ]
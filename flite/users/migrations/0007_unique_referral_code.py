@@ -0,0 +1,40 @@
+import uuid
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def deduplicate_referral_codes(apps, schema_editor):
+    """
+    Gives blank codes, and every copy of a duplicated code but the oldest, a fresh
+    code so the unique index can be built.
+    """
+    UserProfile = apps.get_model('users', 'UserProfile')
+    duplicated = UserProfile.objects.values('referral_code').annotate(
+        copies=Count('id')).filter(copies__gt=1).values_list('referral_code', flat=True)
+
+    for code in list(duplicated) + ['']:
+        profiles = list(UserProfile.objects.filter(referral_code=code).order_by('created').values_list(
+            'pk', flat=True))
+        if code:
+            profiles = profiles[1:]
+        for pk in profiles:
+            new_code = uuid.uuid4().hex[:8]
+            while UserProfile.objects.filter(referral_code=new_code).exists():
+                new_code = uuid.uuid4().hex[:8]
+            UserProfile.objects.filter(pk=pk).update(referral_code=new_code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_single_table_transactions'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_referral_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='referral_code',
+            field=models.CharField(max_length=120, unique=True),
+        ),
+    ]
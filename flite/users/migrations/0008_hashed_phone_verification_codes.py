@@ -0,0 +1,23 @@
+# Generated by Django 2.1.9 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_unique_referral_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newuserphoneverification',
+            name='expires',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='newuserphoneverification',
+            name='verification_code',
+            field=models.CharField(max_length=64),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 2.1.9 on 2026-10-18 02:31
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.utils.crypto import salted_hmac
+
+
+def card_fingerprint(cbin, number, expiry_month, expiry_year):
+    # A copy of flite.users.models.card_fingerprint as it was when this migration was written
+    if not settings.CARD_FINGERPRINT_KEY:
+        raise ImproperlyConfigured("CARD_FINGERPRINT_KEY must be set to fingerprint cards")
+    return salted_hmac('flite.users.Card', f'{cbin}:{number}:{expiry_month}:{expiry_year}',
+                       secret=settings.CARD_FINGERPRINT_KEY).hexdigest()
+
+
+def fingerprint_cards(apps, schema_editor):
+    """
+    Fingerprints existing cards, and deletes all but the newest active copy of
+    each card per owner so the unique index can be built.
+    """
+    Card = apps.get_model('users', 'Card')
+    kept = set()
+    for card in Card.objects.order_by('-created_on', '-id').iterator():
+        fingerprint = card_fingerprint(card.cbin, card.number, card.expiry_month, card.expiry_year)
+        changes = {'fingerprint': fingerprint}
+        if card.is_active and not card.is_deleted:
+            if (card.owner_id, fingerprint) in kept:
+                changes.update(is_active=False, is_deleted=True, deleted_on=django.utils.timezone.now())
+            kept.add((card.owner_id, fingerprint))
+        Card.objects.filter(pk=card.pk).update(**changes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_hashed_phone_verification_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCard',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('cbin', models.CharField(max_length=200, null=True)),
+                ('cbrand', models.CharField(max_length=200, null=True)),
+                ('number', models.CharField(max_length=200)),
+                ('expiry_month', models.CharField(max_length=10)),
+                ('expiry_year', models.CharField(max_length=10)),
+                ('created_on', models.DateTimeField()),
+                ('deleted_on', models.DateTimeField(null=True)),
+                ('archived_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='deleted_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='fingerprint',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(fingerprint_cards, migrations.RunPython.noop),
+        # Partial indexes, which Django 2.1 models can't declare
+        migrations.RunSQL(
+            ['CREATE INDEX users_card_active_owner ON users_card (owner_id) '
+             'WHERE is_active AND NOT is_deleted'],
+            ['DROP INDEX users_card_active_owner'],
+        ),
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX users_card_active_fingerprint ON users_card (owner_id, fingerprint) '
+             'WHERE is_active AND NOT is_deleted'],
+            ['DROP INDEX users_card_active_fingerprint'],
+        ),
+        migrations.RunSQL(
+            ['CREATE INDEX users_card_deleted ON users_card (deleted_on) WHERE is_deleted'],
+            ['DROP INDEX users_card_deleted'],
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 2.1.9 on 2026-10-18 02:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import flite.core.money
+import uuid
+
+# Months of partitions created ahead; post_migrate tops this up to TRANSACTION_PARTITIONS_AHEAD
+AHEAD = 3
+
+# Older servers can't read the partitions in order, so the table is left unpartitioned there
+MIN_POSTGRES_VERSION = 120000
+
+
+# Copies of the helpers in flite.users.partitions as they were when this migration was written
+def month_start(value):
+    value = django.utils.timezone.localtime(value, django.utils.timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def create_partition(cursor, month, parent):
+    cursor.execute(
+        f'CREATE TABLE users_transaction_p{month:%Y%m} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)',
+        [month, add_months(month, 1)])
+
+
+def _rebuild(cursor, create, primary_key):
+    """
+    Replaces users_transaction with the table made by ``create`` (as
+    users_transaction_new), copying its rows, indexes and foreign keys.
+    """
+    cursor.execute(
+        "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+        "WHERE indrelid = 'users_transaction'::regclass AND NOT indisprimary")
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = 'users_transaction'::regclass AND contype = 'f'")
+    foreign_keys = cursor.fetchall()
+
+    create(cursor)
+    cursor.execute('INSERT INTO users_transaction_new SELECT * FROM users_transaction')
+    cursor.execute('DROP TABLE users_transaction')
+    cursor.execute('ALTER TABLE users_transaction_new RENAME TO users_transaction')
+    # Built after the copy, which is faster than maintaining them through it
+    cursor.execute(f'ALTER TABLE users_transaction ADD CONSTRAINT users_transaction_pkey PRIMARY KEY ({primary_key})')
+    for index in indexes:
+        cursor.execute(index)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE users_transaction ADD CONSTRAINT {name} {definition}')
+
+
+def partition_transactions(apps, schema_editor):
+    """
+    Partitions users_transaction by month of created. The primary key must
+    include the partition key, so it becomes (id, created).
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or connection.pg_version < MIN_POSTGRES_VERSION:
+        return
+
+    def create(cursor):
+        cursor.execute('SELECT MIN(created) FROM users_transaction')
+        oldest = cursor.fetchone()[0]
+        this_month = month_start(django.utils.timezone.now())
+        first = min(month_start(oldest), this_month) if oldest else this_month
+        cursor.execute('CREATE TABLE users_transaction_new (LIKE users_transaction INCLUDING DEFAULTS) '
+                       'PARTITION BY RANGE (created)')
+        cursor.execute(f'CREATE TABLE users_transaction_before_{first:%Y%m} PARTITION OF users_transaction_new '
+                       f'FOR VALUES FROM (MINVALUE) TO (%s)', [first])
+        month = first
+        while month <= add_months(this_month, AHEAD):
+            create_partition(cursor, month, 'users_transaction_new')
+            month = add_months(month, 1)
+
+    with schema_editor.connection.cursor() as cursor:
+        _rebuild(cursor, create, 'id, created')
+
+
+def unpartition_transactions(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or connection.pg_version < MIN_POSTGRES_VERSION:
+        return
+
+    def create(cursor):
+        cursor.execute('CREATE TABLE users_transaction_new (LIKE users_transaction INCLUDING DEFAULTS)')
+
+    with schema_editor.connection.cursor() as cursor:
+        _rebuild(cursor, create, 'id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTotal',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('amount', flite.core.money.MoneyField(default=0)),
+                ('transactions', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified', models.DateTimeField(auto_now=True, null=True)),
+                ('partition', models.CharField(max_length=63, unique=True)),
+                ('start', models.DateTimeField(null=True)),
+                ('end', models.DateTimeField()),
+                ('rows', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('detached', 'Detached'), ('archived', 'Archived')], default='detached', max_length=10)),
+                ('file', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
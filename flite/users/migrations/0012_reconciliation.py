@@ -0,0 +1,71 @@
+# Generated by Django 2.1.9 on 2026-10-18 02:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import flite.core.money
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_partition_transactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Discrepancy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('available_balance', flite.core.money.MoneyField(default=0, null=True)),
+                ('transaction_total', flite.core.money.MoneyField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Discrepancies',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReconciliationChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('after', models.UUIDField(null=True)),
+                ('upto', models.UUIDField(null=True)),
+                ('done', models.BooleanField(default=False)),
+                ('accounts', models.PositiveIntegerField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified', models.DateTimeField(auto_now=True, null=True)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('chunks', models.PositiveIntegerField(default=0)),
+                ('accounts', models.BigIntegerField(default=0)),
+                ('discrepancies', models.BigIntegerField(default=0)),
+                ('finished', models.DateTimeField(null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='reconciliationchunk',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunk_set', to='users.ReconciliationRun'),
+        ),
+        migrations.AddField(
+            model_name='discrepancy',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancy_set', to='users.ReconciliationRun'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reconciliationchunk',
+            unique_together={('run', 'number')},
+        ),
+    ]
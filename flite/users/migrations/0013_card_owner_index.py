@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_reconciliation'),
+    ]
+
+    operations = [
+        # Card.objects only excludes deleted cards, so a partial index that also required
+        # is_active was never used for its queries
+        migrations.RunSQL(
+            ['DROP INDEX users_card_active_owner',
+             'CREATE INDEX users_card_owner ON users_card (owner_id) WHERE NOT is_deleted'],
+            ['DROP INDEX users_card_owner',
+             'CREATE INDEX users_card_active_owner ON users_card (owner_id) WHERE is_active AND NOT is_deleted'],
+        ),
+        # The partial index covers the foreign key's lookups, so its own index goes. Dropped by
+        # name, as Django would drop every index on owner_id
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    ['DROP INDEX users_card_owner_id_2047f7fe'],
+                    ['CREATE INDEX users_card_owner_id_2047f7fe ON users_card (owner_id)'],
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='card',
+                    name='owner',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                            to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
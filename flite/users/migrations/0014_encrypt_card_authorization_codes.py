@@ -0,0 +1,64 @@
+# Generated by Django 2.1.9 on 2026-10-18 03:40
+
+from cryptography.fernet import Fernet, MultiFernet
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations
+import flite.core.encryption
+
+
+def fernet():
+    # A copy of flite.core.encryption.fernet as it was when this migration was written
+    if not settings.FIELD_ENCRYPTION_KEYS:
+        raise ImproperlyConfigured("FIELD_ENCRYPTION_KEYS must be set to encrypt fields")
+    return MultiFernet([Fernet(key) for key in settings.FIELD_ENCRYPTION_KEYS])
+
+
+def widen_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE users_card ALTER COLUMN authorization_code TYPE text')
+
+
+def narrow_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE users_card ALTER COLUMN authorization_code TYPE varchar(200)')
+
+
+def _convert(schema_editor, convert):
+    # Raw SQL, as the historical model would decrypt the plaintext codes on loading them
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT id, authorization_code FROM users_card')
+        for pk, value in cursor.fetchall():
+            cursor.execute('UPDATE users_card SET authorization_code = %s WHERE id = %s',
+                           [convert(value.encode()).decode(), pk])
+
+
+def encrypt_codes(apps, schema_editor):
+    _convert(schema_editor, fernet().encrypt)
+
+
+def decrypt_codes(apps, schema_editor):
+    _convert(schema_editor, fernet().decrypt)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_card_owner_index'),
+    ]
+
+    operations = [
+        # Encrypted codes outgrow varchar(200). SQLite doesn't enforce the length, and Django would
+        # rebuild its table without the partial indexes
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(widen_column, narrow_column)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='card',
+                    name='authorization_code',
+                    field=flite.core.encryption.EncryptedTextField(),
+                ),
+            ],
+        ),
+        migrations.RunPython(encrypt_codes, decrypt_codes),
+    ]
@@ -1,14 +1,20 @@
 import uuid
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.utils.encoding import python_2_unicode_compatible
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_migrate, post_save
 from rest_framework.authtoken.models import Token
+from flite.core import outbox
+from flite.core.authentication import token_cache
 from flite.core.models import BaseModel
+from flite.core.encryption import EncryptedTextField
+from flite.core.money import MoneyField
 from phonenumber_field.modelfields import PhoneNumberField
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.core.exceptions import ImproperlyConfigured
 
 @python_2_unicode_compatible
 class User(AbstractUser):
@@ -24,6 +30,25 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
         Token.objects.create(user=instance)
         UserProfile.objects.create(user=instance)
         Balance.objects.create(owner=instance)
+        outbox.publish(outbox.USER_CREATED, instance.pk, user_created_payload(instance))
+
+
+def user_created_payload(user):
+    return {'username': user.username, 'email': user.email}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance=None, created=False, update_fields=None, **kwargs):
+    # Cached tokens carry a copy of the user and its active flag, so drop them when it changes
+    if created or update_fields == frozenset(['last_login']):
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        token_cache.invalidate(key)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance=None, **kwargs):
+    token_cache.invalidate(instance.key)
 
 class Phonenumber(BaseModel):
     number = models.CharField(max_length=24)
@@ -36,35 +61,45 @@ class Phonenumber(BaseModel):
 
 
 class UserProfile(BaseModel):
-    referral_code = models.CharField(max_length=120)
+    REFERRAL_CODE_ATTEMPTS = 5
+
+    referral_code = models.CharField(max_length=120, unique=True)
     user = models.OneToOneField('users.User',on_delete=models.CASCADE)
 
 
     def save(self, *args, **kwargs):
-        if not self.referral_code:
-            self.referral_code = self.generate_new_referal_code()
-        return super(UserProfile, self).save(*args, **kwargs)
-
+        if self.referral_code:
+            return super(UserProfile, self).save(*args, **kwargs)
 
-    def generate_new_referal_code(self):
+        # Let the unique index catch the rare collision instead of checking
+        # for the code up front on every signup
+        for attempt in range(self.REFERRAL_CODE_ATTEMPTS):
+            self.referral_code = self.generate_new_referal_code()
+            try:
+                with transaction.atomic():
+                    return super(UserProfile, self).save(*args, **kwargs)
+            except IntegrityError:
+                self.referral_code = ''
+                if attempt == self.REFERRAL_CODE_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def generate_new_referal_code():
         """
-        Returns a unique passcode
+        Returns a random referral code, uniqueness is enforced by the database
         """
-        def _passcode():
-            return str(uuid.uuid4().hex)[0:8]
-        passcode = _passcode()
-        while UserProfile.objects.filter(referral_code=passcode).exists():
-            passcode = _passcode()
-        return passcode
+        return str(uuid.uuid4().hex)[0:8]
 
 
 
 class NewUserPhoneVerification(BaseModel):
 
     phone_number = PhoneNumberField(unique=True, blank=True, null=True)
-    verification_code = models.CharField(max_length=30)
+    # An HMAC of the code, see flite.users.otp
+    verification_code = models.CharField(max_length=64)
     is_verified = models.BooleanField(default=False)
     email = models.CharField(max_length=100)
+    expires = models.DateTimeField(null=True)
  
     def __str__(self):
         return str(self.phone_number)+'-'+ str(self.verification_code)
@@ -85,14 +120,78 @@ class Referral(BaseModel):
 class Balance(BaseModel):
 
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
-    book_balance = models.FloatField(default=0.0) 
-    available_balance = models.FloatField(default=0.0) 
+    book_balance = MoneyField()
+    available_balance = MoneyField()
     active = models.BooleanField(default=True)
+    ledger_sequence = models.BigIntegerField(default=0)
 
     class Meta:
         verbose_name= "Balance"
         verbose_name_plural = "Balances"
 
+
+class LedgerEntryQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        raise ValueError("Ledger entries are append-only")
+
+    def delete(self):
+        raise ValueError("Ledger entries are append-only")
+
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a double-entry journal. The legs of a journal always sum to zero.
+
+    Wallet legs point at a Balance and carry that balance's running ``sequence``
+    and the ``balance_after`` they produced; legs on system accounts (money
+    entering or leaving the platform) have no balance.
+    """
+    WALLET = 'wallet'
+    CARD_FUNDING = 'card_funding'
+    BANK_SETTLEMENT = 'bank_settlement'
+    ACCOUNT_CHOICES = (
+        (WALLET, 'Wallet'),
+        (CARD_FUNDING, 'Card funding'),
+        (BANK_SETTLEMENT, 'Bank settlement'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+    journal = models.UUIDField(db_index=True, editable=False)
+    reference = models.CharField(max_length=200, db_index=True)
+    account = models.CharField(max_length=30, choices=ACCOUNT_CHOICES)
+    balance = models.ForeignKey(Balance, null=True, on_delete=models.CASCADE, related_name='entries')
+    amount = MoneyField()
+    sequence = models.BigIntegerField(null=True)
+    balance_after = MoneyField(null=True, default=None)
+
+    objects = LedgerEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Ledger Entries"
+        unique_together = ('balance', 'sequence')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        return super(LedgerEntry, self).save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only")
+
+
+class BalanceCheckpoint(BaseModel):
+    """
+    A balance as it stood after the ledger entry numbered ``sequence``.
+    """
+    balance = models.ForeignKey(Balance, on_delete=models.CASCADE, related_name='checkpoints')
+    sequence = models.BigIntegerField()
+    available_balance = MoneyField()
+
+    class Meta:
+        unique_together = ('balance', 'sequence')
+
 class AllBanks(BaseModel):
 
     name = models.CharField(max_length=100)
@@ -115,34 +214,132 @@ class Bank(models.Model):
     account_type = models.CharField(max_length=50)
     
 class Transaction(BaseModel):
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transaction')
+    """
+    Every money movement, stored in a single table.
+
+    ``kind`` says which of the typed nullable columns apply: ``bank`` for bank
+    transfers, ``sender``/``receipient`` for P2P transfers. BankTransfer and
+    P2PTransfer are proxies over this table.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+
+    DEPOSIT = 'deposit'
+    BANK_TRANSFER = 'bank_transfer'
+    P2P = 'p2p'
+    KIND_CHOICES = (
+        (DEPOSIT, 'Deposit'),
+        (BANK_TRANSFER, 'Bank transfer'),
+        (P2P, 'P2P transfer'),
+    )
+
+    # Lookups by owner are served by the (owner, created, id) index below
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transaction', db_index=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
     reference = models.CharField(max_length=200)
     status = models.CharField(max_length=200)
-    amount = models.FloatField(default=0.0)
-    new_balance = models.FloatField(default=0.0)
+    amount = MoneyField()
+    new_balance = MoneyField()
+    bank = models.ForeignKey(Bank, null=True, blank=True, on_delete=models.CASCADE)
+    sender = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name="sender")
+    receipient = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE,
+                                   related_name="recipient")
+
+    KIND = None
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'created', 'id'], name='users_txn_owner_created'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.KIND:
+            self.kind = self.KIND
+        return super(Transaction, self).save(*args, **kwargs)
 
 
+class TransactionKindManager(models.Manager):
+
+    def __init__(self, kind):
+        super(TransactionKindManager, self).__init__()
+        self.kind = kind
+
+    def get_queryset(self):
+        return super(TransactionKindManager, self).get_queryset().filter(kind=self.kind)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        for obj in objs:
+            obj.kind = self.kind
+        return super(TransactionKindManager, self).bulk_create(objs, *args, **kwargs)
+
 
 class BankTransfer(Transaction):
-    bank = models.ForeignKey(Bank,on_delete=models.CASCADE)
+    KIND = Transaction.BANK_TRANSFER
+
+    objects = TransactionKindManager(KIND)
 
     class Meta:
+        proxy = True
         verbose_name_plural = "Bank Transfers"
 
 
 class P2PTransfer(Transaction):
-    sender = models.ForeignKey(User, on_delete=models.CASCADE,related_name="sender")
-    receipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recipient")
+    KIND = Transaction.P2P
+
+    objects = TransactionKindManager(KIND)
 
     class Meta:
+        proxy = True
         verbose_name_plural = "P2P Transfers"
 
 
+def card_fingerprint(cbin, number, expiry_month, expiry_year):
+    """
+    Identifies a card without storing anything that would let it be charged.
+    """
+    if not settings.CARD_FINGERPRINT_KEY:
+        raise ImproperlyConfigured("CARD_FINGERPRINT_KEY must be set to fingerprint cards")
+    return salted_hmac('flite.users.Card', f'{cbin}:{number}:{expiry_month}:{expiry_year}',
+                       secret=settings.CARD_FINGERPRINT_KEY).hexdigest()
+
+
+class CardManager(models.Manager):
+    """
+    Hides soft-deleted cards. ``Card.all_objects`` includes them.
+    """
+
+    def get_queryset(self):
+        return super(CardManager, self).get_queryset().filter(is_deleted=False)
+
+    def add(self, owner, **fields):
+        """
+        Saves a card for ``owner`` and returns ``(card, created)``. A card
+        already on file for them, matched by fingerprint, is returned instead.
+        """
+        fingerprint = card_fingerprint(
+            fields.get('cbin'), fields['number'], fields['expiry_month'], fields['expiry_year'])
+        existing = self.filter(owner=owner, fingerprint=fingerprint, is_active=True)
+        card = existing.first()
+        if card is not None:
+            return card, False
+        try:
+            with transaction.atomic():
+                card = self.create(owner=owner, fingerprint=fingerprint, **fields)
+                outbox.publish(outbox.CARD_ADDED, card.pk, {
+                    'owner': str(owner.pk), 'brand': card.cbrand, 'last4': card.number[-4:]})
+        except IntegrityError:
+            # Added concurrently, the partial unique index keeps one
+            return existing.get(), False
+        return card, True
+
 
 class Card(models.Model):
     
-    owner = models.ForeignKey(User, on_delete=models.CASCADE)
-    authorization_code = models.CharField(max_length=200)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    # Charges the card without its details, so it is stored encrypted
+    authorization_code = EncryptedTextField()
     ctype = models.CharField(max_length=200)
     cbin = models.CharField(max_length=200, default=None)
     cbrand = models.CharField(max_length=200, default=None)
@@ -156,14 +353,179 @@ class Card(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
     created_on = models.DateTimeField(default=timezone.now)
+    deleted_on = models.DateTimeField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=64, default='', editable=False)
+
+    objects = CardManager()
+    all_objects = models.Manager()
+
+    # Migrations add partial indexes on (owner) for cards that aren't deleted, which serves
+    # Card.objects and the foreign key, a unique one on (owner, fingerprint) for active cards,
+    # and one on deleted cards for purge_cards
 
     def __str__(self):
         return self.number
 
+    def save(self, *args, **kwargs):
+        if not self.fingerprint:
+            self.fingerprint = card_fingerprint(self.cbin, self.number, self.expiry_month, self.expiry_year)
+        return super(Card, self).save(*args, **kwargs)
+
     def delete(self):
         self.is_active = False
         self.is_deleted = True
+        self.deleted_on = timezone.now()
         self.save()
 
 
-    
+class ArchivedCard(models.Model):
+    """
+    A deleted card moved out of ``Card`` by ``purge_cards``, without its
+    authorization code.
+    """
+    id = models.IntegerField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    fingerprint = models.CharField(max_length=64)
+    cbin = models.CharField(max_length=200, null=True)
+    cbrand = models.CharField(max_length=200, null=True)
+    number = models.CharField(max_length=200)
+    expiry_month = models.CharField(max_length=10)
+    expiry_year = models.CharField(max_length=10)
+    created_on = models.DateTimeField()
+    deleted_on = models.DateTimeField(null=True)
+    archived_on = models.DateTimeField(default=timezone.now)
+
+
+class TransactionArchive(BaseModel):
+    """
+    A monthly partition of ``Transaction`` moved to storage by
+    ``partitions.archive``. ``start`` is null for the partition that held
+    everything before the first month.
+    """
+    DETACHED = 'detached'
+    ARCHIVED = 'archived'
+    STATUS_CHOICES = (
+        (DETACHED, 'Detached'),
+        (ARCHIVED, 'Archived'),
+    )
+
+    partition = models.CharField(max_length=63, unique=True)
+    start = models.DateTimeField(null=True)
+    end = models.DateTimeField()
+    rows = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=DETACHED)
+    # The file's name in TRANSACTION_ARCHIVE_STORAGE
+    file = models.CharField(max_length=255, blank=True)
+
+
+class ArchivedTotal(models.Model):
+    """
+    The sum and count of the owner's archived transactions, so balances can
+    still be checked against transaction sums.
+    """
+    owner = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    amount = MoneyField()
+    transactions = models.BigIntegerField(default=0)
+
+
+class ReconciliationRun(BaseModel):
+    """
+    A check of every active balance against its owner's transaction sum,
+    split into chunks of consecutive owners by ``reconciliation.start``.
+    """
+    chunk_size = models.PositiveIntegerField()
+    chunks = models.PositiveIntegerField(default=0)
+    accounts = models.BigIntegerField(default=0)
+    discrepancies = models.BigIntegerField(default=0)
+    finished = models.DateTimeField(null=True)
+
+
+class ReconciliationChunk(models.Model):
+    """
+    The owners of a run with ids after ``after`` up to and including
+    ``upto``, either bound open when null.
+    """
+    run = models.ForeignKey(ReconciliationRun, on_delete=models.CASCADE, related_name='chunk_set')
+    number = models.PositiveIntegerField()
+    after = models.UUIDField(null=True)
+    upto = models.UUIDField(null=True)
+    done = models.BooleanField(default=False)
+    accounts = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        unique_together = ('run', 'number')
+
+
+class Discrepancy(models.Model):
+    """
+    An owner whose active balance didn't match the sum of their transactions,
+    archived ones included. ``available_balance`` is null if they had
+    transactions but no active balance.
+    """
+    run = models.ForeignKey(ReconciliationRun, on_delete=models.CASCADE, related_name='discrepancy_set')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    available_balance = MoneyField(null=True)
+    transaction_total = MoneyField()
+
+    class Meta:
+        verbose_name_plural = 'Discrepancies'
+
+    @property
+    def difference(self):
+        return (self.available_balance or 0) - self.transaction_total
+
+
+class Statement(BaseModel):
+    """
+    A statement of the owner's transactions from ``start`` to ``end``
+    inclusive, written gzipped to storage by ``statements.build``.
+    """
+    PENDING = 'pending'
+    READY = 'ready'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (READY, 'Ready'),
+    )
+
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+    FORMAT_CHOICES = (
+        (CSV, 'CSV'),
+        (NDJSON, 'Newline-delimited JSON'),
+    )
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='statements')
+    start = models.DateField()
+    end = models.DateField()
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # The file's name in STATEMENT_FILE_STORAGE
+    file = models.CharField(max_length=255, blank=True)
+    rows = models.PositiveIntegerField(null=True)
+
+
+@receiver([post_save, post_delete])
+def invalidate_user_summary(sender, instance=None, **kwargs):
+    # Balance changes always come with a Transaction row, so they are covered too
+    if isinstance(instance, UserProfile):
+        owner_id = instance.user_id
+    elif isinstance(instance, (Balance, Bank, Card, Transaction)):
+        owner_id = instance.owner_id
+    else:
+        return
+    from . import summary
+    summary.invalidate(owner_id)
+
+
+@receiver([post_save, post_delete], sender=AllBanks)
+def invalidate_bank_directory(sender, **kwargs):
+    from . import banks
+    banks.invalidate()
+
+
+@receiver(post_migrate)
+def ensure_transaction_partitions(sender, using=None, **kwargs):
+    if sender.label != 'users' or using != 'default':
+        return
+    from . import partitions
+    partitions.ensure_partitions()
@@ -0,0 +1,104 @@
+"""
+One-time codes for phone verification.
+
+Codes live hashed in the shared ``OTP_CACHE`` cache until they expire, so
+with ``CACHE_URL`` pointing at memcached or Redis sending and verifying don't
+read from Postgres. The ``NewUserPhoneVerification`` row
+keeps the same hash and expiry, and verification falls back to it when the
+cache has lost the code.
+"""
+import secrets
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.exceptions import Throttled
+from flite.core import cache, ratelimit
+from .models import NewUserPhoneVerification
+
+CODE_LENGTH = 6
+
+
+def _cache():
+    return cache.shared(settings.OTP_CACHE)
+
+
+def generate_code():
+    return str(secrets.randbelow(10 ** CODE_LENGTH)).zfill(CODE_LENGTH)
+
+
+def hash_code(phone_number, code):
+    # Keyed with SECRET_KEY, so a leaked table can't be brute forced over the
+    # million possible codes
+    return salted_hmac('flite.users.otp', f'{phone_number}:{code}').hexdigest()
+
+
+def _throttle(key, limit):
+    wait = ratelimit.hit(key, limit, settings.OTP_RATE_WINDOW)
+    if wait:
+        raise Throttled(wait=wait)
+
+
+def issue(phone_number, email, ip=None):
+    """
+    Creates a new code for ``phone_number``, replacing any earlier one, and
+    returns ``(verification, code)``.
+
+    Raises ``Throttled`` when the phone number or ``ip`` has asked for too many
+    codes within ``OTP_RATE_WINDOW``.
+    """
+    phone_number = str(phone_number)
+    _throttle(f'otp-phone:{phone_number}', settings.OTP_PHONE_LIMIT)
+    if ip:
+        _throttle(f'otp-ip:{ip}', settings.OTP_IP_LIMIT)
+
+    code = generate_code()
+    hashed = hash_code(phone_number, code)
+    cache = _cache()
+    cache.set(f'otp:{phone_number}', hashed, settings.OTP_TTL)
+    ratelimit.reset(cache, f'otp-attempts:{phone_number}')
+
+    verification, _ = NewUserPhoneVerification.objects.update_or_create(
+        phone_number=phone_number,
+        defaults={
+            'verification_code': hashed,
+            'email': email,
+            'is_verified': False,
+            'expires': timezone.now() + timedelta(seconds=settings.OTP_TTL),
+        })
+    return verification, code
+
+
+def verify(phone_number, code):
+    """
+    Consumes ``code`` if it is the current code for ``phone_number``.
+
+    Returns whether it was. A code is accepted once, however many requests race
+    to use it, and each code allows ``OTP_MAX_ATTEMPTS`` guesses.
+    """
+    phone_number = str(phone_number)
+    hashed = hash_code(phone_number, code)
+    cache = _cache()
+
+    attempts = ratelimit.count(cache, f'otp-attempts:{phone_number}', settings.OTP_TTL)
+    if attempts > settings.OTP_MAX_ATTEMPTS:
+        return False
+
+    stored = cache.get(f'otp:{phone_number}')
+    if stored is not None and not constant_time_compare(stored, hashed):
+        return False
+
+    # add() is atomic, so exactly one request gets to consume the code, whether
+    # the cache or the database vouched for it
+    used_key = f'otp-used:{hashed}'
+    if not cache.add(used_key, True, settings.OTP_TTL):
+        return False
+    cache.delete(f'otp:{phone_number}')
+
+    verified = NewUserPhoneVerification.objects.filter(
+        phone_number=phone_number, verification_code=hashed, is_verified=False,
+        expires__gt=timezone.now()).update(is_verified=True, modified=timezone.now())
+    if stored is None and not verified:
+        cache.delete(used_key)
+        return False
+    return True
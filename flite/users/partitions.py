@@ -0,0 +1,175 @@
+"""
+Monthly partitions of the transaction table, on PostgreSQL.
+
+Migration 0011 partitions ``users_transaction`` by range of ``created``, one
+partition per calendar month in UTC plus one for everything before the first
+month. Queries bounded by ``created`` only scan the partitions in range, and
+newest-first queries with a LIMIT (history pages, recent transactions) read
+partitions newest first and stop once they have enough rows. That needs
+PostgreSQL 12, and on older servers the table is left unpartitioned and the
+functions here do nothing.
+
+There is no default partition, as one would stop PostgreSQL reading
+partitions in order, so a row can't be inserted until its month's partition
+exists. ``ensure_partitions`` keeps the next ``TRANSACTION_PARTITIONS_AHEAD``
+months created. It runs after every migrate and should run daily with
+``manage.py partition_transactions``.
+
+``archive`` detaches partitions older than ``TRANSACTION_HOT_MONTHS``, adds
+their per-owner sums to ``ArchivedTotal``, writes them to
+``TRANSACTION_ARCHIVE_STORAGE`` as gzipped CSV and drops them. Each step
+commits on its own, and a partition left detached by an interrupted run is
+finished by the next one.
+"""
+import gzip
+import re
+import tempfile
+from collections import namedtuple
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import get_storage_class
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ArchivedTotal, Transaction, TransactionArchive
+
+# PostgreSQL 12, the first to read range partitions in order for ORDER BY ... LIMIT
+MIN_POSTGRES_VERSION = 120000
+
+# Partition DDL locks the transaction table, so it gives up rather than queue behind long queries
+LOCK_TIMEOUT = '10s'
+
+BOUNDS = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+Partition = namedtuple('Partition', ('name', 'start', 'end'))
+
+
+def table():
+    return Transaction._meta.db_table
+
+
+def month_start(value):
+    value = timezone.localtime(value, timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(month):
+    return f'{table()}_p{month:%Y%m}'
+
+
+def create_partition(cursor, month):
+    cursor.execute(
+        f'CREATE TABLE {partition_name(month)} PARTITION OF {table()} FOR VALUES FROM (%s) TO (%s)',
+        [month, add_months(month, 1)])
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql' or connection.pg_version < MIN_POSTGRES_VERSION:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [table()])
+        return cursor.fetchone() is not None
+
+
+def _bound(value):
+    return None if value == 'MINVALUE' else parse_datetime(value.strip("'"))
+
+
+def partitions():
+    """
+    The attached partitions, oldest first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass', [table()])
+        found = [Partition(name, *map(_bound, BOUNDS.search(bounds).groups()))
+                 for name, bounds in cursor.fetchall()]
+    return sorted(found, key=lambda partition: partition.end)
+
+
+def ensure_partitions(ahead=None, now=None):
+    """
+    Creates any missing partitions from this month to ``ahead`` months on and
+    returns their names.
+    """
+    if not is_partitioned():
+        return []
+    ahead = settings.TRANSACTION_PARTITIONS_AHEAD if ahead is None else ahead
+    this_month = month_start(now or timezone.now())
+    existing = {partition.start for partition in partitions()}
+    missing = [month for month in (add_months(this_month, count) for count in range(ahead + 1))
+               if month not in existing]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        for month in missing:
+            create_partition(cursor, month)
+    return [partition_name(month) for month in missing]
+
+
+def storage():
+    storage_class = get_storage_class(settings.TRANSACTION_ARCHIVE_STORAGE)
+    return storage_class(**settings.TRANSACTION_ARCHIVE_STORAGE_OPTIONS)
+
+
+def detach(partition):
+    """
+    Detaches ``partition`` and moves its sums into ``ArchivedTotal`` in one
+    transaction, so balances still match transaction sums.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(f'ALTER TABLE {table()} DETACH PARTITION {partition.name}')
+        totals = ArchivedTotal._meta.db_table
+        cursor.execute(
+            f'INSERT INTO {totals} (owner_id, amount, transactions) '
+            f'SELECT owner_id, SUM(amount), COUNT(*) FROM {partition.name} GROUP BY owner_id '
+            f'ON CONFLICT (owner_id) DO UPDATE SET amount = {totals}.amount + EXCLUDED.amount, '
+            f'transactions = {totals}.transactions + EXCLUDED.transactions')
+        cursor.execute(f'SELECT COUNT(*) FROM {partition.name}')
+        rows = cursor.fetchone()[0]
+        return TransactionArchive.objects.create(
+            partition=partition.name, start=partition.start, end=partition.end, rows=rows)
+
+
+def store(archive):
+    """
+    Writes a detached partition to storage and drops it.
+    """
+    with tempfile.TemporaryFile() as dump:
+        with gzip.GzipFile(fileobj=dump, mode='wb') as compressed, connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {archive.partition} TO STDOUT WITH (FORMAT csv, HEADER)', compressed)
+        dump.seek(0)
+        name = storage().save(f'archive/transactions/{archive.partition}.csv.gz', File(dump))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {archive.partition}')
+        archive.status = TransactionArchive.ARCHIVED
+        archive.file = name
+        archive.save(update_fields=['status', 'file', 'modified'])
+    return archive
+
+
+def archive(months=None, now=None):
+    """
+    Archives the partitions that ended ``months`` or more months before this
+    month began, and any left detached by an earlier run. Returns their
+    ``TransactionArchive`` records.
+    """
+    if not is_partitioned():
+        return []
+    months = settings.TRANSACTION_HOT_MONTHS if months is None else months
+    cutoff = add_months(month_start(now or timezone.now()), -months)
+
+    archived = [store(archive) for archive in
+                TransactionArchive.objects.filter(status=TransactionArchive.DETACHED).order_by('end')]
+    for partition in partitions():
+        if partition.end <= cutoff:
+            archived.append(store(detach(partition)))
+    return archived
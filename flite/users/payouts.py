@@ -0,0 +1,230 @@
+"""
+Bank payouts, settled in bulk.
+
+``run`` moves pending BankTransfers through three stages, each a handful of
+queries however many payouts there are:
+
+1. claim: lock pending transfers, and ones a crashed run left processing for
+   over ``PAYOUT_LOCK_TIMEOUT`` seconds, and mark them processing.
+2. submit: group them by destination bank code into batches of the gateway's
+   ``max_batch_size`` and send up to ``PAYOUT_CONCURRENCY`` batches at once.
+3. reconcile: mark settled transfers successful in bulk, and credit ones the
+   gateway rejected back to their owners with a reversal transaction.
+
+A batch whose call raises, e.g. on a timeout or a 5xx, may still have been
+paid, so its transfers stay processing rather than being credited back. They
+are claimed and submitted again after ``PAYOUT_LOCK_TIMEOUT``, so gateways must
+treat the transfer reference as an idempotency key and report the outcome of
+a payout they already made.
+"""
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from flite.core import http
+from . import ledger, summary
+from .models import BankTransfer, LedgerEntry, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Stays under SQLite's limit on query parameters
+UPDATE_CHUNK_SIZE = 500
+
+
+class BaseGateway:
+    """
+    Pays out batches of ``{'reference', 'amount', 'account_number',
+    'account_name'}`` dicts to accounts at one bank.
+    """
+    # The most payouts the gateway accepts in one call
+    max_batch_size = 1000
+
+    def submit(self, bank_code, payouts):
+        """
+        Returns ``{reference: (succeeded, reason)}`` for the payouts whose
+        outcome is known, with ``succeeded`` False only for ones the bank
+        rejected. Payouts left out stay processing.
+        """
+        raise NotImplementedError
+
+
+class LocalGateway(BaseGateway):
+    """
+    A stand-in gateway for development and benchmarks. Each call takes
+    ``PAYOUT_LOCAL_LATENCY`` seconds, and payouts to account numbers ending
+    in 000 fail.
+    """
+
+    def submit(self, bank_code, payouts):
+        time.sleep(settings.PAYOUT_LOCAL_LATENCY)
+        return {
+            payout['reference']: (False, "Invalid account") if payout['account_number'].endswith('000')
+            else (True, '')
+            for payout in payouts
+        }
+
+
+class HTTPGateway(BaseGateway):
+    """
+    Posts each batch to ``PAYOUT_API_URL`` and reads back
+    ``{"results": [{"reference", "status", "reason"}]}``. Only a ``success``
+    or ``failed`` status settles a payout.
+    """
+    OUTCOMES = {'success': True, 'failed': False}
+
+    def submit(self, bank_code, payouts):
+        response = http.request_json('POST', settings.PAYOUT_API_URL, {
+            'bank_code': bank_code, 'payouts': payouts,
+        }, headers={'Authorization': f'Bearer {settings.PAYOUT_API_KEY}'})
+        return {result['reference']: (self.OUTCOMES[result['status']], result.get('reason', ''))
+                for result in response['results'] if result['status'] in self.OUTCOMES}
+
+
+def get_gateway():
+    return import_string(settings.PAYOUT_GATEWAY)()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _by_id(ids, since):
+    """
+    The transactions with ``ids``, created at or after ``since``. Bounding
+    created keeps the lookup to the partitions they can be in.
+    """
+    return Transaction.objects.filter(pk__in=ids, created__gte=since)
+
+
+def claim(limit):
+    """
+    Marks up to ``limit`` payable transfers as processing and returns them.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.PAYOUT_LOCK_TIMEOUT)
+    with transaction.atomic():
+        payouts = list(BankTransfer.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            Q(status=Transaction.PENDING) | Q(status=Transaction.PROCESSING, modified__lt=stale)
+        ).order_by('created').values(
+            'id', 'created', 'owner_id', 'bank_id', 'reference', 'amount', 'bank__account_number',
+            'bank__account_name', 'bank__bank__bank_code')[:limit])
+        now = timezone.now()
+        since = min((payout['created'] for payout in payouts), default=None)
+        for chunk in _chunks([payout['id'] for payout in payouts], UPDATE_CHUNK_SIZE):
+            _by_id(chunk, since).update(status=Transaction.PROCESSING, modified=now)
+    return payouts
+
+
+def submit(payouts, gateway, concurrency):
+    """
+    Sends ``payouts`` to ``gateway`` in batches per bank code and returns
+    ``{reference: (succeeded, reason)}``. A batch whose call raises has no
+    results, as the bank may have paid it anyway.
+    """
+    by_bank = defaultdict(list)
+    for payout in payouts:
+        by_bank[payout['bank__bank__bank_code']].append({
+            'reference': payout['reference'],
+            'amount': -int(payout['amount']),
+            'account_number': payout['bank__account_number'],
+            'account_name': payout['bank__account_name'],
+        })
+    batches = [(bank_code, batch) for bank_code, items in by_bank.items()
+               for batch in _chunks(items, gateway.max_batch_size)]
+
+    def send(batch):
+        bank_code, items = batch
+        try:
+            return gateway.submit(bank_code, items)
+        except Exception:
+            logger.exception("Payout batch of %d to bank %s has an unknown outcome", len(items), bank_code)
+            return {}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for outcome in pool.map(send, batches):
+            results.update(outcome)
+    return results, len(batches)
+
+
+def reconcile(payouts, results):
+    """
+    Records the gateway's ``results`` for ``payouts`` and returns the numbers
+    settled, failed and mismatched. Payouts missing from ``results`` stay
+    processing and are claimed again after ``PAYOUT_LOCK_TIMEOUT``.
+
+    A failed payout whose owner has no active balance to credit back is
+    mismatched: it is logged and stays processing for someone to look into.
+    """
+    settled = [payout for payout in payouts if results.get(payout['reference'], (None,))[0] is True]
+    failed = [payout for payout in payouts if results.get(payout['reference'], (None,))[0] is False]
+    now = timezone.now()
+    since = min((payout['created'] for payout in payouts), default=None)
+
+    with transaction.atomic():
+        for chunk in _chunks([payout['id'] for payout in settled], UPDATE_CHUNK_SIZE):
+            _by_id(chunk, since).filter(status=Transaction.PROCESSING).update(
+                status=Transaction.SUCCESS, modified=now)
+
+        # Only credit back transfers still processing, in case another run reclaimed one
+        processing = set()
+        for chunk in _chunks([payout['id'] for payout in failed], UPDATE_CHUNK_SIZE):
+            processing.update(_by_id(chunk, since).select_for_update().filter(
+                status=Transaction.PROCESSING).values_list('id', flat=True))
+        failed = [payout for payout in failed if payout['id'] in processing]
+
+        balances = ledger.lock_balances(*{payout['owner_id'] for payout in failed}) if failed else {}
+        mismatched = [payout for payout in failed if str(payout['owner_id']) not in balances]
+        for payout in mismatched:
+            logger.error("Payout %s failed but owner %s has no active balance to credit back",
+                         payout['reference'], payout['owner_id'])
+        failed = [payout for payout in failed if str(payout['owner_id']) in balances]
+        reversals = []
+        for payout in failed:
+            balance = balances[str(payout['owner_id'])]
+            reference = f"{payout['reference']}-reversal"
+            ledger.post(reference, [
+                (LedgerEntry.BANK_SETTLEMENT, None, payout['amount']),
+                (LedgerEntry.WALLET, balance, -payout['amount']),
+            ])
+            reversals.append(BankTransfer(
+                owner_id=payout['owner_id'], bank_id=payout['bank_id'], reference=reference,
+                status=Transaction.SUCCESS, amount=-payout['amount'], new_balance=balance.available_balance))
+        BankTransfer.objects.bulk_create(reversals)
+        for chunk in _chunks([payout['id'] for payout in failed], UPDATE_CHUNK_SIZE):
+            _by_id(chunk, since).update(status=Transaction.FAILED, modified=now)
+
+        # Bulk updates skip the signals that would drop these
+        summary.invalidate_many({payout['owner_id'] for payout in settled + failed})
+    return len(settled), len(failed), len(mismatched)
+
+
+def run(limit=50000, concurrency=None):
+    """
+    Claims, submits and reconciles up to ``limit`` payouts. Returns the counts
+    and the seconds spent in each stage.
+    """
+    gateway = get_gateway()
+    report = {}
+
+    started = time.perf_counter()
+    payouts = claim(limit)
+    report['claimed'] = len(payouts)
+    report['claim_seconds'] = time.perf_counter() - started
+    if not payouts:
+        return report
+
+    started = time.perf_counter()
+    results, report['batches'] = submit(payouts, gateway, concurrency or settings.PAYOUT_CONCURRENCY)
+    report['submit_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    report['settled'], report['failed'], report['mismatched'] = reconcile(payouts, results)
+    report['reconcile_seconds'] = time.perf_counter() - started
+    return report
@@ -0,0 +1,106 @@
+"""
+Bulk user provisioning for partner migrations.
+
+Creating users one at a time runs the ``create_auth_token`` receiver per row, three
+extra INSERTs each. This path writes users, tokens, profiles and balances with
+``bulk_create`` per chunk and hashes passwords in a process pool, leaving the
+same rows behind as the signal would.
+"""
+import csv
+import json
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+from flite.core import outbox
+from flite.core.models import OutboxEvent
+from .models import User, UserProfile, Balance, user_created_payload
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+def read_users(path):
+    """
+    Yields a dict per user from a ``.csv`` file with a header row, or from a
+    file with one JSON object per line.
+    """
+    with open(path, newline='') as source:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _hash_passwords(passwords, pool):
+    # make_password(None) gives an unusable password, as set_unusable_password does
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 64)))
+
+
+def _create_profiles(users):
+    for attempt in range(UserProfile.REFERRAL_CODE_ATTEMPTS):
+        profiles = [
+            UserProfile(user=user, referral_code=UserProfile.generate_new_referal_code())
+            for user in users
+        ]
+        try:
+            with transaction.atomic():
+                return UserProfile.objects.bulk_create(profiles)
+        except IntegrityError:
+            if attempt == UserProfile.REFERRAL_CODE_ATTEMPTS - 1:
+                raise
+
+
+def _provision_chunk(rows, pool):
+    passwords = _hash_passwords([row.get('password') or None for row in rows], pool)
+    users = []
+    for row, password in zip(rows, passwords):
+        user = User(id=uuid.uuid4(), password=password, **{
+            field: row.get(field) or '' for field in USER_FIELDS})
+        users.append(user)
+
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        Token.objects.bulk_create([Token(user=user, key=Token().generate_key()) for user in users])
+        _create_profiles(users)
+        Balance.objects.bulk_create([Balance(owner=user) for user in users])
+        OutboxEvent.objects.bulk_create([
+            outbox.event(outbox.USER_CREATED, user.pk, user_created_payload(user)) for user in users])
+    return users
+
+
+def provision_users(rows, batch_size=1000, workers=None, progress=None):
+    """
+    Creates a user, with token, profile and balance, for each dict in ``rows``.
+
+    Each chunk of ``batch_size`` users commits on its own, so a failure (e.g. a
+    duplicate username) only rolls back its chunk. ``workers=0`` hashes passwords
+    in this process. ``progress`` is called with the running total after each chunk.
+    Returns the number of users created.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    created = 0
+    try:
+        for chunk in _chunks(rows, batch_size):
+            created += len(_provision_chunk(chunk, pool))
+            if progress:
+                progress(created)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return created
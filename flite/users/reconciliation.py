@@ -0,0 +1,115 @@
+"""
+Checks every active balance against the sum of its owner's transactions.
+
+``start`` walks the owners with an active balance in id order and records a
+ReconciliationChunk for every ``RECONCILIATION_CHUNK_SIZE`` of them. ``check``
+reconciles one chunk with a grouped sum of its owners' transactions, plus
+their ``ArchivedTotal``, read in the same snapshot as their balances, and
+records the owners that differ as Discrepancy rows in the same transaction
+that marks the chunk done. ``run`` checks the chunks not yet done across a
+pool of processes, so an interrupted run resumes where it stopped.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import (ArchivedTotal, Balance, Discrepancy, ReconciliationChunk, ReconciliationRun,
+                     Transaction)
+
+
+def start(chunk_size=None):
+    """
+    Creates a run with its chunks of owners.
+    """
+    chunk_size = chunk_size or settings.RECONCILIATION_CHUNK_SIZE
+    owners = Balance.objects.filter(active=True).order_by('owner_id').values_list('owner_id', flat=True)
+    bounds = []
+    for position, owner_id in enumerate(owners.iterator(chunk_size=chunk_size), 1):
+        if position % chunk_size == 0:
+            bounds.append(owner_id)
+
+    with transaction.atomic():
+        run = ReconciliationRun.objects.create(chunk_size=chunk_size, chunks=len(bounds) + 1)
+        # The last chunk is open-ended, catching owners with transactions but no balance
+        ReconciliationChunk.objects.bulk_create(
+            ReconciliationChunk(run=run, number=number, after=after, upto=upto)
+            for number, (after, upto) in enumerate(zip([None] + bounds, bounds + [None])))
+    return run
+
+
+def _owners(chunk):
+    lookups = {}
+    if chunk.after is not None:
+        lookups['owner_id__gt'] = chunk.after
+    if chunk.upto is not None:
+        lookups['owner_id__lte'] = chunk.upto
+    return lookups
+
+
+def check(chunk):
+    """
+    Reconciles the owners in ``chunk`` and returns how many discrepancies it found.
+    """
+    owners = _owners(chunk)
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            # Balances and transactions must be read from the same snapshot to add up
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        balances = dict(Balance.objects.filter(active=True, **owners).values_list(
+            'owner_id', 'available_balance'))
+        totals = dict(Transaction.objects.filter(**owners).order_by().values('owner_id').annotate(
+            total=Sum('amount')).values_list('owner_id', 'total'))
+        for owner_id, amount in ArchivedTotal.objects.filter(**owners).values_list('owner_id', 'amount'):
+            totals[owner_id] = totals.get(owner_id, 0) + amount
+
+        discrepancies = [
+            Discrepancy(run_id=chunk.run_id, owner_id=owner_id, available_balance=balances.get(owner_id),
+                        transaction_total=totals.get(owner_id, 0))
+            for owner_id in balances.keys() | totals.keys()
+            if balances.get(owner_id) is None or balances[owner_id] != totals.get(owner_id, 0)
+        ]
+        Discrepancy.objects.bulk_create(discrepancies)
+        ReconciliationChunk.objects.filter(pk=chunk.pk).update(done=True, accounts=len(balances))
+    return len(discrepancies)
+
+
+def _check(chunk_id):
+    return check(ReconciliationChunk.objects.get(pk=chunk_id))
+
+
+def run(reconciliation, processes=None, progress=None):
+    """
+    Checks the chunks of ``reconciliation`` not yet done, in ``processes``
+    processes, and records the totals once all are. ``progress`` is called
+    with the number of chunks done after each one.
+    """
+    processes = processes or settings.RECONCILIATION_PROCESSES or os.cpu_count()
+    pending = list(reconciliation.chunk_set.filter(done=False).order_by('number').values_list(
+        'pk', flat=True))
+    done = reconciliation.chunks - len(pending)
+
+    def checked(results):
+        nonlocal done
+        for _ in results:
+            done += 1
+            if progress:
+                progress(done)
+
+    if processes == 1:
+        checked(map(_check, pending))
+    else:
+        # Children must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            checked(pool.map(_check, pending))
+
+    chunks = reconciliation.chunk_set.aggregate(accounts=Sum('accounts'))
+    reconciliation.accounts = chunks['accounts'] or 0
+    reconciliation.discrepancies = reconciliation.discrepancy_set.count()
+    reconciliation.finished = timezone.now()
+    reconciliation.save(update_fields=['accounts', 'discrepancies', 'finished', 'modified'])
+    return reconciliation
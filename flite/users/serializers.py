@@ -1,6 +1,9 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import User, NewUserPhoneVerification,UserProfile,Referral
-from . import utils
+from rest_framework.throttling import BaseThrottle
+from .models import User, NewUserPhoneVerification,UserProfile,Referral,Transaction,Statement
+from . import statements, transfers, utils
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -25,6 +28,7 @@ class CreateUserSerializer(serializers.ModelSerializer):
         else:
             return code
 
+    @transaction.atomic
     def create(self, validated_data):
         # call create_user on user object. Without this
         # the password will be stored in plain text.
@@ -56,17 +60,80 @@ class SendNewPhonenumberSerializer(serializers.ModelSerializer):
         phone_number = validated_data.get("phone_number", None) 
         email = validated_data.get("email", None)
 
-        obj, code = utils.send_mobile_signup_sms(phone_number, email)
-        
+        request = self.context.get('request')
+        ip = BaseThrottle().get_ident(request) if request else None
+
+        # The code only goes out by SMS, or anyone could verify any number
+        obj, _ = utils.send_mobile_signup_sms(phone_number, email, ip=ip)
+
         return {
-            "verification_code":code,
             "id":obj.id
         }
 
     class Meta:
         model = NewUserPhoneVerification
-        fields = ('id', 'phone_number', 'verification_code', 'email',)
-        extra_kwargs = {'phone_number': {'write_only': True, 'required':True}, 'email': {'write_only': True}, }
-        read_only_fields = ('id', 'verification_code')
-        
-    
\ No newline at end of file
+        fields = ('id', 'phone_number', 'email',)
+        # Sending again to the same number replaces its code
+        extra_kwargs = {'phone_number': {'write_only': True, 'required':True, 'validators': []},
+                        'email': {'write_only': True}, }
+        read_only_fields = ('id',)
+
+
+class TransactionSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source='kind')
+
+    class Meta:
+        model = Transaction
+        fields = ('id', 'type', 'reference', 'status', 'amount', 'new_balance', 'created',
+                  'bank', 'sender', 'receipient')
+        read_only_fields = fields
+
+
+class P2PTransferSerializer(serializers.Serializer):
+    recipient = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    amount = serializers.IntegerField(min_value=1, help_text="Amount in kobo")
+    reference = serializers.CharField(max_length=200, required=False)
+
+    def create(self, validated_data):
+        try:
+            debit, _ = transfers.p2p_transfer(
+                self.context['request'].user, validated_data['recipient'],
+                validated_data['amount'], validated_data.get('reference'))
+        except transfers.TransferError as error:
+            raise serializers.ValidationError({"message": str(error)})
+        return debit
+
+    def to_representation(self, instance):
+        return TransactionSerializer(instance, context=self.context).data
+
+
+class BankSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    name = serializers.CharField()
+    acronym = serializers.CharField()
+    bank_code = serializers.CharField()
+
+
+class StatementRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False, help_text="Defaults to the day the user joined")
+    end = serializers.DateField(required=False, help_text="Defaults to today")
+    output = serializers.ChoiceField(choices=Statement.FORMAT_CHOICES, default=Statement.CSV)
+
+    def validate(self, data):
+        data.setdefault('end', timezone.localdate())
+        data.setdefault('start', timezone.localdate(self.context['request'].user.date_joined))
+        if data['start'] > data['end']:
+            raise serializers.ValidationError({"start": "Must not be after end."})
+        return data
+
+
+class StatementSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Statement
+        fields = ('id', 'start', 'end', 'format', 'status', 'rows', 'url', 'created')
+        read_only_fields = fields
+
+    def get_url(self, statement):
+        return statements.storage().url(statement.file) if statement.status == Statement.READY else None
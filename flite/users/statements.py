@@ -0,0 +1,128 @@
+"""
+Transaction statements, in CSV or newline-delimited JSON.
+
+Rows are read oldest first through a server-side cursor ``STATEMENT_CHUNK_SIZE``
+rows at a time and written out chunk by chunk, so memory use doesn't grow with
+the statement. Ranges up to ``STATEMENT_STREAM_MAX_DAYS`` are streamed in the
+response; longer ones are written gzipped to ``STATEMENT_FILE_STORAGE`` by the
+``build`` job, spooling to a temporary file past ``STATEMENT_SPOOL_SIZE`` bytes.
+"""
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import get_storage_class
+from django.utils import timezone
+from flite.core.jobs import job
+from .models import Statement, Transaction
+
+COLUMNS = ('id', 'created', 'type', 'reference', 'status', 'amount', 'new_balance')
+
+CONTENT_TYPES = {
+    Statement.CSV: 'text/csv',
+    Statement.NDJSON: 'application/x-ndjson',
+}
+
+
+def storage():
+    return get_storage_class(settings.STATEMENT_FILE_STORAGE)(**settings.STATEMENT_STORAGE_OPTIONS)
+
+
+def rows(owner_id, start, end):
+    """
+    Yields a tuple of ``COLUMNS`` for each of the owner's transactions from
+    ``start`` to ``end`` inclusive, oldest first.
+    """
+    since = timezone.make_aware(datetime.combine(start, time.min))
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    queryset = Transaction.objects.filter(
+        owner_id=owner_id, created__gte=since, created__lt=until,
+    ).order_by('created', 'id').values_list(
+        'id', 'created', 'kind', 'reference', 'status', 'amount', 'new_balance')
+    for pk, created, kind, reference, status, amount, new_balance in queryset.iterator(
+            chunk_size=settings.STATEMENT_CHUNK_SIZE):
+        yield str(pk), created.isoformat(), kind, reference, status, int(amount), int(new_balance)
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render(format, rows):
+    """
+    Yields the statement of ``rows`` as text, one chunk of rows at a time.
+    """
+    if format == Statement.CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for chunk in _chunks(rows, settings.STATEMENT_CHUNK_SIZE):
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    elif format == Statement.NDJSON:
+        for chunk in _chunks(rows, settings.STATEMENT_CHUNK_SIZE):
+            yield ''.join(json.dumps(dict(zip(COLUMNS, row))) + '\n' for row in chunk)
+    else:
+        raise ValueError(f"Unknown statement format {format!r}")
+
+
+def filename(owner_id, start, end, format):
+    return f'statement-{owner_id}-{start:%Y%m%d}-{end:%Y%m%d}.{format}'
+
+
+def _reusable(statement):
+    # A pending statement is built later, but one built on or before its last day may be missing
+    # transactions made since
+    return statement.status == Statement.PENDING or statement.end < timezone.localdate(statement.modified)
+
+
+def queue(owner, start, end, format):
+    """
+    Returns the owner's statement for the range and format, queueing a new one
+    if there is none yet or the last one was built before the range ended.
+    """
+    statement = Statement.objects.filter(
+        owner=owner, start=start, end=end, format=format).order_by('-created').first()
+    if statement is None or not _reusable(statement):
+        statement = Statement.objects.create(owner=owner, start=start, end=end, format=format)
+        build.delay(str(statement.pk))
+    return statement
+
+
+@job(queue='statements')
+def build(statement_id):
+    """
+    Writes the statement to storage and marks it ready. It stays pending while
+    the job is retried.
+    """
+    statement = Statement.objects.get(pk=statement_id)
+    count = 0
+
+    def counted(items):
+        nonlocal count
+        for item in items:
+            count += 1
+            yield item
+
+    with tempfile.SpooledTemporaryFile(max_size=settings.STATEMENT_SPOOL_SIZE) as spool:
+        with gzip.GzipFile(fileobj=spool, mode='wb') as archive:
+            statement_rows = counted(rows(statement.owner_id, statement.start, statement.end))
+            for text in render(statement.format, statement_rows):
+                archive.write(text.encode())
+        spool.seek(0)
+        name = filename(statement.owner_id, statement.start, statement.end, statement.format)
+        name = storage().save(f'statements/{statement.pk}/{name}.gz', File(spool))
+    Statement.objects.filter(pk=statement.pk).update(
+        status=Statement.READY, file=name, rows=count, modified=timezone.now())
@@ -0,0 +1,65 @@
+"""
+The account summary shown on the home screen, cached as one document per user.
+
+Saving or deleting any model the summary is built from drops the owner's
+document (see ``invalidate_user_summary``) and the next read rebuilds it. The
+document is dropped again when the transaction commits, so a read racing the
+change can't cache what the change replaced. It is always built from the
+primary, as a replica lagging behind the change would be cached just the same.
+``USER_SUMMARY_CACHE`` must be shared, so a change made by a job worker or
+another web process drops the document every process reads.
+"""
+from django.conf import settings
+from django.db import transaction
+from flite.core import cache
+from flite.core.db import use_primary
+from .models import UserProfile, Balance, Bank, Card, Transaction
+from .serializers import TransactionSerializer
+
+RECENT_TRANSACTIONS = 5
+
+
+def _cache():
+    return cache.shared(settings.USER_SUMMARY_CACHE)
+
+
+def _key(user_id):
+    return f'user-summary:{user_id}'
+
+
+def build(user_id):
+    profile = UserProfile.objects.filter(user_id=user_id).values_list('referral_code', flat=True).first()
+    balance = Balance.objects.filter(owner_id=user_id, active=True).values(
+        'book_balance', 'available_balance').first()
+    transactions = Transaction.objects.filter(owner_id=user_id).order_by(
+        '-created', '-id')[:RECENT_TRANSACTIONS]
+    return {
+        'id': str(user_id),
+        'referral_code': profile,
+        'book_balance': int(balance['book_balance']) if balance else 0,
+        'available_balance': int(balance['available_balance']) if balance else 0,
+        'banks': Bank.objects.filter(owner_id=user_id).count(),
+        'cards': Card.objects.filter(owner_id=user_id).count(),
+        'recent_transactions': [dict(row) for row in TransactionSerializer(transactions, many=True).data],
+    }
+
+
+def get(user_id):
+    summary = _cache().get(_key(user_id))
+    if summary is None:
+        with use_primary():
+            summary = build(user_id)
+        _cache().set(_key(user_id), summary, settings.USER_SUMMARY_TTL)
+    return summary
+
+
+def invalidate(user_id):
+    key = _key(user_id)
+    _cache().delete(key)
+    transaction.on_commit(lambda: _cache().delete(key))
+
+
+def invalidate_many(user_ids):
+    keys = [_key(user_id) for user_id in user_ids]
+    _cache().delete_many(keys)
+    transaction.on_commit(lambda: _cache().delete_many(keys))
@@ -1 +1,32 @@
+from django.conf import settings
+from flite.core import cache, sms
+from flite.core.jobs import job
 
+
+def _code_key(verification_id):
+    return f'otp-sms:{verification_id}'
+
+
+def send_sms_verification_code(verification, code):
+    """
+    Queues the verification code for delivery by SMS
+
+    The job only carries the verification's id, and the code waits in the
+    shared ``OTP_CACHE`` until it is sent, so failed jobs don't keep codes
+    """
+    cache.shared(settings.OTP_CACHE).set(_code_key(verification.pk), code, settings.OTP_TTL)
+    return deliver_verification_codes.delay(
+        phone_number=str(verification.phone_number), verification_id=str(verification.pk))
+
+
+@job(queue='sms', batched=True)
+def deliver_verification_codes(verifications):
+    otp_cache = cache.shared(settings.OTP_CACHE)
+    keys = [_code_key(verification['verification_id']) for verification in verifications]
+    codes = otp_cache.get_many(keys)
+    # A code missing from the cache has expired or been replaced by a newer
+    # one that is already on its way
+    sms.deliver([
+        {'to': verification['phone_number'], 'body': f"Your Flite verification code is {codes[key]}"}
+        for verification, key in zip(verifications, keys) if key in codes])
+    otp_cache.delete_many(list(codes))
@@ -0,0 +1,78 @@
+import json
+import tempfile
+import uuid
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from nose.tools import eq_
+from rest_framework import status
+from rest_framework.test import APITestCase
+from .factories import UserFactory
+from .. import banks
+from ..models import AllBanks
+
+
+class TestBankDirectory(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        banks.invalidate()
+        AllBanks.objects.create(name='Access Bank', acronym='ACCESS', bank_code='044')
+        AllBanks.objects.create(name='Accion Microfinance Bank', acronym='ACCION', bank_code='50315')
+        AllBanks.objects.create(name='Zenith Bank', acronym='ZENITH', bank_code='057')
+        self.client.force_authenticate(UserFactory())
+
+    def test_lookups_need_no_queries(self):
+        banks.directory()
+        with CaptureQueriesContext(connection) as queries:
+            directory = banks.directory()
+            eq_(directory.get('057').name, 'Zenith Bank')
+            eq_(directory.get_by_acronym('access').bank_code, '044')
+            eq_([bank.bank_code for bank in directory.search('acc')], ['044', '50315'])
+            eq_(directory.search('bank'), [])
+            eq_(directory.get('999'), None)
+        eq_(len(queries), 0)
+
+    def test_edits_reload_the_directory(self):
+        eq_(len(banks.directory()), 3)
+        AllBanks.objects.filter(bank_code='057').get().delete()
+        eq_(banks.directory().get('057'), None)
+
+    @override_settings(BANK_DIRECTORY_CHECK_INTERVAL=0)
+    def test_reloads_when_another_process_stamps_a_new_version(self):
+        banks.directory()
+        AllBanks.objects.filter(bank_code='057').update(name='Zenith')
+        eq_(banks.directory().get('057').name, 'Zenith Bank')
+
+        cache.set(banks.VERSION_KEY, uuid.uuid4().hex, None)
+        eq_(banks.directory().get('057').name, 'Zenith')
+
+    def test_load_banks_command(self):
+        banks.directory()
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as source:
+            json.dump([
+                {'name': 'Access Bank', 'code': '044', 'acronym': 'ACCESS'},
+                {'name': 'Zenith Bank International', 'code': '057', 'acronym': 'ZENITH'},
+                {'name': 'Wema Bank', 'code': '035', 'acronym': 'WEMA'},
+            ], source)
+            source.flush()
+            call_command('load_banks', source.name, stdout=StringIO())
+
+        eq_(AllBanks.objects.count(), 4)
+        directory = banks.directory()
+        eq_(directory.get('035').name, 'Wema Bank')
+        eq_(directory.get('057').name, 'Zenith Bank International')
+
+    def test_api(self):
+        response = self.client.get('/api/v1/banks/', {'search': 'zen'})
+        eq_(response.status_code, status.HTTP_200_OK)
+        eq_([bank['bank_code'] for bank in response.data], ['057'])
+        eq_(len(self.client.get('/api/v1/banks/').data), 3)
+
+        response = self.client.get('/api/v1/banks/044/')
+        eq_(response.data['name'], 'Access Bank')
+        eq_(self.client.get('/api/v1/banks/999/').status_code, status.HTTP_404_NOT_FOUND)
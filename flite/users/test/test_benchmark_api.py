@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from nose.tools import eq_, assert_raises
+
+
+class TestBenchmarkApi(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        handle, self.baseline = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        os.remove(self.baseline)
+        self.addCleanup(lambda: os.path.exists(self.baseline) and os.remove(self.baseline))
+
+    def run_benchmark(self, **options):
+        call_command('benchmark_api', requests=3, concurrency=1, scenario=['user_retrieve', 'history'],
+                     baseline=self.baseline, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_saves_and_checks_baseline(self):
+        self.run_benchmark(save_baseline=True)
+        with open(self.baseline) as source:
+            saved = json.load(source)[connection.vendor]
+        eq_(set(saved), {'user_retrieve', 'history'})
+        eq_(saved['history']['errors'], 0)
+
+        self.run_benchmark(threshold=100)
+
+    def test_fails_on_query_regression(self):
+        self.run_benchmark(save_baseline=True)
+        with open(self.baseline) as source:
+            baselines = json.load(source)
+        baselines[connection.vendor]['history']['queries_per_request'] = 0
+        with open(self.baseline, 'w') as target:
+            json.dump(baselines, target)
+
+        with assert_raises(SystemExit):
+            self.run_benchmark(threshold=100)
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from io import StringIO
+from cryptography.fernet import Fernet, InvalidToken
+from django.core.management import call_command
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from nose.tools import eq_, ok_, assert_raises
+from flite.core import outbox
+from flite.core.models import OutboxEvent
+from .factories import UserFactory
+from ..models import ArchivedCard, Card, card_fingerprint
+
+FIELD_KEYS = settings.FIELD_ENCRYPTION_KEYS
+
+
+def card_fields(number='408408******4081', **overrides):
+    return dict({
+        'authorization_code': 'AUTH_x', 'ctype': 'debit', 'cbin': '408408', 'cbrand': 'visa',
+        'country_code': 'NG', 'first_name': 'Ada', 'last_name': 'Obi', 'number': number, 'bank': 'Test Bank',
+        'expiry_month': '12', 'expiry_year': '2030',
+    }, **overrides)
+
+
+class TestCardVault(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+
+    def test_adding_a_card_twice_keeps_one(self):
+        card, created = Card.objects.add(self.user, **card_fields())
+        ok_(created)
+        again, created = Card.objects.add(self.user, **card_fields(authorization_code='AUTH_y'))
+        ok_(not created)
+        eq_(again.pk, card.pk)
+
+        other, created = Card.objects.add(UserFactory(), **card_fields())
+        ok_(created)
+        eq_(other.fingerprint, card.fingerprint)
+        eq_(OutboxEvent.objects.filter(topic=outbox.CARD_ADDED).count(), 2)
+
+    def test_fingerprints_survive_secret_key_rotation(self):
+        fingerprint = card_fingerprint('408408', '408408******4081', '12', '2030')
+        with override_settings(SECRET_KEY='rotated'):
+            eq_(card_fingerprint('408408', '408408******4081', '12', '2030'), fingerprint)
+        with override_settings(CARD_FINGERPRINT_KEY='other'):
+            ok_(card_fingerprint('408408', '408408******4081', '12', '2030') != fingerprint)
+
+    def test_authorization_codes_are_stored_encrypted(self):
+        card, _ = Card.objects.add(self.user, **card_fields())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT authorization_code FROM users_card WHERE id = %s', [card.pk])
+            stored = cursor.fetchone()[0]
+        ok_('AUTH_x' not in stored)
+        eq_(Card.objects.get(pk=card.pk).authorization_code, 'AUTH_x')
+
+        # A new key encrypts, and the old one still decrypts until rows are re-saved
+        with override_settings(FIELD_ENCRYPTION_KEYS=[Fernet.generate_key().decode()] + FIELD_KEYS):
+            card = Card.objects.get(pk=card.pk)
+            eq_(card.authorization_code, 'AUTH_x')
+            card.save()
+        with override_settings(FIELD_ENCRYPTION_KEYS=FIELD_KEYS), assert_raises(InvalidToken):
+            Card.objects.get(pk=card.pk)
+
+    def test_active_fingerprints_are_unique(self):
+        Card.objects.create(owner=self.user, **card_fields())
+        with assert_raises(IntegrityError), transaction.atomic():
+            Card.objects.create(owner=self.user, **card_fields())
+
+    def test_deleted_cards_are_hidden(self):
+        card, _ = Card.objects.add(self.user, **card_fields())
+        card.delete()
+        ok_(card.deleted_on)
+        eq_(list(Card.objects.filter(owner=self.user)), [])
+        eq_(Card.all_objects.get(pk=card.pk).is_deleted, True)
+
+        replacement, created = Card.objects.add(self.user, **card_fields())
+        ok_(created)
+        ok_(replacement.pk != card.pk)
+
+    def test_purge_archives_old_deleted_cards(self):
+        old, recent, active = [Card.objects.add(self.user, **card_fields(number=number))[0]
+                               for number in ('1111', '2222', '3333')]
+        old.delete()
+        recent.delete()
+        Card.all_objects.filter(pk=old.pk).update(deleted_on=timezone.now() - timedelta(days=31))
+
+        call_command('purge_cards', batch_size=1, stdout=StringIO())
+
+        eq_(set(Card.all_objects.values_list('pk', flat=True)), {recent.pk, active.pk})
+        archived = ArchivedCard.objects.get()
+        eq_((archived.pk, str(archived.owner_id), archived.number), (old.pk, str(self.user.pk), '1111'))
+        ok_(not hasattr(archived, 'authorization_code'))
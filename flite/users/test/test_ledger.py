@@ -0,0 +1,62 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from nose.tools import eq_, ok_, assert_raises
+from .factories import UserFactory
+from .. import ledger, summary
+from ..models import Balance, BalanceCheckpoint, LedgerEntry
+from ..transfers import p2p_transfer
+
+
+class TestLedger(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.other = UserFactory()
+        self.balance = Balance.objects.get(owner=self.user)
+
+    def test_deposit_writes_balanced_journal(self):
+        ledger.deposit(self.user, 500, reference='dep-1')
+
+        entries = LedgerEntry.objects.filter(reference='dep-1')
+        eq_(entries.count(), 2)
+        eq_(sum(entry.amount for entry in entries), 0)
+        wallet = entries.get(account=LedgerEntry.WALLET)
+        eq_(wallet.sequence, 1)
+        eq_(wallet.balance_after, 500)
+        eq_(Balance.objects.get(pk=self.balance.pk).ledger_sequence, 1)
+
+    def test_unbalanced_journal_is_rejected(self):
+        with assert_raises(ledger.LedgerError):
+            ledger.post('bad', [(LedgerEntry.WALLET, self.balance, 100)])
+
+    def test_entries_are_append_only(self):
+        ledger.deposit(self.user, 500)
+        entry = LedgerEntry.objects.first()
+        with assert_raises(ValueError):
+            entry.save()
+        with assert_raises(ValueError):
+            entry.delete()
+        with assert_raises(ValueError):
+            LedgerEntry.objects.update(amount=0)
+
+    def test_rebuild_from_checkpoint(self):
+        ledger.deposit(self.user, 500)
+        p2p_transfer(self.user, self.other, 200)
+        ledger.checkpoint(self.balance)
+        p2p_transfer(self.other, self.user, 50)
+
+        eq_(ledger.rebuild_balance(self.balance), (350, 3))
+        eq_(BalanceCheckpoint.objects.get(balance=self.balance).available_balance, 300)
+
+    def test_command_repairs_drifted_balance(self):
+        ledger.deposit(self.user, 500)
+        Balance.objects.filter(pk=self.balance.pk).update(available_balance=1)
+        eq_(summary.get(self.user.pk)['available_balance'], 1)
+
+        call_command('rebuild_balances', str(self.user.pk), '--fix', '--checkpoint', stdout=StringIO())
+
+        balance = Balance.objects.get(pk=self.balance.pk)
+        eq_(balance.available_balance, 500)
+        eq_(summary.get(self.user.pk)['available_balance'], 500)
+        ok_(BalanceCheckpoint.objects.filter(balance=balance, sequence=1, available_balance=500).exists())
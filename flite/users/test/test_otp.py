@@ -0,0 +1,114 @@
+import json
+import re
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from nose.tools import eq_, ok_, assert_raises
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APITestCase
+from flite.core import jobs, sms
+from flite.core.models import Job
+from .. import otp
+from ..models import NewUserPhoneVerification
+
+PHONE = '+2348012345678'
+
+
+class TestOTP(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_code_is_stored_hashed(self):
+        verification, code = otp.issue(PHONE, 'a@example.com')
+        eq_(len(code), otp.CODE_LENGTH)
+        ok_(code not in verification.verification_code)
+        eq_(NewUserPhoneVerification.objects.get().verification_code, otp.hash_code(PHONE, code))
+
+    def test_code_is_consumed_once(self):
+        _, code = otp.issue(PHONE, 'a@example.com')
+        ok_(otp.verify(PHONE, code))
+        ok_(not otp.verify(PHONE, code))
+        ok_(NewUserPhoneVerification.objects.get().is_verified)
+
+    def test_wrong_code_and_reissued_code(self):
+        _, old = otp.issue(PHONE, 'a@example.com')
+        _, new = otp.issue(PHONE, 'a@example.com')
+        eq_(NewUserPhoneVerification.objects.count(), 1)
+        if old != new:
+            ok_(not otp.verify(PHONE, old))
+        ok_(otp.verify(PHONE, new))
+
+    @override_settings(OTP_MAX_ATTEMPTS=2)
+    def test_guesses_are_limited(self):
+        _, code = otp.issue(PHONE, 'a@example.com')
+        wrong = str((int(code) + 1) % 10 ** otp.CODE_LENGTH).zfill(otp.CODE_LENGTH)
+        ok_(not otp.verify(PHONE, wrong))
+        ok_(not otp.verify(PHONE, wrong))
+        ok_(not otp.verify(PHONE, code))
+
+    def test_falls_back_to_database_when_cache_loses_code(self):
+        _, code = otp.issue(PHONE, 'a@example.com')
+        cache.clear()
+        ok_(otp.verify(PHONE, code))
+        ok_(not otp.verify(PHONE, code))
+
+    def test_expired_code_is_rejected(self):
+        _, code = otp.issue(PHONE, 'a@example.com')
+        cache.clear()
+        NewUserPhoneVerification.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        ok_(not otp.verify(PHONE, code))
+
+    @override_settings(OTP_PHONE_LIMIT=2)
+    def test_sends_per_phone_are_limited(self):
+        otp.issue(PHONE, 'a@example.com')
+        otp.issue(PHONE, 'a@example.com')
+        with assert_raises(Throttled):
+            otp.issue(PHONE, 'a@example.com')
+        otp.issue('+2348098765432', 'b@example.com')
+
+    @override_settings(OTP_IP_LIMIT=1)
+    def test_sends_per_ip_are_limited(self):
+        otp.issue(PHONE, 'a@example.com', ip='10.0.0.1')
+        with assert_raises(Throttled):
+            otp.issue('+2348098765432', 'b@example.com', ip='10.0.0.1')
+
+
+class TestPhoneVerificationEndpoint(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_send_and_verify(self):
+        response = self.client.post(reverse('newuserphoneverification-list'),
+                                    {'phone_number': PHONE, 'email': 'a@example.com'})
+        eq_(response.status_code, status.HTTP_201_CREATED)
+        eq_(set(response.data), {'id'})
+        url = reverse('newuserphoneverification-detail', kwargs={'pk': response.data['id']})
+        # The queued job refers to the verification and doesn't carry the code
+        eq_(json.loads(Job.objects.get(queue='sms').payload)['kwargs'],
+            {'phone_number': PHONE, 'verification_id': str(response.data['id'])})
+
+        sms.outbox = []
+        with override_settings(SMS_BACKEND='flite.core.sms.backends.LocmemBackend'):
+            jobs.run_pending('sms')
+        eq_(len(sms.outbox), 1)
+        code = re.search(r'\d{%d}' % otp.CODE_LENGTH, sms.outbox[0]['body']).group()
+
+        response = self.client.put(url, {'code': '-1'})
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(url, {'code': code})
+        eq_(response.status_code, status.HTTP_200_OK)
+        eq_(response.data['verification_code_status'], '1')
+
+    @override_settings(OTP_PHONE_LIMIT=1)
+    def test_too_many_sends(self):
+        data = {'phone_number': PHONE, 'email': 'a@example.com'}
+        self.client.post(reverse('newuserphoneverification-list'), data)
+        response = self.client.post(reverse('newuserphoneverification-list'), data)
+        eq_(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
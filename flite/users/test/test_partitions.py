@@ -0,0 +1,100 @@
+import gzip
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from nose.tools import eq_, ok_
+from .factories import UserFactory
+from .. import partitions
+from ..models import ArchivedTotal, Transaction, TransactionArchive
+
+
+@skipUnless(connection.vendor == 'postgresql', "Partitions the table on PostgreSQL")
+class TestPartitions(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        self.user = UserFactory()
+        self.now = timezone.now()
+        self.this_month = partitions.month_start(self.now)
+        long_ago = self.this_month - timedelta(days=400)
+        for amount in (500, -200):
+            self.transaction(amount, long_ago)
+        self.transaction(300, self.now)
+
+    def transaction(self, amount, created):
+        return Transaction.objects.create(
+            owner=self.user, kind=Transaction.DEPOSIT, reference='ref', status=Transaction.SUCCESS,
+            amount=amount, new_balance=0, created=created)
+
+    def archive(self, **kwargs):
+        # Tests run in one transaction, and a partition can't be detached with foreign key checks pending
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        return partitions.archive(**kwargs)
+
+    def test_months_ahead_are_created(self):
+        ok_(partitions.is_partitioned())
+        starts = {partition.start for partition in partitions.partitions()}
+        ok_(self.this_month in starts)
+        ok_(partitions.add_months(self.this_month, 3) in starts)
+
+        created = partitions.ensure_partitions(ahead=5)
+        eq_(created, [partitions.partition_name(partitions.add_months(self.this_month, count))
+                      for count in (4, 5)])
+        eq_(partitions.ensure_partitions(ahead=5), [])
+
+        in_five_months = self.transaction(100, partitions.add_months(self.this_month, 5))
+        eq_(Transaction.objects.get(pk=in_five_months.pk, created=in_five_months.created).amount, 100)
+
+    def test_servers_before_postgresql_12_are_left_unpartitioned(self):
+        with mock.patch.object(connection, 'pg_version', 110000):
+            ok_(not partitions.is_partitioned())
+            eq_(partitions.ensure_partitions(ahead=5), [])
+
+    def test_old_partitions_are_archived_with_their_sums(self):
+        archived = self.archive(months=0)
+
+        eq_(len(archived), 1)
+        archive = TransactionArchive.objects.get()
+        eq_(archive.status, TransactionArchive.ARCHIVED)
+        eq_(archive.rows, 2)
+        ok_(archive.start is None)
+        eq_(archive.end, self.this_month)
+        ok_(archive.partition not in {partition.name for partition in partitions.partitions()})
+
+        eq_(list(Transaction.objects.filter(owner=self.user).values_list('amount', flat=True)), [300])
+        total = ArchivedTotal.objects.get(owner=self.user)
+        eq_((total.amount, total.transactions), (300, 2))
+
+        with partitions.storage().open(archive.file) as stored:
+            lines = gzip.decompress(stored.read()).decode().splitlines()
+        ok_(lines[0].startswith('id,created'))
+        eq_(len(lines), 3)
+
+    def test_detached_partitions_are_finished_by_the_next_run(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        partitions.detach(partitions.partitions()[0])
+        eq_(TransactionArchive.objects.get().status, TransactionArchive.DETACHED)
+
+        eq_(len(self.archive(months=24)), 1)
+        eq_(TransactionArchive.objects.get().status, TransactionArchive.ARCHIVED)
+        eq_(ArchivedTotal.objects.get(owner=self.user).amount, 300)
+
+    def test_archive_transactions_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        out = StringIO()
+        call_command('archive_transactions', months=0, stdout=out)
+        ok_('Archived 2 transactions' in out.getvalue())
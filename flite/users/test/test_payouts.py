@@ -0,0 +1,116 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from nose.tools import eq_, ok_
+from .factories import UserFactory
+from .. import ledger, payouts
+from ..models import AllBanks, Balance, Bank, BankTransfer, Transaction
+from ..transfers import bank_transfer
+
+calls = []
+
+
+class RecordingGateway(payouts.LocalGateway):
+    max_batch_size = 2
+
+    def submit(self, bank_code, items):
+        calls.append((bank_code, [item['reference'] for item in items]))
+        return super().submit(bank_code, items)
+
+
+class BrokenGateway(payouts.BaseGateway):
+
+    def submit(self, bank_code, items):
+        raise ConnectionError("Gateway unavailable")
+
+
+@override_settings(PAYOUT_GATEWAY='flite.users.test.test_payouts.RecordingGateway', PAYOUT_LOCAL_LATENCY=0)
+class TestPayouts(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.access = AllBanks.objects.create(name='Access Bank', acronym='ACCESS', bank_code='044')
+        self.zenith = AllBanks.objects.create(name='Zenith Bank', acronym='ZENITH', bank_code='057')
+        self.user = UserFactory()
+        ledger.deposit(self.user, 10000)
+
+    def transfer(self, bank, account_number='0123456789', amount=100):
+        account = Bank.objects.create(owner=self.user, bank=bank, account_name='Ada Obi',
+                                      account_number=account_number, account_type='savings')
+        return bank_transfer(self.user, account, amount)
+
+    def available_balance(self):
+        return Balance.objects.get(owner=self.user).available_balance
+
+    def test_batches_by_bank_and_settles_in_bulk(self):
+        transfers = [self.transfer(self.access) for _ in range(3)] + [self.transfer(self.zenith)]
+        eq_(self.available_balance(), 9600)
+
+        report = payouts.run()
+
+        eq_((report['claimed'], report['batches'], report['settled'], report['failed']), (4, 3, 4, 0))
+        eq_(sorted((bank_code, len(references)) for bank_code, references in calls),
+            [('044', 1), ('044', 2), ('057', 1)])
+        statuses = BankTransfer.objects.filter(
+            pk__in=[transfer.pk for transfer in transfers]).values_list('status', flat=True)
+        eq_(set(statuses), {Transaction.SUCCESS})
+        eq_(self.available_balance(), 9600)
+        eq_(payouts.run()['claimed'], 0)
+
+    def test_failed_payouts_are_credited_back(self):
+        failing = self.transfer(self.access, account_number='1234567000', amount=300)
+        self.transfer(self.access)
+
+        eq_(payouts.run()['failed'], 1)
+
+        failing.refresh_from_db()
+        eq_(failing.status, Transaction.FAILED)
+        reversal = BankTransfer.objects.get(reference=f'{failing.reference}-reversal')
+        eq_(reversal.amount, 300)
+        eq_(self.available_balance(), 9900)
+        eq_(reversal.new_balance, 9900)
+
+    def test_failed_payouts_without_a_balance_are_mismatched(self):
+        failing = self.transfer(self.access, account_number='1234567000', amount=300)
+        Balance.objects.filter(owner=self.user).update(active=False)
+
+        report = payouts.run()
+
+        eq_((report['failed'], report['mismatched']), (0, 1))
+        eq_(BankTransfer.objects.get(pk=failing.pk).status, Transaction.PROCESSING)
+        ok_(not BankTransfer.objects.filter(reference=f'{failing.reference}-reversal').exists())
+
+    @override_settings(PAYOUT_GATEWAY='flite.users.test.test_payouts.BrokenGateway')
+    def test_gateway_errors_leave_the_batch_processing(self):
+        transfer = self.transfer(self.access)
+        report = payouts.run()
+        eq_((report['settled'], report['failed']), (0, 0))
+        eq_(BankTransfer.objects.get(pk=transfer.pk).status, Transaction.PROCESSING)
+        eq_(self.available_balance(), 9900)
+        ok_(not BankTransfer.objects.filter(reference=f'{transfer.reference}-reversal').exists())
+
+    def test_queries_do_not_grow_with_payouts(self):
+        for _ in range(3):
+            self.transfer(self.access)
+        with CaptureQueriesContext(connection) as few:
+            payouts.run()
+        for _ in range(12):
+            self.transfer(self.zenith)
+        with CaptureQueriesContext(connection) as many:
+            payouts.run()
+        eq_(len(many), len(few))
+
+    @override_settings(PAYOUT_LOCK_TIMEOUT=0)
+    def test_abandoned_payouts_are_reclaimed(self):
+        transfer = self.transfer(self.access)
+        payouts.claim(10)
+        eq_(BankTransfer.objects.get(pk=transfer.pk).status, Transaction.PROCESSING)
+        eq_(payouts.run()['settled'], 1)
+
+    def test_run_payouts_command(self):
+        self.transfer(self.access)
+        out = StringIO()
+        call_command('run_payouts', stdout=out)
+        ok_('1 settled' in out.getvalue())
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from nose.tools import eq_, ok_, assert_raises
+from rest_framework.authtoken.models import Token
+from flite.core import outbox
+from flite.core.models import OutboxEvent
+from .. import provisioning
+from ..models import User, UserProfile, Balance
+
+
+class TestProvisionUsers(TestCase):
+
+    def write(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as target:
+            target.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_matches_signal_path(self):
+        rows = [{'username': f'partner{i}', 'email': f'p{i}@example.com', 'password': 'secret-pass'}
+                for i in range(5)]
+        eq_(provisioning.provision_users(rows, batch_size=2, workers=0), 5)
+
+        signal_user = User.objects.create_user(username='signal', password='secret-pass')
+        users = User.objects.filter(username__startswith='partner')
+        eq_(users.count(), 5)
+        for user in list(users) + [signal_user]:
+            ok_(user.check_password('secret-pass'))
+            eq_(Token.objects.filter(user=user).count(), 1)
+            ok_(UserProfile.objects.get(user=user).referral_code)
+            balance = Balance.objects.get(owner=user)
+            eq_((balance.available_balance, balance.book_balance, balance.ledger_sequence), (0, 0, 0))
+            eq_(OutboxEvent.objects.filter(topic=outbox.USER_CREATED, aggregate_id=str(user.pk)).count(), 1)
+
+    def test_hashes_in_worker_processes(self):
+        # Workers are forked from a process that has already started its hashing pool
+        User.objects.create_user(username='parent', password='secret-pass')
+        rows = [{'username': f'worker{i}', 'password': f'pass-{i}'} for i in range(4)]
+        eq_(provisioning.provision_users(rows, workers=2), 4)
+        for i, user in enumerate(User.objects.filter(username__startswith='worker').order_by('username')):
+            ok_(user.check_password(f'pass-{i}'))
+
+    def test_missing_password_is_unusable(self):
+        provisioning.provision_users([{'username': 'nopass'}], workers=0)
+        ok_(not User.objects.get(username='nopass').has_usable_password())
+
+    def test_command_reads_csv_and_jsonl(self):
+        csv_path = self.write('.csv', 'username,email,password\ncsv1,c1@example.com,pw1\ncsv2,,pw2\n')
+        jsonl_path = self.write('.jsonl', json.dumps({'username': 'json1', 'password': 'pw'}) + '\n')
+
+        call_command('provision_users', csv_path, workers=0, stdout=StringIO())
+        call_command('provision_users', jsonl_path, workers=0, stdout=StringIO())
+        eq_(set(User.objects.values_list('username', flat=True)), {'csv1', 'csv2', 'json1'})
+
+    def test_failed_chunk_is_rolled_back(self):
+        User.objects.create_user(username='taken')
+        path = self.write('.jsonl', '\n'.join(
+            json.dumps({'username': name}) for name in ['fresh1', 'fresh2', 'taken', 'fresh3']))
+
+        with assert_raises(CommandError):
+            call_command('provision_users', path, batch_size=2, workers=0, stdout=StringIO())
+        eq_(set(User.objects.values_list('username', flat=True)), {'taken', 'fresh1', 'fresh2'})
+
+        call_command('provision_users', path, batch_size=2, workers=0, skip=3, stdout=StringIO())
+        ok_(User.objects.filter(username='fresh3').exists())
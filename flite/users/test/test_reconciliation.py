@@ -0,0 +1,110 @@
+import csv
+import os
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from nose.tools import eq_, ok_
+from .factories import UserFactory
+from .. import ledger, reconciliation
+from ..models import ArchivedTotal, Balance, Discrepancy, ReconciliationChunk, Transaction
+from ..transfers import p2p_transfer
+
+
+def make_accounts(count):
+    users = [UserFactory() for _ in range(count)]
+    for user in users:
+        ledger.deposit(user, 1000)
+    p2p_transfer(users[0], users[1], 300)
+    return users
+
+
+class TestReconciliation(TestCase):
+
+    def setUp(self):
+        self.users = make_accounts(5)
+
+    def test_matching_balances_have_no_discrepancies(self):
+        run = reconciliation.start(chunk_size=2)
+        eq_(run.chunks, 3)
+
+        reconciliation.run(run, processes=1)
+
+        eq_((run.accounts, run.discrepancies), (5, 0))
+        ok_(run.finished is not None)
+
+    def test_records_discrepancies(self):
+        drifted, orphaned = self.users[1], self.users[3]
+        Balance.objects.filter(owner=drifted).update(available_balance=F('available_balance') + 1)
+        Balance.objects.filter(owner=orphaned).update(active=False)
+
+        run = reconciliation.run(reconciliation.start(chunk_size=2), processes=1)
+
+        eq_(run.discrepancies, 2)
+        found = {str(row.owner_id): row for row in Discrepancy.objects.filter(run=run)}
+        drift, orphan = found[str(drifted.pk)], found[str(orphaned.pk)]
+        eq_((drift.available_balance, drift.transaction_total, drift.difference), (1301, 1300, 1))
+        eq_((orphan.available_balance, orphan.transaction_total), (None, 1000))
+
+    def test_archived_transactions_count(self):
+        user = self.users[2]
+        Transaction.objects.filter(owner=user).delete()
+        ArchivedTotal.objects.create(owner=user, amount=1000, transactions=1)
+
+        eq_(reconciliation.run(reconciliation.start(), processes=1).discrepancies, 0)
+
+    def test_queries_do_not_grow_with_chunk_size(self):
+        run = reconciliation.start(chunk_size=100)
+        chunk = run.chunk_set.get()
+        with CaptureQueriesContext(connection) as queries:
+            reconciliation.check(chunk)
+        ok_(len(queries) <= 8, len(queries))
+
+    def test_resumes_at_the_first_chunk_not_done(self):
+        run = reconciliation.start(chunk_size=2)
+        reconciliation.check(run.chunk_set.get(number=0))
+
+        with mock.patch.object(reconciliation, 'check', wraps=reconciliation.check) as check:
+            reconciliation.run(run, processes=1)
+
+        eq_(sorted(call[0][0].number for call in check.call_args_list), [1, 2])
+        eq_(run.accounts, 5)
+
+    def test_reconcile_balances_command(self):
+        Balance.objects.filter(owner=self.users[0]).update(available_balance=0)
+        report = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        report.close()
+        self.addCleanup(os.remove, report.name)
+
+        out = StringIO()
+        call_command('reconcile_balances', processes=1, chunk_size=2, report=report.name, stdout=out)
+
+        ok_('5 balances checked' in out.getvalue())
+        ok_('1 discrepancies' in out.getvalue())
+        with open(report.name, newline='') as source:
+            rows = list(csv.DictReader(source))
+        eq_([(row['owner_id'], row['difference']) for row in rows], [(str(self.users[0].pk), '-700')])
+
+    def test_command_resumes_an_unfinished_run(self):
+        run = reconciliation.start(chunk_size=2)
+        out = StringIO()
+        call_command('reconcile_balances', processes=1, stdout=out)
+        ok_(f'Resuming run {run.pk} at 0 of 3 chunks' in out.getvalue())
+        eq_(ReconciliationChunk.objects.filter(run=run, done=False).count(), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Worker processes need a database they can share")
+class TestReconciliationProcesses(TransactionTestCase):
+
+    def test_chunks_run_in_worker_processes(self):
+        users = make_accounts(6)
+        Balance.objects.filter(owner=users[4]).update(available_balance=5)
+
+        run = reconciliation.run(reconciliation.start(chunk_size=2), processes=2)
+
+        eq_((run.accounts, run.discrepancies), (6, 1))
+        eq_(str(Discrepancy.objects.get(run=run).owner_id), str(users[4].pk))
@@ -0,0 +1,48 @@
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from nose.tools import eq_, ok_, assert_raises
+from .factories import UserFactory
+from ..models import User, UserProfile
+
+
+class TestReferralCode(TestCase):
+
+    def test_profile_gets_a_code_on_signup(self):
+        user = UserFactory()
+        ok_(UserProfile.objects.get(user=user).referral_code)
+
+    def test_collision_is_retried_with_a_new_code(self):
+        taken = UserProfile.objects.get(user=UserFactory()).referral_code
+        user = UserFactory()
+        UserProfile.objects.filter(user=user).delete()
+
+        codes = iter([taken, 'fresh123'])
+        with mock.patch.object(UserProfile, 'generate_new_referal_code', side_effect=lambda: next(codes)):
+            profile = UserProfile.objects.create(user=user)
+        eq_(profile.referral_code, 'fresh123')
+
+    def test_gives_up_after_repeated_collisions(self):
+        taken = UserProfile.objects.get(user=UserFactory()).referral_code
+        user = UserFactory()
+        UserProfile.objects.filter(user=user).delete()
+
+        with mock.patch.object(UserProfile, 'generate_new_referal_code', return_value=taken):
+            with assert_raises(IntegrityError):
+                UserProfile.objects.create(user=user)
+
+
+class TestBackfillReferralCodes(TestCase):
+
+    def test_creates_missing_profiles(self):
+        users = [UserFactory() for _ in range(5)]
+        UserProfile.objects.filter(user__in=users[:3]).delete()
+
+        call_command('backfill_referral_codes', batch_size=2, stdout=StringIO())
+
+        eq_(UserProfile.objects.filter(user__in=users).count(), 5)
+        codes = UserProfile.objects.values_list('referral_code', flat=True)
+        eq_(len(set(codes)), User.objects.count())
+        ok_(all(codes))
@@ -0,0 +1,121 @@
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from nose.tools import eq_, ok_
+from rest_framework import status
+from rest_framework.test import APITestCase
+from flite.core import jobs
+from .. import statements
+from ..models import Statement, Transaction
+from .factories import UserFactory
+
+
+class TestStatements(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings = override_settings(MEDIA_ROOT=self.media_root, STATEMENT_CHUNK_SIZE=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        self.user = UserFactory()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.url = reverse('transaction-statement')
+        self.today = timezone.localdate()
+        now = timezone.now()
+        for offset in range(5):
+            Transaction.objects.create(
+                owner=self.user, kind=Transaction.DEPOSIT, reference=f'ref-{offset}',
+                status=Transaction.SUCCESS, amount=100, new_balance=100 * (5 - offset),
+                created=now - timedelta(days=offset))
+        Transaction.objects.create(owner=UserFactory(), kind=Transaction.DEPOSIT, status=Transaction.SUCCESS)
+
+    def get(self, **params):
+        params.setdefault('start', self.today - timedelta(days=10))
+        params.setdefault('end', self.today)
+        return self.client.get(self.url, params)
+
+    def test_streams_csv_oldest_first(self):
+        response = self.get()
+        eq_(response.status_code, status.HTTP_200_OK)
+        ok_(response.streaming)
+        eq_(response['Content-Type'], 'text/csv')
+        ok_(response['Content-Disposition'].startswith('attachment; filename="statement-'))
+
+        lines = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        eq_(lines[0], list(statements.COLUMNS))
+        eq_([line[3] for line in lines[1:]], [f'ref-{offset}' for offset in range(4, -1, -1)])
+        eq_(lines[-1][6], '500')
+
+    def test_streams_ndjson(self):
+        response = self.get(output='ndjson')
+        eq_(response.status_code, status.HTTP_200_OK)
+        eq_(response['Content-Type'], 'application/x-ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        eq_(len(rows), 5)
+        eq_(rows[0]['reference'], 'ref-4')
+        eq_(rows[0]['amount'], 100)
+
+    def test_date_range_is_inclusive(self):
+        response = self.get(start=self.today - timedelta(days=1), end=self.today - timedelta(days=1))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        eq_(len(lines), 2)
+        ok_('ref-1' in lines[1])
+
+    def test_rows_are_written_a_chunk_at_a_time(self):
+        chunks = list(statements.render(Statement.CSV, statements.rows(
+            self.user.pk, self.today - timedelta(days=10), self.today)))
+        eq_(len(chunks), 3)
+
+    def test_rejects_backwards_range(self):
+        response = self.get(start=self.today, end=self.today - timedelta(days=1))
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(STATEMENT_STREAM_MAX_DAYS=7)
+    def test_long_ranges_are_built_in_the_background(self):
+        response = self.get(output='ndjson')
+        eq_(response.status_code, status.HTTP_202_ACCEPTED)
+        eq_(response.data['status'], Statement.PENDING)
+        eq_(response.data['url'], None)
+        # Asking again doesn't queue another
+        eq_(self.get(output='ndjson').data['id'], response.data['id'])
+
+        eq_(jobs.run_pending('statements'), 1)
+        statement = Statement.objects.get(pk=response.data['id'])
+        eq_(statement.status, Statement.READY)
+        eq_(statement.rows, 5)
+        with statements.storage().open(statement.file) as stored:
+            lines = gzip.decompress(stored.read()).decode().splitlines()
+        eq_([json.loads(line)['reference'] for line in lines],
+            [f'ref-{offset}' for offset in range(4, -1, -1)])
+
+        detail = self.client.get(reverse('statement-detail', args=[statement.pk]))
+        eq_(detail.data['status'], Statement.READY)
+        ok_(detail.data['url'].endswith('.ndjson.gz'))
+
+    @override_settings(STATEMENT_STREAM_MAX_DAYS=7)
+    def test_statements_built_before_the_range_ended_are_rebuilt(self):
+        built_today = self.get().data['id']
+        jobs.run_pending('statements')
+        ok_(self.get().data['id'] != built_today)
+
+        past = {'start': self.today - timedelta(days=10), 'end': self.today - timedelta(days=1)}
+        built_after = self.get(**past).data['id']
+        jobs.run_pending('statements')
+        eq_(self.get(**past).data['id'], built_after)
+
+    @override_settings(STATEMENT_STREAM_MAX_DAYS=7)
+    def test_statements_are_private(self):
+        statement_id = self.get().data['id']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {UserFactory().auth_token}')
+        response = self.client.get(reverse('statement-detail', args=[statement_id]))
+        eq_(response.status_code, status.HTTP_404_NOT_FOUND)
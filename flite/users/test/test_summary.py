@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from nose.tools import eq_, ok_
+from rest_framework import status
+from rest_framework.test import APITestCase
+from flite.core.authentication import token_cache
+from .factories import UserFactory
+from .. import ledger
+from ..models import AllBanks, Bank, Card
+from ..transfers import p2p_transfer
+
+
+class TestUserSummary(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = UserFactory()
+        self.url = reverse('user-summary', kwargs={'pk': self.user.pk})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+
+    def test_cached_summary_needs_no_queries(self):
+        ledger.deposit(self.user, 500)
+        response = self.client.get(self.url)
+        eq_(response.status_code, status.HTTP_200_OK)
+        eq_(response.data['available_balance'], 500)
+        eq_(len(response.data['recent_transactions']), 1)
+        ok_(response.data['referral_code'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        eq_(response.status_code, status.HTTP_200_OK)
+        # Only the database cache table, which memcached or Redis would replace
+        eq_([query['sql'] for query in queries if 'flite_cache' not in query['sql']], [])
+
+    def test_changes_invalidate_summary(self):
+        self.client.get(self.url)
+
+        ledger.deposit(self.user, 500)
+        p2p_transfer(self.user, UserFactory(), 200)
+        bank = AllBanks.objects.create(name='Bank', acronym='B', bank_code='001')
+        Bank.objects.create(
+            owner=self.user, bank=bank, account_name='A', account_number='1', account_type='s')
+        Card.objects.create(owner=self.user, authorization_code='x', ctype='debit', cbin='4', cbrand='visa',
+                            country_code='NG', first_name='A', last_name='B', number='4111', bank='B',
+                            expiry_month='01', expiry_year='30')
+
+        response = self.client.get(self.url)
+        eq_(response.data['available_balance'], 300)
+        eq_(len(response.data['recent_transactions']), 2)
+        eq_(response.data['banks'], 1)
+        eq_(response.data['cards'], 1)
+
+    def test_only_owner_can_read(self):
+        other = UserFactory()
+        response = self.client.get(reverse('user-summary', kwargs={'pk': other.pk}))
+        eq_(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,78 @@
+from datetime import timedelta
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from nose.tools import ok_, eq_
+from rest_framework.test import APITestCase
+from rest_framework import status
+from flite.core.pagination import KeysetPagination
+from ..models import Transaction
+from .factories import UserFactory
+
+
+class TestTransactionListTestCase(APITestCase):
+    """
+    Tests /transactions list operations.
+    """
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.url = reverse('transaction-list')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token}')
+        self.now = timezone.now()
+        # Two rows share a timestamp so the id tie-break is exercised
+        offsets = [0, 1, 1, 2, 3, 4, 5]
+        kinds = [Transaction.DEPOSIT, Transaction.P2P] * 4
+        for offset, kind in zip(offsets, kinds):
+            Transaction.objects.create(
+                owner=self.user, kind=kind, reference=f'ref-{offset}', status=Transaction.SUCCESS,
+                amount=100, new_balance=100, created=self.now - timedelta(days=offset))
+        Transaction.objects.create(owner=UserFactory(), kind=Transaction.DEPOSIT, status=Transaction.SUCCESS)
+
+    def test_lists_own_transactions_newest_first(self):
+        response = self.client.get(self.url)
+        eq_(response.status_code, status.HTTP_200_OK)
+
+        created = [row['created'] for row in response.data['results']]
+        eq_(len(created), 7)
+        eq_(created, sorted(created, reverse=True))
+        eq_(response.data['next'], None)
+
+    def test_cursor_walks_every_row_once(self):
+        seen = []
+        url = self.url
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            while url:
+                response = self.client.get(url)
+                eq_(response.status_code, status.HTTP_200_OK)
+                ok_(len(response.data['results']) <= 2)
+                seen.extend(row['id'] for row in response.data['results'])
+                url = response.data['next']
+
+        eq_(len(seen), 7)
+        eq_(len(set(seen)), 7)
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        eq_(response.status_code, status.HTTP_200_OK)
+        ok_(not any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+
+    def test_filters_by_type_and_date_range(self):
+        response = self.client.get(self.url, {'type': Transaction.P2P})
+        eq_({row['type'] for row in response.data['results']}, {Transaction.P2P})
+
+        since = self.now - timedelta(days=1, hours=1)
+        response = self.client.get(self.url, {'created_after': since.isoformat()})
+        eq_(len(response.data['results']), 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        eq_(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        response = self.client.get(self.url)
+        ok_(response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from nose.tools import eq_, ok_, assert_raises
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from flite.core import outbox
+from flite.core.models import IdempotencyKey, OutboxEvent
+from flite.core.money import Money
+from .factories import UserFactory
+from .. import ledger
+from ..models import Balance, BankTransfer, P2PTransfer, Transaction
+from ..transfers import p2p_transfer, TransferError, InsufficientFunds
+
+
+def fund(user, amount):
+    ledger.deposit(user, amount)
+
+
+class TestP2PTransfer(TestCase):
+
+    def setUp(self):
+        self.sender = UserFactory()
+        self.recipient = UserFactory()
+        fund(self.sender, 500)
+
+    def test_transfer_moves_funds(self):
+        p2p_transfer(self.sender, self.recipient, 200)
+
+        sender_balance = Balance.objects.get(owner=self.sender)
+        recipient_balance = Balance.objects.get(owner=self.recipient)
+        eq_(sender_balance.available_balance, 300)
+        eq_(sender_balance.book_balance, 300)
+        eq_(recipient_balance.available_balance, 200)
+        eq_(recipient_balance.book_balance, 200)
+
+    def test_transfer_records_both_sides_with_new_balance(self):
+        debit, credit = p2p_transfer(self.sender, self.recipient, 200, reference='ref-1')
+
+        eq_(debit.owner, self.sender)
+        eq_(debit.amount, -200)
+        eq_(debit.new_balance, 300)
+        eq_(credit.owner, self.recipient)
+        eq_(credit.amount, 200)
+        eq_(credit.new_balance, 200)
+        eq_(P2PTransfer.objects.filter(reference='ref-1').count(), 2)
+
+    def test_transfers_live_in_the_transaction_table(self):
+        debit, credit = p2p_transfer(self.sender, self.recipient, 200)
+
+        eq_(Transaction.objects.get(pk=debit.pk).kind, Transaction.P2P)
+        eq_(Transaction.objects.filter(owner=self.sender).count(), 2)
+        eq_(P2PTransfer.objects.count(), 2)
+        ok_(not BankTransfer.objects.exists())
+
+    def test_insufficient_funds_leaves_balances_untouched(self):
+        with assert_raises(InsufficientFunds):
+            p2p_transfer(self.sender, self.recipient, 501)
+
+        eq_(Balance.objects.get(owner=self.sender).available_balance, 500)
+        eq_(Balance.objects.get(owner=self.recipient).available_balance, 0)
+        eq_(P2PTransfer.objects.count(), 0)
+        eq_(OutboxEvent.objects.filter(topic=outbox.TRANSFER_POSTED).count(), 0)
+
+    def test_transfer_publishes_event(self):
+        debit, _ = p2p_transfer(self.sender, self.recipient, 200)
+        event = OutboxEvent.objects.get(topic=outbox.TRANSFER_POSTED)
+        eq_(event.aggregate_id, debit.reference)
+
+    def test_totals_aggregate_exactly_in_kobo(self):
+        for _ in range(10):
+            p2p_transfer(self.sender, self.recipient, Money.from_naira('0.1'))
+
+        total = P2PTransfer.objects.filter(owner=self.recipient).aggregate(total=Sum('amount'))['total']
+        ok_(isinstance(total, Money))
+        eq_(total, Money.from_naira('1.00'))
+
+    def test_invalid_transfers_are_rejected(self):
+        with assert_raises(TransferError):
+            p2p_transfer(self.sender, self.sender, 10)
+        with assert_raises(TransferError):
+            p2p_transfer(self.sender, self.recipient, 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Row locks require PostgreSQL")
+class TestConcurrentP2PTransfer(TransactionTestCase):
+
+    def test_concurrent_transfers_do_not_lose_updates(self):
+        first, second = UserFactory(), UserFactory()
+        fund(first, 1000)
+        fund(second, 1000)
+
+        def transfer(index):
+            try:
+                if index % 2:
+                    p2p_transfer(first, second, 1)
+                else:
+                    p2p_transfer(second, first, 3)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(transfer, range(200)))
+
+        eq_(Balance.objects.get(owner=first).available_balance, 1000 - 100 + 300)
+        eq_(Balance.objects.get(owner=second).available_balance, 1000 + 100 - 300)
+
+
+class TestP2PTransferEndpoint(APITestCase):
+    """
+    Tests /transfers create operations.
+    """
+
+    def setUp(self):
+        self.sender = UserFactory()
+        self.recipient = UserFactory()
+        fund(self.sender, 500)
+        self.url = reverse('transfer-list')
+        self.payload = {'recipient': str(self.recipient.pk), 'amount': 200}
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.sender.auth_token}')
+
+    def test_post_request_moves_funds(self):
+        response = self.client.post(self.url, self.payload)
+        eq_(response.status_code, status.HTTP_201_CREATED)
+        eq_(response.data['amount'], -200)
+        eq_(response.data['new_balance'], 300)
+
+    def test_insufficient_funds(self):
+        response = self.client.post(self.url, dict(self.payload, amount=501))
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retry_with_same_idempotency_key_is_replayed(self):
+        first = self.client.post(self.url, self.payload, HTTP_IDEMPOTENCY_KEY='key-1')
+        second = self.client.post(self.url, self.payload, HTTP_IDEMPOTENCY_KEY='key-1')
+
+        eq_(first.status_code, status.HTTP_201_CREATED)
+        eq_(second.status_code, status.HTTP_201_CREATED)
+        eq_(second['Idempotent-Replayed'], 'true')
+        eq_(second.data['id'], str(first.data['id']))
+        eq_(Balance.objects.get(owner=self.sender).available_balance, 300)
+
+    def test_reused_key_with_different_payload_is_rejected(self):
+        self.client.post(self.url, self.payload, HTTP_IDEMPOTENCY_KEY='key-1')
+        response = self.client.post(self.url, dict(self.payload, amount=100), HTTP_IDEMPOTENCY_KEY='key-1')
+        eq_(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_failed_request_does_not_burn_the_key(self):
+        response = self.client.post(self.url, dict(self.payload, amount=501), HTTP_IDEMPOTENCY_KEY='key-1')
+        eq_(response.status_code, status.HTTP_400_BAD_REQUEST)
+        ok_(not IdempotencyKey.objects.exists())
+
+    def test_expired_keys_are_purged(self):
+        self.client.post(self.url, self.payload, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.client.post(self.url, self.payload, HTTP_IDEMPOTENCY_KEY='key-2')
+        IdempotencyKey.objects.filter(key='key-1').update(expires=timezone.now())
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        eq_(list(IdempotencyKey.objects.values_list('key', flat=True)), ['key-2'])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Blocking on the key row requires PostgreSQL")
+class TestConcurrentIdempotentTransfer(TransactionTestCase):
+
+    def test_concurrent_duplicates_execute_once(self):
+        sender, recipient = UserFactory(), UserFactory()
+        fund(sender, 500)
+
+        def post(_):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {sender.auth_token}')
+            try:
+                return client.post(reverse('transfer-list'), {'recipient': str(recipient.pk), 'amount': 100},
+                                   HTTP_IDEMPOTENCY_KEY='same-key').status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            codes = list(pool.map(post, range(5)))
+
+        eq_(codes, [status.HTTP_201_CREATED] * 5)
+        eq_(Balance.objects.get(owner=sender).available_balance, 400)
@@ -0,0 +1,95 @@
+import uuid
+from django.db import transaction
+from flite.core import outbox
+from flite.core.money import Money
+from flite.users import ledger, models
+
+
+class TransferError(Exception):
+    """
+    Raised when a transfer cannot be carried out
+    """
+
+
+class InsufficientFunds(TransferError):
+    """
+    Raised when the sender's available balance does not cover the transfer
+    """
+
+
+def p2p_transfer(sender, recipient, amount, reference=None):
+    """
+    Moves ``amount`` kobo from ``sender`` to ``recipient`` in a single database transaction.
+
+    Both balances are row locked before they are read, and the debit and credit are
+    posted to the ledger, which applies them with ``F()`` expressions so the arithmetic
+    happens inside the database. A P2PTransfer row is recorded for each side of the
+    transfer: the sender's row carries the negative amount, the recipient's the positive
+    amount, and each holds the owner's balance after the transfer in ``new_balance``.
+
+    Returns a ``(debit, credit)`` tuple of the created P2PTransfer rows.
+    """
+    amount = Money(amount)
+    if amount <= 0:
+        raise TransferError("Transfer amount must be greater than zero")
+    if str(sender.pk) == str(recipient.pk):
+        raise TransferError("Cannot transfer to the same account")
+
+    reference = reference or uuid.uuid4().hex
+
+    with transaction.atomic():
+        balances = ledger.lock_balances(sender.pk, recipient.pk)
+        sender_balance = balances.get(str(sender.pk))
+        recipient_balance = balances.get(str(recipient.pk))
+        if sender_balance is None or recipient_balance is None:
+            raise TransferError("Both users must have an active balance")
+
+        if sender_balance.available_balance < amount:
+            raise InsufficientFunds("Insufficient funds")
+
+        ledger.post(reference, [
+            (models.LedgerEntry.WALLET, sender_balance, -amount),
+            (models.LedgerEntry.WALLET, recipient_balance, amount),
+        ])
+
+        debit = models.P2PTransfer.objects.create(
+            owner=sender, sender=sender, receipient=recipient,
+            reference=reference, status=models.Transaction.SUCCESS,
+            amount=-amount, new_balance=sender_balance.available_balance)
+        credit = models.P2PTransfer.objects.create(
+            owner=recipient, sender=sender, receipient=recipient,
+            reference=reference, status=models.Transaction.SUCCESS,
+            amount=amount, new_balance=recipient_balance.available_balance)
+        outbox.publish(outbox.TRANSFER_POSTED, reference, {
+            'sender': sender.pk, 'recipient': recipient.pk, 'amount': amount})
+
+    return debit, credit
+
+
+def bank_transfer(owner, bank, amount, reference=None):
+    """
+    Debits ``amount`` kobo from ``owner`` for payout to their linked ``bank``
+    account, and returns the pending BankTransfer. ``payouts.run`` settles it,
+    or credits the amount back if the payout fails.
+    """
+    amount = Money(amount)
+    if amount <= 0:
+        raise TransferError("Transfer amount must be greater than zero")
+    if str(bank.owner_id) != str(owner.pk):
+        raise TransferError("Bank account belongs to another user")
+
+    reference = reference or uuid.uuid4().hex
+    with transaction.atomic():
+        balance = ledger.lock_balances(owner.pk).get(str(owner.pk))
+        if balance is None:
+            raise TransferError("User has no active balance")
+        if balance.available_balance < amount:
+            raise InsufficientFunds("Insufficient funds")
+
+        ledger.post(reference, [
+            (models.LedgerEntry.WALLET, balance, -amount),
+            (models.LedgerEntry.BANK_SETTLEMENT, None, amount),
+        ])
+        return models.BankTransfer.objects.create(
+            owner=owner, bank=bank, reference=reference, status=models.Transaction.PENDING,
+            amount=-amount, new_balance=balance.available_balance)
@@ -1,11 +1,21 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, mixins
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from .models import User, NewUserPhoneVerification
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from flite.core.idempotency import IdempotentCreateMixin
+from flite.core.pagination import KeysetPagination
+from .filters import TransactionFilter
+from .models import User, NewUserPhoneVerification, Transaction, P2PTransfer, Statement
 from .permissions import IsUserOrReadOnly
-from .serializers import CreateUserSerializer, UserSerializer, SendNewPhonenumberSerializer
+from .serializers import (CreateUserSerializer, UserSerializer, SendNewPhonenumberSerializer,
+                          TransactionSerializer, P2PTransferSerializer, BankSerializer,
+                          StatementRangeSerializer, StatementSerializer)
 from rest_framework.views import APIView
-from . import utils
+from . import banks, statements, summary, utils
 
 class UserViewSet(mixins.RetrieveModelMixin,
                   mixins.UpdateModelMixin,
@@ -17,6 +27,15 @@ class UserViewSet(mixins.RetrieveModelMixin,
     serializer_class = UserSerializer
     permission_classes = (IsUserOrReadOnly,)
 
+    @action(detail=True, permission_classes=[IsAuthenticated])
+    def summary(self, request, pk=None):
+        """
+        The user's account summary, served from cache without loading the user
+        """
+        if str(request.user.pk) != pk.lower():
+            raise PermissionDenied()
+        return Response(summary.get(request.user.pk))
+
 
 class UserCreateViewSet(mixins.CreateModelMixin,
                         viewsets.GenericViewSet):
@@ -44,13 +63,84 @@ class SendNewPhonenumberVerifyViewSet(mixins.CreateModelMixin,mixins.UpdateModel
         if code is None:
             return Response({"message":"Request not successful"}, 400)    
 
-        if verification_object.verification_code != code:
-            return Response({"message":"Verification code is incorrect"}, 400)    
-
         code_status, msg = utils.validate_mobile_signup_sms(verification_object.phone_number, code)
-        
+        if not code_status:
+            return Response({"message":"Verification code is incorrect"}, 400)
+
         content = {
                 'verification_code_status': str(code_status),
                 'message': msg,
         }
-        return Response(content, 200)    
+        return Response(content, 200)
+
+
+class TransactionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Lists the authenticated user's transactions, newest first
+    """
+    queryset = Transaction.objects.all()
+    serializer_class = TransactionSerializer
+    pagination_class = KeysetPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = TransactionFilter
+
+    def get_queryset(self):
+        return self.queryset.filter(owner=self.request.user)
+
+    @action(detail=False)
+    def statement(self, request):
+        """
+        Streams a statement of the user's transactions, or queues one for a
+        long date range
+        """
+        serializer = StatementRangeSerializer(data=request.query_params, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        start, end, output = (serializer.validated_data[key] for key in ('start', 'end', 'output'))
+
+        if (end - start).days >= settings.STATEMENT_STREAM_MAX_DAYS:
+            statement = statements.queue(request.user, start, end, output)
+            return Response(StatementSerializer(statement).data, status=202)
+
+        response = StreamingHttpResponse(
+            statements.render(output, statements.rows(request.user.pk, start, end)),
+            content_type=statements.CONTENT_TYPES[output])
+        response['Content-Disposition'] = (
+            f'attachment; filename="{statements.filename(request.user.pk, start, end, output)}"')
+        return response
+
+
+class StatementViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Reports on a queued statement, with a link to download it once it is ready
+    """
+    queryset = Statement.objects.all()
+    serializer_class = StatementSerializer
+
+    def get_queryset(self):
+        return self.queryset.filter(owner=self.request.user)
+
+
+class P2PTransferViewSet(IdempotentCreateMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """
+    Sends money to another user. Safe to retry with an Idempotency-Key header.
+    """
+    queryset = P2PTransfer.objects.all()
+    serializer_class = P2PTransferSerializer
+
+
+class BankViewSet(viewsets.ViewSet):
+    """
+    Lists and looks up banks from the in-memory bank directory
+    """
+    lookup_field = 'bank_code'
+
+    def list(self, request):
+        search = request.query_params.get('search')
+        directory = banks.directory()
+        return Response(BankSerializer(directory.search(search) if search else directory, many=True).data)
+
+    def retrieve(self, request, bank_code=None):
+        bank = banks.directory().get(bank_code)
+        if bank is None:
+            raise NotFound()
+        return Response(BankSerializer(bank).data)